@@ -0,0 +1,4 @@
+"""Load and latency benchmarks for the geospatial API.
+
+Run `python -m benchmarks --help` for usage.
+"""
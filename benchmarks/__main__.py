@@ -0,0 +1,123 @@
+"""Command line interface for the benchmarks.
+
+Examples:
+    Benchmark the working tree and a previous commit, then compare them::
+
+        python -m benchmarks run --output head.json
+        python -m benchmarks run --ref main --output base.json
+        python -m benchmarks compare base.json head.json
+
+    Replay a recorded access log at ten times its original speed::
+
+        python -m benchmarks replay access.jsonl --speed 10
+
+    Compare the peak memory of large tile renders with a smaller memory budget::
+
+        python -m benchmarks run --only large_tile --output default.json
+        python -m benchmarks run --only large_tile --env MEMORY_TOTAL_LIMIT_MB=256 --output limited.json
+        python -m benchmarks compare default.json limited.json
+
+    Check the application imports within a cold start budget of 3 seconds::
+
+        python -m benchmarks import-time --budget 3
+"""
+
+import argparse
+import json
+import logging
+import sys
+from pathlib import Path
+
+from .harness import REPO_ROOT, checkout, run_benchmarks, start_localstack
+from .import_time import measure_import_time
+from .replay import replay
+from .report import compare, format_comparison
+
+
+def run(args: argparse.Namespace) -> int:
+    if not args.no_localstack:
+        start_localstack()
+
+    env = dict(setting.split("=", 1) for setting in args.env or [])
+    if args.ref:
+        with checkout(args.ref) as app_dir:
+            results = run_benchmarks(app_dir, args.concurrency, args.workers, args.only, env)
+    else:
+        results = run_benchmarks(REPO_ROOT, args.concurrency, args.workers, args.only, env)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    else:
+        print(output)
+    return 0
+
+
+def compare_results(args: argparse.Namespace) -> int:
+    base = json.loads(Path(args.base).read_text())
+    head = json.loads(Path(args.head).read_text())
+    rows = compare(base, head, args.threshold)
+    print(format_comparison(rows))
+    return 1 if any(row["regression"] for row in rows) else 0
+
+
+def replay_log(args: argparse.Namespace) -> int:
+    results = replay(Path(args.log), args.speed, args.concurrency, args.base_url)
+    print(json.dumps(results, indent=2))
+    return 0
+
+
+def import_time(args: argparse.Namespace) -> int:
+    results = measure_import_time(args.repeats)
+    print(json.dumps(results, indent=2))
+    if args.budget is not None and results["median_s"] > args.budget:
+        print(f"Import time {results['median_s']:.2f}s exceeds the budget of {args.budget:.2f}s", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.splitlines()[0])
+    subparsers = parser.add_subparsers(required=True)
+
+    run_parser = subparsers.add_parser("run", help="Run the benchmarks and report the results as JSON.")
+    run_parser.add_argument("--ref", help="Git ref to benchmark instead of the working tree.")
+    run_parser.add_argument("--output", help="File to write the results to. Defaults to stdout.")
+    run_parser.add_argument("--concurrency", type=int, default=8, help="Maximum number of requests in flight.")
+    run_parser.add_argument("--workers", type=int, default=1, help="Number of uvicorn worker processes.")
+    run_parser.add_argument("--only", nargs="*", help="Only run scenarios starting with these prefixes, e.g. tile.")
+    run_parser.add_argument("--no-localstack", action="store_true", help="Use an already running localstack.")
+    run_parser.add_argument(
+        "--env", action="append", metavar="NAME=VALUE", help="Environment variable for the API. Can be repeated."
+    )
+    run_parser.set_defaults(func=run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare two sets of results.")
+    compare_parser.add_argument("base", help="Results of the baseline run.")
+    compare_parser.add_argument("head", help="Results of the run to check for regressions.")
+    compare_parser.add_argument(
+        "--threshold", type=float, default=0.1, help="Relative change treated as a regression. Defaults to 0.1 (10%%)."
+    )
+    compare_parser.set_defaults(func=compare_results)
+
+    replay_parser = subparsers.add_parser("replay", help="Replay a recorded access log against the API.")
+    replay_parser.add_argument("log", help="JSON lines access log written by the API.")
+    replay_parser.add_argument(
+        "--speed", type=float, default=10, help="Time compression factor. 0 sends requests as fast as possible."
+    )
+    replay_parser.add_argument("--concurrency", type=int, default=16, help="Maximum number of requests in flight.")
+    replay_parser.add_argument("--base-url", help="Root url of a running API. Defaults to running the API in-process.")
+    replay_parser.set_defaults(func=replay_log)
+
+    import_parser = subparsers.add_parser("import-time", help="Time importing the application in a fresh interpreter.")
+    import_parser.add_argument("--repeats", type=int, default=5, help="Number of times to import the application.")
+    import_parser.add_argument("--budget", type=float, help="Fail if the median import time exceeds this (seconds).")
+    import_parser.set_defaults(func=import_time)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    sys.exit(main())
@@ -0,0 +1,240 @@
+"""Run the API against localstack and replay the benchmark scenarios."""
+
+import asyncio
+import contextlib
+import logging
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Iterator
+
+import httpx
+
+from .report import RequestResult, summarise
+from .workloads import Scenario, build_scenarios
+
+logger = logging.getLogger(__name__)
+
+REPO_ROOT = Path(__file__).parents[1]
+
+
+def free_port() -> int:
+    """Find an unused local port."""
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_localstack() -> None:
+    """Start localstack, seeded from `./data` by `bin/localstack-setup.sh`, and wait for it to be healthy."""
+    subprocess.run(["docker", "compose", "--profile", "localstack", "up", "-d", "--wait"], cwd=REPO_ROOT, check=True)
+
+
+def read_rss_mb(pid: int) -> float | None:
+    """Read the resident set size of a process in MB, or None where /proc is unavailable."""
+    try:
+        status = Path(f"/proc/{pid}/status").read_text()
+    except OSError:
+        return None
+
+    for line in status.splitlines():
+        if line.startswith("VmRSS:"):
+            return int(line.split()[1]) / 1024
+    return None
+
+
+class AppProcess:
+    """The API running in a uvicorn subprocess."""
+
+    def __init__(self, app_dir: Path, workers: int = 1, env: dict[str, str] | None = None) -> None:
+        """
+        Args:
+            app_dir: Repository checkout to run the API from.
+            workers: Number of uvicorn worker processes.
+            env: Additional environment variables for the API.
+        """
+        self.app_dir = app_dir
+        self.workers = workers
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}/api"
+        self.env = {
+            **os.environ,
+            "PYTHONPATH": str(app_dir / "src"),
+            "METRICS_PORT": str(free_port()),
+            **(env or {}),
+        }
+        self.process: subprocess.Popen | None = None
+
+    def __enter__(self) -> "AppProcess":
+        command = [sys.executable, "-m", "uvicorn", "geospatial_api.main:app", "--port", str(self.port)]
+        command += ["--workers", str(self.workers), "--log-level", "warning"]
+        self.process = subprocess.Popen(command, cwd=self.app_dir, env=self.env)
+        self.wait_until_healthy()
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        if self.process is not None:
+            self.process.terminate()
+            self.process.wait(timeout=30)
+
+    def wait_until_healthy(self, timeout: float = 60) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with contextlib.suppress(httpx.HTTPError):
+                if httpx.get(f"{self.base_url}/healthcheck/").status_code == 200:
+                    return
+            time.sleep(0.2)
+        raise TimeoutError(f"API did not become healthy within {timeout}s")
+
+    def rss_mb(self) -> float | None:
+        """Total resident set size of the API and its worker processes in MB."""
+        if self.process is None:
+            return None
+
+        pids = [self.process.pid]
+        children = Path(f"/proc/{self.process.pid}/task/{self.process.pid}/children")
+        if children.exists():
+            pids += [int(pid) for pid in children.read_text().split()]
+
+        sizes = [size for size in map(read_rss_mb, pids) if size is not None]
+        return sum(sizes) if sizes else None
+
+
+async def replay(client: httpx.AsyncClient, paths: list[str], concurrency: int) -> list[RequestResult]:
+    """
+    Send requests with a fixed number in flight at once, recording the outcome of each.
+
+    Args:
+        client: Client for the API.
+        paths: Request paths, relative to the client's base url.
+        concurrency: Maximum number of requests in flight.
+
+    Returns:
+        Outcome of every request, in the order they completed.
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: list[RequestResult] = []
+
+    async def send(path: str) -> None:
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            results.append(
+                RequestResult(
+                    path=path,
+                    status_code=response.status_code,
+                    latency=time.perf_counter() - start,
+                    cache=response.headers.get("x-cache"),
+                    size=len(response.content),
+                )
+            )
+
+    await asyncio.gather(*(send(path) for path in paths))
+    return results
+
+
+async def sample_rss(app: AppProcess, samples: list[float], interval: float = 0.05) -> None:
+    """Sample the API's resident set size until cancelled."""
+    while True:
+        if (rss := app.rss_mb()) is not None:
+            samples.append(rss)
+        await asyncio.sleep(interval)
+
+
+async def run_scenario(app: AppProcess, scenario: Scenario, concurrency: int) -> dict[str, Any]:
+    """
+    Run a scenario against a freshly started API, first with a cold cache and then replaying it with a warm cache.
+
+    Args:
+        app: Running API process, which should not have served any requests yet.
+        scenario: Scenario to run.
+        concurrency: Maximum number of requests in flight.
+
+    Returns:
+        Summary statistics of the cold and warm passes, and the API's resident set size.
+
+    """
+    result: dict[str, Any] = {"endpoint": scenario.endpoint, "rss_start_mb": app.rss_mb()}
+    rss_samples: list[float] = []
+    sampler = asyncio.create_task(sample_rss(app, rss_samples))
+
+    async with httpx.AsyncClient(base_url=app.base_url, timeout=60) as client:
+        for run_pass in ["cold", "warm"]:
+            start = time.perf_counter()
+            results = await replay(client, scenario.paths, concurrency)
+            result[run_pass] = summarise(results, time.perf_counter() - start)
+
+    sampler.cancel()
+    result["rss_peak_mb"] = max(rss_samples, default=None)
+    result["rss_end_mb"] = app.rss_mb()
+    return result
+
+
+def get_catalogue(app_dir: Path) -> list[dict[str, Any]]:
+    """Fetch the list of available layers from the API."""
+    with AppProcess(app_dir) as app:
+        return httpx.get(f"{app.base_url}/available_data").json()
+
+
+def run_benchmarks(
+    app_dir: Path = REPO_ROOT,
+    concurrency: int = 8,
+    workers: int = 1,
+    only: list[str] | None = None,
+    env: dict[str, str] | None = None,
+) -> dict[str, Any]:
+    """
+    Run every benchmark scenario, each against a freshly started API.
+
+    Args:
+        app_dir: Repository checkout to run the API from.
+        concurrency: Maximum number of requests in flight.
+        workers: Number of uvicorn worker processes.
+        only: If given, only run scenarios whose name starts with one of these prefixes.
+        env: Additional environment variables for the API.
+
+    Returns:
+        Results of every scenario, keyed by scenario name.
+
+    """
+    scenarios = build_scenarios(get_catalogue(app_dir))
+    if only:
+        scenarios = [scenario for scenario in scenarios if scenario.name.startswith(tuple(only))]
+
+    results = {}
+    for scenario in scenarios:
+        logger.info(f"Running {scenario.name} ({len(scenario.paths)} requests per pass)")
+        with AppProcess(app_dir, workers=workers, env=env) as app:
+            results[scenario.name] = asyncio.run(run_scenario(app, scenario, concurrency))
+
+    return {
+        "commit": git_commit(app_dir),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "concurrency": concurrency,
+        "workers": workers,
+        "scenarios": results,
+    }
+
+
+def git_commit(path: Path) -> str:
+    """Get the commit checked out at a path."""
+    return subprocess.run(
+        ["git", "rev-parse", "HEAD"], cwd=path, check=True, capture_output=True, text=True
+    ).stdout.strip()
+
+
+@contextlib.contextmanager
+def checkout(ref: str) -> Iterator[Path]:
+    """Check out a git ref into a temporary worktree, so that it can be benchmarked alongside the current tree."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = Path(tmp_dir) / "worktree"
+        subprocess.run(["git", "worktree", "add", "--detach", str(path), ref], cwd=REPO_ROOT, check=True)
+        try:
+            yield path
+        finally:
+            subprocess.run(["git", "worktree", "remove", "--force", str(path)], cwd=REPO_ROOT, check=True)
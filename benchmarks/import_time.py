@@ -0,0 +1,67 @@
+"""Measure how long the application takes to import, which dominates its cold start time."""
+
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any
+
+from .harness import REPO_ROOT
+
+MODULE = "geospatial_api.main"
+
+
+def parse_importtime(stderr: str) -> list[tuple[int, str, float]]:
+    """
+    Parse the output of `python -X importtime`.
+
+    Returns:
+        The nesting depth, name and cumulative import time in seconds of each imported module.
+
+    """
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        # Nested imports are indented by two spaces per level, after the single space following the separator
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        modules.append((depth, name.strip(), int(cumulative) / 1e6))
+    return modules
+
+
+def measure_import_time(repeats: int = 5, top: int = 15) -> dict[str, Any]:
+    """
+    Import the application in fresh interpreters and time it.
+
+    Args:
+        repeats: Number of fresh interpreters to time the import in.
+        top: Number of slowest top-level imports to report.
+
+    Returns:
+        Median and individual wall times in seconds, and the cumulative import time of the slowest top-level imports
+        from the final run.
+
+    """
+    wall_times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        process = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {MODULE}"],
+            cwd=REPO_ROOT,
+            check=True,
+            capture_output=True,
+            text=True,
+        )
+        wall_times.append(time.perf_counter() - start)
+
+    # The application's direct imports are nested one level below the application module itself
+    top_level = [(name, seconds) for depth, name, seconds in parse_importtime(process.stderr) if depth <= 1]
+    slowest = sorted(top_level, key=lambda item: item[1], reverse=True)[:top]
+
+    return {
+        "module": MODULE,
+        "median_s": statistics.median(wall_times),
+        "wall_times_s": wall_times,
+        "slowest_imports_s": dict(slowest),
+    }
@@ -0,0 +1,139 @@
+"""Replay recorded access logs against the API.
+
+Requests are sent at the times they were originally made, compressed by a speed-up factor, with a cap on the number in
+flight. By default the requests are sent to the API in-process through its ASGI interface, so the cache and thread pool
+settings being evaluated can be set as environment variables for the replay command.
+"""
+
+import asyncio
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+
+import httpx
+
+from .report import RequestResult, summarise
+
+
+def read_access_log(path: Path) -> list[dict[str, Any]]:
+    """Read the records of a JSON lines access log, ordered by request time."""
+    with open(path) as log_file:
+        records = [json.loads(line) for line in log_file if line.strip()]
+    return sorted(records, key=lambda record: record["ts"])
+
+
+def request_target(record: dict[str, Any]) -> str:
+    """Rebuild the request path and query string of a logged request."""
+    return f"{record['path']}?{record['query']}" if record.get("query") else record["path"]
+
+
+def working_set(records: list[dict[str, Any]]) -> dict[str, Any]:
+    """
+    Size the set of distinct responses in a log, which bounds the cache needed to serve every repeat request.
+
+    Args:
+        records: Access log records.
+
+    Returns:
+        Number of requests and distinct requests, and the total bytes of the distinct responses, per endpoint.
+
+    """
+    sizes: dict[str, dict[str, int]] = defaultdict(dict)
+    counts: dict[str, int] = defaultdict(int)
+    for record in records:
+        endpoint = record.get("endpoint") or "other"
+        counts[endpoint] += 1
+        sizes[endpoint][request_target(record)] = record.get("bytes", 0)
+
+    return {
+        endpoint: {"requests": counts[endpoint], "distinct": len(targets), "bytes": sum(targets.values())}
+        for endpoint, targets in sizes.items()
+    }
+
+
+async def replay_log(
+    records: list[dict[str, Any]], client: httpx.AsyncClient, speed: float, concurrency: int
+) -> tuple[dict[str, list[RequestResult]], float]:
+    """
+    Send the logged requests with their original relative timing.
+
+    Args:
+        records: Access log records, ordered by request time.
+        client: Client for the API, with a base url of the server root.
+        speed: Factor to compress the time between requests by. Zero sends requests as fast as possible.
+        concurrency: Maximum number of requests in flight.
+
+    Returns:
+        Outcome of every request grouped by endpoint, and the total time taken in seconds.
+
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    results: dict[str, list[RequestResult]] = defaultdict(list)
+    first_ts = records[0]["ts"] if records else 0
+    start = time.perf_counter()
+
+    async def send(record: dict[str, Any]) -> None:
+        if speed > 0:
+            delay = (record["ts"] - first_ts) / speed - (time.perf_counter() - start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        target = request_target(record)
+        async with semaphore:
+            request_start = time.perf_counter()
+            response = await client.request(record.get("method", "GET"), target)
+            results[record.get("endpoint") or "other"].append(
+                RequestResult(
+                    path=target,
+                    status_code=response.status_code,
+                    latency=time.perf_counter() - request_start,
+                    cache=response.headers.get("x-cache"),
+                    size=len(response.content),
+                )
+            )
+
+    await asyncio.gather(*(send(record) for record in records))
+    return results, time.perf_counter() - start
+
+
+def replay(log_path: Path, speed: float = 10, concurrency: int = 16, base_url: str | None = None) -> dict[str, Any]:
+    """
+    Replay an access log and summarise the results.
+
+    Args:
+        log_path: Path to the JSON lines access log.
+        speed: Factor to compress the time between requests by. Zero sends requests as fast as possible.
+        concurrency: Maximum number of requests in flight.
+        base_url: Root url of a running API server. If not given, the API is run in-process.
+
+    Returns:
+        Summary statistics per endpoint, and the working set of the log.
+
+    """
+    records = read_access_log(log_path)
+
+    async def run() -> tuple[dict[str, list[RequestResult]], float]:
+        if base_url is not None:
+            transport = None
+        else:
+            # Imported only when replaying in-process, as importing the app is slow and reads its settings
+            from geospatial_api.main import app  # noqa: PLC0415
+
+            transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url=base_url or "http://replay", timeout=60) as client:
+            return await replay_log(records, client, speed, concurrency)
+
+    results, wall_time = asyncio.run(run())
+    return {
+        "log": str(log_path),
+        "speed": speed,
+        "concurrency": concurrency,
+        "wall_time_s": wall_time,
+        "endpoints": {
+            endpoint: summarise(endpoint_results, wall_time) for endpoint, endpoint_results in results.items()
+        },
+        "working_set": working_set(records),
+    }
@@ -0,0 +1,128 @@
+"""Summary statistics and comparison of benchmark results."""
+
+import math
+from dataclasses import dataclass
+from typing import Any
+
+# Summary statistics where a higher value is an improvement. For all other compared statistics lower is better.
+HIGHER_IS_BETTER = {"throughput_rps", "hit_ratio"}
+PASS_STATS = ["throughput_rps", "p50_ms", "p95_ms", "p99_ms", "hit_ratio"]
+PASSES = ["cold", "warm"]
+
+
+@dataclass(frozen=True)
+class RequestResult:
+    """Outcome of a single benchmark request.
+
+    Attributes:
+        path: Request path.
+        status_code: HTTP status code of the response.
+        latency: Time taken for the full response to be received, in seconds.
+        cache: Value of the X-Cache response header, if present.
+        size: Size of the response body in bytes.
+    """
+
+    path: str
+    status_code: int
+    latency: float
+    cache: str | None
+    size: int
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Linearly interpolated percentile of a list of values, where q is between 0 and 100."""
+    if not values:
+        return math.nan
+
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * q / 100
+    lower = math.floor(rank)
+    upper = math.ceil(rank)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+def summarise(results: list[RequestResult], wall_time: float) -> dict[str, Any]:
+    """
+    Summarise the requests made during one pass of a scenario.
+
+    Args:
+        results: Outcome of every request in the pass.
+        wall_time: Total time taken for the pass, in seconds.
+
+    Returns:
+        Summary statistics, with latencies in milliseconds.
+
+    """
+    latencies = [result.latency * 1000 for result in results]
+    cached = [result for result in results if result.cache is not None]
+    return {
+        "requests": len(results),
+        "errors": sum(result.status_code >= 400 for result in results),
+        "throughput_rps": len(results) / wall_time if wall_time else math.nan,
+        "mean_ms": sum(latencies) / len(latencies) if latencies else math.nan,
+        "p50_ms": percentile(latencies, 50),
+        "p95_ms": percentile(latencies, 95),
+        "p99_ms": percentile(latencies, 99),
+        "hit_ratio": sum(result.cache == "HIT" for result in cached) / len(cached) if cached else None,
+        "bytes": sum(result.size for result in results),
+    }
+
+
+def compare_values(scenario: str, run_pass: str, stat: str, base: Any, head: Any, threshold: float) -> dict | None:
+    """Compare a single statistic, returning None if it is missing from either run."""
+    if not base or head is None or math.isnan(base) or math.isnan(head):
+        return None
+
+    change = (head - base) / base
+    worse = -change if stat in HIGHER_IS_BETTER else change
+    return {
+        "scenario": scenario,
+        "pass": run_pass,
+        "stat": stat,
+        "base": base,
+        "head": head,
+        "change": change,
+        "regression": worse > threshold,
+    }
+
+
+def compare(base: dict[str, Any], head: dict[str, Any], threshold: float) -> list[dict[str, Any]]:
+    """
+    Compare two benchmark result files.
+
+    Args:
+        base: Results of the baseline run.
+        head: Results of the run being checked.
+        threshold: Relative change, e.g. 0.1 for 10%, beyond which a worse value is reported as a regression.
+
+    Returns:
+        One row per compared statistic of every scenario present in both runs.
+
+    """
+    rows = []
+    for name, head_scenario in head["scenarios"].items():
+        base_scenario = base["scenarios"].get(name)
+        if base_scenario is None:
+            continue
+
+        for run_pass in PASSES:
+            for stat in PASS_STATS:
+                base_value, head_value = base_scenario[run_pass].get(stat), head_scenario[run_pass].get(stat)
+                rows.append(compare_values(name, run_pass, stat, base_value, head_value, threshold))
+
+        rss = base_scenario.get("rss_peak_mb"), head_scenario.get("rss_peak_mb")
+        rows.append(compare_values(name, "all", "rss_peak_mb", *rss, threshold))
+
+    return [row for row in rows if row is not None]
+
+
+def format_comparison(rows: list[dict[str, Any]]) -> str:
+    """Format comparison rows as a plain text table."""
+    lines = [f"{'scenario':<50} {'pass':<5} {'stat':<15} {'base':>10} {'head':>10} {'change':>8}"]
+    for row in rows:
+        flag = "  REGRESSION" if row["regression"] else ""
+        lines.append(
+            f"{row['scenario']:<50} {row['pass']:<5} {row['stat']:<15} {row['base']:>10.2f} {row['head']:>10.2f} "
+            f"{row['change']:>+8.1%}{flag}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,126 @@
+"""Realistic request patterns for the benchmark scenarios."""
+
+import math
+from dataclasses import dataclass
+from typing import Any
+from urllib.parse import quote, urlparse
+
+Tile = tuple[int, int, int]
+
+
+@dataclass(frozen=True)
+class Scenario:
+    """A sequence of requests replayed against the API.
+
+    Attributes:
+        name: Unique name of the scenario, e.g. `tile/viewport_pan`.
+        endpoint: Endpoint group the scenario exercises, used to group results.
+        paths: Request paths, relative to the API root, in the order they are sent.
+    """
+
+    name: str
+    endpoint: str
+    paths: list[str]
+
+
+def lonlat_to_tile(lon: float, lat: float, z: int) -> Tile:
+    """Find the WebMercatorQuad tile containing a point."""
+    n = 2**z
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return x, y, z
+
+
+def viewport(centre: Tile, width: int = 4, height: int = 3) -> list[Tile]:
+    """List the tiles of a map viewport centred on a tile, as a browser would request them."""
+    x, y, z = centre
+    columns = range(x - width // 2, x + width - width // 2)
+    rows = range(y - height // 2, y + height - height // 2)
+    return [(column, row, z) for row in rows for column in columns]
+
+
+def viewport_pan(lon: float, lat: float, z: int = 14, steps: int = 10) -> list[Tile]:
+    """Tiles requested while panning the map one tile east per step, then back north-west."""
+    x, y, _ = lonlat_to_tile(lon, lat, z)
+    tiles = []
+    for step in range(steps):
+        tiles.extend(viewport((x + step, y, z)))
+    for step in range(steps):
+        tiles.extend(viewport((x + steps - step, y - step // 2, z)))
+    return tiles
+
+
+def zoom_sweep(lon: float, lat: float, min_zoom: int = 8, max_zoom: int = 18) -> list[Tile]:
+    """Tiles requested while zooming in on a point and back out again."""
+    zooms = [*range(min_zoom, max_zoom + 1), *range(max_zoom - 1, min_zoom - 1, -1)]
+    return [tile for z in zooms for tile in viewport(lonlat_to_tile(lon, lat, z))]
+
+
+def tile_path(
+    prefix: str, param: str, source: str, tile: Tile, fmt: str = "png", scale: int = 1, query: str = ""
+) -> str:
+    """Build the request path for a tile, with any additional query string parameters."""
+    x, y, z = tile
+    size = f"@{scale}x" if scale > 1 else ""
+    path = f"{prefix}/tiles/WebMercatorQuad/{z}/{x}/{y}{size}.{fmt}?{param}={quote(source, safe='')}"
+    return f"{path}&{query}" if query else path
+
+
+def large_tile_scenario(name: str, source: str, centre: tuple[float, float], buffer: int = 64) -> Scenario:
+    """Build a scenario of 1024x1024 tiles with a buffer, the largest tiles a client can request, to stress memory."""
+    lat, lon = centre
+    tiles = viewport_pan(lon, lat, steps=3)
+    return Scenario(
+        f"large_tile/{name}",
+        "tile",
+        [tile_path("/maps", "url", source, tile, scale=4, query=f"buffer={buffer}") for tile in tiles],
+    )
+
+
+def tile_scenarios(
+    endpoint: str, name: str, prefix: str, param: str, source: str, centre: tuple[float, float]
+) -> list[Scenario]:
+    """Build the viewport pan and zoom sweep scenarios for a tiled layer centred on a (lat, lon) point."""
+    lat, lon = centre
+    return [
+        Scenario(
+            f"{endpoint}/{name}/{pattern}",
+            endpoint,
+            [tile_path(prefix, param, source, tile) for tile in tiles],
+        )
+        for pattern, tiles in [("viewport_pan", viewport_pan(lon, lat)), ("zoom_sweep", zoom_sweep(lon, lat))]
+    ]
+
+
+def build_scenarios(catalogue: list[dict[str, Any]], repeats: int = 50) -> list[Scenario]:
+    """
+    Build the benchmark scenarios for the layers listed by the available_data endpoint.
+
+    Args:
+        catalogue: Response of the available_data endpoint.
+        repeats: Number of requests to make for the catalogue and each vector layer.
+
+    Returns:
+        Scenarios for the catalogue, every raster and vector layer, large tiles of every raster, and a mosaic of all
+        rasters.
+
+    """
+    scenarios = [Scenario("catalogue/list", "catalogue", ["/available_data"] * repeats)]
+
+    rasters = [layer for layer in catalogue if layer["data_type"] == "raster"]
+    for layer in rasters:
+        scenarios.extend(tile_scenarios("tile", layer["name"], "/maps", "url", layer["s3_url"], layer["map_centre"]))
+        scenarios.append(large_tile_scenario(layer["name"], layer["s3_url"], layer["map_centre"]))
+
+    if rasters:
+        bucket = urlparse(rasters[0]["s3_url"]).netloc
+        source = f"S3://{bucket}/raster/"
+        scenarios.extend(tile_scenarios("mosaic", "raster", "/mosaic", "layer", source, rasters[0]["map_centre"]))
+
+    for layer in catalogue:
+        if layer["data_type"] == "vector":
+            path = f"/vector?url={quote(layer['s3_url'], safe='')}"
+            scenarios.append(Scenario(f"vector/{layer['name']}", "vector", [path] * repeats))
+
+    return scenarios
@@ -0,0 +1,182 @@
+"""Structured JSON lines access log for tile, vector and catalogue requests.
+
+Each request's record is built in the request's context, with the pipeline stages adding their timings to it, and is
+only serialised and written by a background thread so that logging adds little to the request latency.
+"""
+
+import json
+import logging
+import queue
+import sys
+import time
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any
+from urllib.parse import parse_qsl
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .settings import access_log_setting
+from .utils import get_layer_name, get_source_id
+
+logger = logging.getLogger(__name__)
+
+access_logger = logging.getLogger("geospatial_api.access")
+access_logger.propagate = False
+
+# Access log record of the request currently being processed
+request_record: ContextVar[dict[str, Any] | None] = ContextVar("request_record", default=None)
+
+# Request path fragments identifying the type of endpoint being called. Requests to other endpoints are not logged.
+ENDPOINT_TYPES = {
+    "/mosaic/tiles/": "mosaic",
+    "/tiles/": "tile",
+    "/vector": "vector",
+    "/available_data": "catalogue",
+    "/timeseries": "timeseries",
+    "/info": "info",
+    "/statistics": "statistics",
+}
+
+
+def get_endpoint_type(path: str) -> str | None:
+    """Get the type of endpoint a request path is for, or None if it should not be logged."""
+    for fragment, endpoint_type in ENDPOINT_TYPES.items():
+        if fragment in path:
+            return endpoint_type
+    return None
+
+
+def annotate_request(**fields: Any) -> None:
+    """Add fields to the access log record of the current request, if it is being logged."""
+    record = request_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+def record_stage(stage: str, duration: float) -> None:
+    """Add the time taken by a pipeline stage, in seconds, to the access log record of the current request."""
+    record = request_record.get()
+    if record is not None:
+        record["stages"][stage] = round(duration * 1000, 3)
+
+
+class JSONLinesFormatter(logging.Formatter):
+    """Format access log records, which are logged as dictionaries, as single line JSON."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(record.msg, separators=(",", ":"), default=str)
+
+
+class AccessLogQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting to the listener thread and drops records when the queue is full."""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+class AccessLog:
+    """Background writer of the access log."""
+
+    def __init__(self) -> None:
+        self.listener: QueueListener | None = None
+
+    def start(self) -> None:
+        """Start writing the access log, if a path has been configured."""
+        if access_log_setting.path is None or self.listener is not None:
+            return
+
+        if access_log_setting.path == "-":
+            handler: logging.Handler = logging.StreamHandler(sys.stdout)
+        else:
+            handler = logging.FileHandler(access_log_setting.path)
+        handler.setFormatter(JSONLinesFormatter())
+
+        log_queue: queue.Queue = queue.Queue(maxsize=access_log_setting.queue_size)
+        access_logger.addHandler(AccessLogQueueHandler(log_queue))
+        access_logger.setLevel(logging.INFO)
+        self.listener = QueueListener(log_queue, handler)
+        self.listener.start()
+        logger.info(f"Writing access log to {access_log_setting.path}")
+
+    def stop(self) -> None:
+        """Flush any queued records and stop writing the access log."""
+        if self.listener is None:
+            return
+
+        self.listener.stop()
+        for handler in access_logger.handlers[:]:
+            access_logger.removeHandler(handler)
+        self.listener = None
+
+
+access_log = AccessLog()
+
+
+def build_record(scope: Scope) -> dict[str, Any]:
+    """Build the initial access log record for a request."""
+    query = scope.get("query_string", b"").decode()
+    params = dict(parse_qsl(query))
+    source = params.get("url") or params.get("layer")
+    if source is not None:
+        source = get_source_id(source)
+
+    client = scope.get("client")
+    return {
+        "ts": time.time(),
+        "method": scope["method"],
+        "path": scope["path"],
+        "query": query,
+        "endpoint": get_endpoint_type(scope["path"]),
+        "source": source,
+        "layer": get_layer_name(source) if source else None,
+        "client": client[0] if client else None,
+        "cache": None,
+        "stages": {},
+    }
+
+
+class AccessLogMiddleware:
+    """ASGI middleware writing a structured access log record for every tile, vector and catalogue request."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or access_log.listener is None or get_endpoint_type(scope["path"]) is None:
+            await self.app(scope, receive, send)
+            return
+
+        record = build_record(scope)
+        token = request_record.set(record)
+        start = time.perf_counter()
+        response_bytes = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal response_bytes
+            if message["type"] == "http.response.start":
+                record["status"] = message["status"]
+                headers = dict(message.get("headers", []))
+                if record["cache"] is None and b"x-cache" in headers:
+                    record["cache"] = headers[b"x-cache"].decode()
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            path_params = scope.get("path_params", {})
+            record.update({key: int(path_params[key]) if key in path_params else None for key in ["z", "x", "y"]})
+            record["format"] = path_params.get("format")
+            record["bytes"] = response_bytes
+            record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+            record.setdefault("status", 500)
+            request_record.reset(token)
+            access_logger.info(record)
@@ -0,0 +1,149 @@
+"""Admission control for tile and vector rendering.
+
+Rendering runs on a dedicated, bounded set of threads rather than Starlette's shared thread pool, so cache hits and the
+light work of resolving request dependencies are never queued behind slow renders. Renders beyond the queue limit, or
+beyond the share of the queue allowed to a single layer or client, are rejected immediately with a `Retry-After` header
+rather than adding to the latency of every request.
+"""
+
+import math
+import time
+from collections import Counter
+from typing import Callable, TypeVar
+
+import anyio
+import anyio.to_thread
+from anyio.lowlevel import RunVar
+from fastapi import HTTPException, Request
+
+from geospatial_api.access_log import annotate_request
+from geospatial_api.metrics import RENDER_QUEUE_DEPTH, RENDER_SHED, known_layers
+from geospatial_api.settings import render_setting
+
+T = TypeVar("T")
+
+# Weight of the latest render when updating the moving average render time used to estimate `Retry-After`
+DURATION_SMOOTHING = 0.1
+
+
+async def get_client_id(request: Request) -> str:
+    """
+    Identify the client making a request from its address.
+
+    `X-Forwarded-For` is not read directly, as its leftmost address is set by the client. Uvicorn's `--proxy-headers`
+    replaces the connection address with the address forwarded by trusted proxies (`FORWARDED_ALLOW_IPS`) instead.
+    """
+    return request.client.host if request.client else ""
+
+
+class RenderAdmission:
+    """Bounded render queue with per-layer and per-client limits."""
+
+    def __init__(self, threads: int, max_queue: int, layer_limit: int, client_limit: int) -> None:
+        """
+        Args:
+            threads: Number of renders run at once.
+            max_queue: Number of admitted renders that may wait for a thread.
+            layer_limit: Maximum number of renders of a single layer, running or waiting.
+            client_limit: Maximum number of renders for a single client, running or waiting.
+        """
+        self.threads = threads
+        self.max_queue = max_queue
+        self.layer_limit = layer_limit
+        self.client_limit = client_limit
+
+        self.pending = 0
+        self.mean_duration = 0.1
+        self._layers: Counter[str] = Counter()
+        self._clients: Counter[str] = Counter()
+        # Capacity limiters are bound to an event loop, so one is created for each loop the application runs in
+        self._limiter: RunVar[anyio.CapacityLimiter] = RunVar("render_limiter")
+
+    @property
+    def limiter(self) -> anyio.CapacityLimiter:
+        try:
+            return self._limiter.get()
+        except LookupError:
+            limiter = anyio.CapacityLimiter(self.threads)
+            self._limiter.set(limiter)
+            return limiter
+
+    def has_capacity(self) -> bool:
+        """Check whether a render could start without waiting for a thread."""
+        return self.pending < self.threads
+
+    def retry_after(self) -> int:
+        """Estimate the time in seconds until the current queue has been rendered."""
+        return max(1, math.ceil(self.pending * self.mean_duration / self.threads))
+
+    def shed(self, reason: str, layer: str, status_code: int, detail: str) -> HTTPException:
+        RENDER_SHED.labels(reason=reason, layer=known_layers.label(layer)).inc()
+        annotate_request(shed=reason)
+        return HTTPException(status_code=status_code, detail=detail, headers={"Retry-After": str(self.retry_after())})
+
+    def admit(self, layer: str, client: str | None) -> None:
+        """
+        Check a render can be queued.
+
+        Raises:
+            HTTPException: 429 if the client has too many renders queued, or 503 if the layer has too many renders
+                queued or the queue is full.
+
+        """
+        if client and self._clients[client] >= self.client_limit:
+            raise self.shed("client_limit", layer, 429, "Too many tile requests are being rendered for this client.")
+        if self._layers[layer] >= self.layer_limit:
+            raise self.shed("layer_limit", layer, 503, "Too many tile requests are being rendered for this layer.")
+        if self.pending >= self.threads + self.max_queue:
+            raise self.shed("queue_full", layer, 503, "The server is busy rendering other tiles.")
+
+    def _timed(self, func: Callable[[], T]) -> T:
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self.mean_duration += DURATION_SMOOTHING * (time.perf_counter() - start - self.mean_duration)
+
+    async def run(self, func: Callable[[], T], layer: str, client: str | None = None) -> T:
+        """
+        Run a render on a render thread, if it can be admitted.
+
+        Args:
+            func: Render function, called without arguments.
+            layer: Name of the layer being rendered.
+            client: Identifier of the client requesting the render.
+
+        Raises:
+            HTTPException: The render was rejected, see `admit`.
+
+        Returns:
+            The result of the render function.
+
+        """
+        self.admit(layer, client)
+
+        self.pending += 1
+        self._layers[layer] += 1
+        if client:
+            self._clients[client] += 1
+        RENDER_QUEUE_DEPTH.inc()
+        try:
+            return await anyio.to_thread.run_sync(self._timed, func, limiter=self.limiter)
+        finally:
+            self.pending -= 1
+            self._layers[layer] -= 1
+            if self._layers[layer] <= 0:
+                del self._layers[layer]
+            if client:
+                self._clients[client] -= 1
+                if self._clients[client] <= 0:
+                    del self._clients[client]
+            RENDER_QUEUE_DEPTH.dec()
+
+
+render_admission = RenderAdmission(
+    threads=render_setting.threads,
+    max_queue=render_setting.max_queue,
+    layer_limit=render_setting.layer_limit,
+    client_limit=render_setting.client_limit,
+)
@@ -1,19 +1,252 @@
 """Logic for caching Titiler taken from https://developmentseed.org/titiler/examples/code/tiler_with_cache/."""
 
+import asyncio
 import base64
 import json
+import logging
+import sqlite3
+import threading
+import time
 from abc import ABC, abstractmethod
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from functools import partial
+from pathlib import Path
 from typing import Any, Callable
 
 import aiocache
-from starlette.concurrency import run_in_threadpool
 from starlette.responses import Response
 
+from .access_log import request_record
+from .admission import render_admission
+from .metrics import (
+    get_stage_labels,
+    record_cache_hit,
+    record_cache_miss,
+    record_cache_refresh_error,
+    record_cache_stale,
+    record_cache_write,
+    track_stage,
+)
 from .settings import cache_setting
+from .utils import get_layer_name, get_source_id
+
+logger = logging.getLogger(__name__)
+
+# Wildcard matching every layer when purging a zoom range
+ALL_LAYERS = "*"
+
+
+class CacheNamespaces:
+    """Generation counters used to namespace cache keys by layer and zoom level.
+
+    Incrementing a generation changes the keys of every matching entry, so purging a layer or zoom level is O(1) rather
+    than a scan of the cache. The purged entries can no longer be reached and are removed when their ttl expires.
+
+    The counters are held in memory by default, so a purge only changes the keys used by the process that receives it.
+    Given a database path, they are stored in SQLite instead and reloaded whenever another process changes them, so a
+    purge applies to every worker sharing the database. Purged entries of the disk tier are also deleted with
+    `purge_disk_cache`, as they would otherwise be reachable again if the counters are lost.
+    """
+
+    def __init__(self, path: str | Path | None = None) -> None:
+        """
+        Args:
+            path: Path of a SQLite database to store the counters in, shared by every worker. The counters are only
+                held in memory if not given.
+        """
+        # Generations keyed by ("all",), ("layer", layer) or ("zoom", layer, z)
+        self._generations: dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._data_version: int | None = None
+        if path is not None:
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+            self._connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS generations (name TEXT PRIMARY KEY, generation INTEGER)"
+            )
+
+    def _sync(self) -> None:
+        """Reload the counters from the database if another process has changed them, holding the lock."""
+        if self._connection is None:
+            return
+        # The data version only changes when another connection commits a change to the database
+        data_version = self._connection.execute("PRAGMA data_version").fetchone()[0]
+        if data_version != self._data_version:
+            rows = self._connection.execute("SELECT name, generation FROM generations")
+            self._generations = {tuple(json.loads(name)): generation for name, generation in rows}
+            self._data_version = data_version
+
+    def _increment(self, names: list[tuple]) -> None:
+        with self._lock:
+            if self._connection is None:
+                for name in names:
+                    self._generations[name] = self._generations.get(name, 0) + 1
+                return
+
+            with self._connection:
+                self._connection.execute("BEGIN IMMEDIATE")
+                self._connection.executemany(
+                    "INSERT INTO generations (name, generation) VALUES (?, 1) "
+                    "ON CONFLICT (name) DO UPDATE SET generation = generation + 1",
+                    [(json.dumps(name),) for name in names],
+                )
+            # Changes made by this connection do not change its data version
+            self._data_version = None
+            self._sync()
+
+    def prefix(self, layer: str, z: int | None) -> str:
+        """Build the key prefix for an entry of a layer at a zoom level."""
+        with self._lock:
+            self._sync()
+            generations = self._generations
+
+        generation = generations.get(("all",), 0)
+        layer_generation = generations.get(("layer", layer), 0)
+        if z is None:
+            return f"{generation}:{layer}@{layer_generation}:"
+
+        zoom_generation = generations.get(("zoom", layer, z), 0) + generations.get(("zoom", ALL_LAYERS, z), 0)
+        return f"{generation}:{layer}@{layer_generation}:{z}@{zoom_generation}:"
+
+    @staticmethod
+    def matches(key: str, layer: str = ALL_LAYERS, zooms: range | None = None) -> bool:
+        """
+        Check whether a cache key is of an entry of a layer and range of zoom levels.
+
+        Args:
+            key: Cache key, starting with a prefix built by `prefix`.
+            layer: Name of the layer, or `ALL_LAYERS` to match every layer.
+            zooms: Zoom levels to match, or None to match every entry of the layer including those without a zoom level.
+
+        Returns:
+            Whether the key matches.
+
+        """
+        parts = key.split(":", 3)
+        if len(parts) < 3:
+            return False
+        key_layer, _, _ = parts[1].rpartition("@")
+        if layer not in (ALL_LAYERS, key_layer):
+            return False
+        if zooms is None:
+            return True
+        z, separator, _ = parts[2].partition("@")
+        return bool(separator) and z.isdigit() and int(z) in zooms
+
+    def purge_all(self) -> None:
+        self._increment([("all",)])
+
+    def purge_layer(self, layer: str) -> None:
+        self._increment([("layer", layer)])
+
+    def purge_zooms(self, zooms: range, layer: str = ALL_LAYERS) -> None:
+        """Purge a range of zoom levels of one layer, or of all layers by default."""
+        self._increment([("zoom", layer, z) for z in zooms])
+
+
+@dataclass
+class LayerCacheStats:
+    """Cache statistics for a layer.
+
+    Attributes:
+        hits: Number of requests served from the cache.
+        misses: Number of requests not found in the cache.
+        entries: Number of entries written since the layer was last purged.
+        bytes: Size of the entries written since the layer was last purged.
+    """
+
+    hits: int = 0
+    misses: int = 0
+    entries: int = 0
+    bytes: int = 0
+
+    def add(self, other: "LayerCacheStats") -> None:
+        self.hits += other.hits
+        self.misses += other.misses
+        self.entries += other.entries
+        self.bytes += other.bytes
+
+    def summary(self) -> dict[str, Any]:
+        requests = self.hits + self.misses
+        return {**asdict(self), "hit_ratio": self.hits / requests if requests else None}
+
+
+class CacheStats:
+    """Cache statistics of this process, per layer and zoom level."""
+
+    def __init__(self) -> None:
+        self._stats: dict[tuple[str, int | None], LayerCacheStats] = defaultdict(LayerCacheStats)
+
+    def record_hit(self, layer: str, z: int | None) -> None:
+        self._stats[(layer, z)].hits += 1
+
+    def record_miss(self, layer: str, z: int | None) -> None:
+        self._stats[(layer, z)].misses += 1
+
+    def record_write(self, layer: str, z: int | None, size: int) -> None:
+        stats = self._stats[(layer, z)]
+        stats.entries += 1
+        stats.bytes += size
+
+    def purge(self, layer: str = ALL_LAYERS, zooms: range | None = None) -> None:
+        """Reset the entry counts of purged entries. Hit and miss counts are kept."""
+        for (stats_layer, z), stats in self._stats.items():
+            if layer in (ALL_LAYERS, stats_layer) and (zooms is None or (z is not None and z in zooms)):
+                stats.entries = 0
+                stats.bytes = 0
+
+    def summary(self) -> dict[str, Any]:
+        """Summarise the statistics of each layer and of the whole cache."""
+        layers: dict[str, LayerCacheStats] = defaultdict(LayerCacheStats)
+        total = LayerCacheStats()
+        for (layer, _), stats in self._stats.items():
+            layers[layer].add(stats)
+            total.add(stats)
+
+        return {
+            "layers": {layer: stats.summary() for layer, stats in sorted(layers.items())},
+            "total": total.summary(),
+        }
+
+
+cache_namespaces = CacheNamespaces(cache_setting.namespaces_path)
+cache_stats = CacheStats()
+
+
+@dataclass
+class CacheEntry:
+    """A cached response.
+
+    Attributes:
+        response: Response constructed from the cached data.
+        created: Unix time the response was written to the cache.
+    """
+
+    response: Response
+    created: float
+
+    @property
+    def age(self) -> float:
+        return time.time() - self.created
 
 
 class CachedABC(ABC, aiocache.cached):
-    """Abstract base class for caching endpoint data"""
+    """Abstract base class for caching endpoint data.
+
+    Entries younger than the soft ttl are served as they are. Older entries are still served immediately, marked as
+    stale, while a single background task per entry regenerates them, until they are removed at the hard ttl. If
+    regenerating an entry fails, the stale entry keeps being served with a warning rather than failing the request.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        # Keys of entries currently being refreshed, and of entries whose last refresh failed
+        self._refreshing: set[str] = set()
+        self._refresh_failed: set[str] = set()
+        self._refresh_tasks: set[asyncio.Task] = set()
 
     async def get_from_cache(self, key: str) -> str | Response | None:
         try:
@@ -25,14 +258,14 @@ class CachedABC(ABC, aiocache.cached):
             aiocache.logger.exception("Couldn't retrieve %s, unexpected error", key)
 
     @abstractmethod
-    async def read_cache(self, key: str) -> Response:
+    async def read_cache(self, key: str) -> CacheEntry | None:
         """Read data from the cache.
 
         Args:
             key: key indexing the cached data to be returned.
 
         Returns:
-            Response constructed from the cached data.
+            The cached response and the time it was created, or None if the key is not in the cache.
 
         """
         pass
@@ -49,6 +282,32 @@ class CachedABC(ABC, aiocache.cached):
         """
         pass
 
+    def get_layer(self, kwargs: dict[str, Any]) -> tuple[str, int | None] | None:
+        """
+        Get the layer and zoom level of a call to the cached router function, used to namespace its cache entries.
+
+        Args:
+            kwargs: Keyword arguments of the router function.
+
+        Returns:
+            Layer name and zoom level, or None if the cache is not namespaced by layer.
+
+        """
+        return None
+
+    def get_metric_labels(self, kwargs: dict[str, Any]) -> dict[str, str] | None:
+        """
+        Get the metric labels for a call to the cached router function.
+
+        Args:
+            kwargs: Keyword arguments of the router function.
+
+        Returns:
+            Metric labels, or None if metrics are not recorded for this cache.
+
+        """
+        return None
+
     async def decorator(
         self,
         f: Callable,
@@ -69,23 +328,122 @@ class CachedABC(ABC, aiocache.cached):
 
         """
         key = self.get_cache_key(f, args, kwargs)
-
-        result = await self.read_cache(key)
-        if result is not None:
+        labels = self.get_metric_labels(kwargs)
+        layer = self.get_layer(kwargs)
+
+        with track_stage("cache_lookup", labels):
+            entry = await self.read_cache(key)
+        if entry is not None:
+            result = entry.response
+            if layer is not None:
+                cache_stats.record_hit(*layer)
+
+            if entry.age <= cache_setting.soft_ttl:
+                result.headers["X-Cache"] = "HIT"
+                record_cache_hit(labels, len(result.body))
+                return result
+
+            # Serve the expired entry without waiting for it to be regenerated
+            self.refresh(key, f, args, kwargs)
+            result.headers["X-Cache"] = "STALE"
+            if key in self._refresh_failed:
+                result.headers["Warning"] = '111 - "Revalidation Failed"'
+            else:
+                result.headers["Warning"] = '110 - "Response is Stale"'
+            record_cache_stale(labels, len(result.body))
             return result
 
-        result = await run_in_threadpool(f, *args, **kwargs)
-
-        # Write any new tile data to cache
-        await self.write_cache(key, result)
+        record_cache_miss(labels)
+        if layer is not None:
+            cache_stats.record_miss(*layer)
+        result = await self.render(f, args, kwargs)
+        await self.store(key, result, kwargs)
+        result.headers["X-Cache"] = "MISS"
 
         return result
 
+    async def render(self, f: Callable, args: tuple, kwargs: dict[str, Any]) -> Response:
+        """Call the router function on a render thread, subject to admission control, see `RenderAdmission`."""
+        layer = self.get_layer(kwargs)
+        return await render_admission.run(
+            partial(f, *args, **kwargs), layer[0] if layer is not None else "", kwargs.get("client_id")
+        )
+
+    async def store(self, key: str, result: Response, kwargs: dict[str, Any]) -> None:
+        """Write a response to the cache, recording the write against the cache metrics and statistics."""
+        labels = self.get_metric_labels(kwargs)
+        layer = self.get_layer(kwargs)
+
+        with track_stage("cache_write", labels):
+            await self.write_cache(key, result)
+        record_cache_write(labels, len(result.body))
+        if layer is not None:
+            cache_stats.record_write(*layer, len(result.body))
+
+    def refresh(self, key: str, f: Callable, args: tuple, kwargs: dict[str, Any]) -> None:
+        """Regenerate an expired entry in the background, unless it is already being refreshed."""
+        # Refreshes never wait for a render thread, the stale entry is served again until one is free
+        if key in self._refreshing or not render_admission.has_capacity():
+            return
+
+        self._refreshing.add(key)
+        task = asyncio.create_task(self._refresh(key, f, args, kwargs))
+        self._refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_tasks.discard)
+
+    async def _refresh(self, key: str, f: Callable, args: tuple, kwargs: dict[str, Any]) -> None:
+        # The task runs in a copy of the triggering request's context, which may finish and be logged first
+        request_record.set(None)
+        try:
+            result = await self.render(f, args, kwargs)
+            await self.store(key, result, kwargs)
+            self._refresh_failed.discard(key)
+        except Exception:
+            logger.exception(f"Unable to refresh cache entry {key}, the stale entry will be served until it expires")
+            record_cache_refresh_error(self.get_metric_labels(kwargs))
+            self._refresh_failed.add(key)
+        finally:
+            self._refreshing.discard(key)
+
 
 class CachedTiles(CachedABC):
     """Custom Cached Decorator for Titiler tile route(s)."""
 
-    async def read_cache(self, key: str) -> Response | None:
+    # Keyword argument of the router function holding the path or url of the data being read
+    source_kwarg = "src_path"
+    # Keyword arguments of the router function which do not affect the response, and are left out of the cache key
+    ignored_kwargs: tuple[str, ...] = ("client_id",)
+
+    def get_layer(self, kwargs: dict[str, Any]) -> tuple[str, int | None]:
+        return get_layer_name(kwargs[self.source_kwarg]), kwargs.get("z")
+
+    def get_cache_key(self, f: Callable, args: tuple, kwargs: dict[str, Any]) -> str:
+        """
+        Build the cache key for a tile.
+
+        The key is prefixed with the layer and zoom level namespace, so that entries can be purged by layer or zoom.
+        The source path is normalised, as presigned S3 urls differ on every request. The version of the source, passed
+        to the router function as `source_version`, is part of the key so overwritten data is never served from the
+        cache.
+
+        Args:
+            f: The tile router function.
+            args: Positional arguments of the router function.
+            kwargs: Keyword arguments of the router function.
+
+        Returns:
+            Cache key for the tile.
+
+        """
+        prefix = cache_namespaces.prefix(*self.get_layer(kwargs))
+        key_kwargs = {key: value for key, value in kwargs.items() if key not in self.ignored_kwargs}
+        key_kwargs[self.source_kwarg] = get_source_id(kwargs[self.source_kwarg])
+        return prefix + self._key_from_args(f, args, key_kwargs)
+
+    def get_metric_labels(self, kwargs: dict[str, Any]) -> dict[str, str]:
+        return get_stage_labels(kwargs.get("src_path"), kwargs.get("z"), kwargs.get("format"))
+
+    async def read_cache(self, key: str) -> CacheEntry | None:
         """Read data from the cache.
 
         To construct the returned response object, the image bytes data needs to be extracted from the stored json,
@@ -96,7 +454,7 @@ class CachedTiles(CachedABC):
             key: key indexing the cached data to be returned.
 
         Returns:
-            Response constructed from the cached data.
+            Response constructed from the cached data and the time it was cached.
 
         """
         value = await self.get_from_cache(key)
@@ -107,7 +465,7 @@ class CachedTiles(CachedABC):
         result_data = json.loads(value)
         image_bytes = base64.b64decode(result_data["body"].encode())
         response = Response(image_bytes, headers=result_data["headers"])
-        return response
+        return CacheEntry(response=response, created=result_data.get("created", 0))
 
     async def write_cache(self, key: str, result: Response) -> None:
         """
@@ -117,6 +475,7 @@ class CachedTiles(CachedABC):
         containing the following data
         {
                 "body": image byte data encoded as a bytes64 string,
+                "created": unix time the data was cached,
                 "headers": {
                     "content-bbox": "-310028.5867247395,7169181.756923294,-309417.0904984586,7169793.2531495765",
                     "content-crs": "<http://www.opengis.net/def/crs/EPSG/0/3857>",
@@ -134,17 +493,91 @@ class CachedTiles(CachedABC):
         data_to_cache = json.dumps(
             {
                 "body": image_bytes.decode(),
-                "headers": {key.decode(): value.decode() for (key, value) in result.headers.raw},
+                "created": time.time(),
+                "headers": {
+                    key.decode(): value.decode()
+                    for (key, value) in result.headers.raw
+                    if key.lower() not in (b"x-cache", b"warning")
+                },
             }
         )
         await self.set_in_cache(key, data_to_cache)
 
 
+class CachedVector(CachedTiles):
+    """Custom Cached Decorator for the vector route."""
+
+    source_kwarg = "url"
+    ignored_kwargs = ("s3_client", "client_id")
+
+    def get_metric_labels(self, kwargs: dict[str, Any]) -> dict[str, str]:
+        return get_stage_labels(kwargs.get("url"), None, "geojson")
+
+
+# aiocache backend classes of the cache backend setting
+CACHE_BACKENDS = {
+    "memory": "aiocache.SimpleMemoryCache",
+    "disk": "geospatial_api.disk_cache.SQLiteCache",
+    "tiered": "geospatial_api.disk_cache.TieredCache",
+}
+
+
+# Cache backends with a disk tier, which persists across restarts and may be shared by several workers
+DISK_BACKENDS = ("disk", "tiered")
+
+
+async def purge_disk_cache(layer: str = ALL_LAYERS, zooms: range | None = None) -> int:
+    """
+    Delete the purged entries of a layer or range of zoom levels from the disk tier of the cache, if there is one.
+
+    Purging a layer or zoom level only changes the generation counters of the process receiving the purge, which are
+    reset on restart. The entries are deleted from the disk tier as well, so that they cannot be served again after a
+    restart or by other workers sharing the database.
+
+    Args:
+        layer: Name of the layer, or `ALL_LAYERS` for every layer.
+        zooms: Zoom levels to purge, or None for every zoom level.
+
+    Returns:
+        Number of entries deleted.
+
+    """
+    if cache_setting.backend not in DISK_BACKENDS:
+        return 0
+
+    cache = aiocache.caches.get("default")
+    namespace = cache.namespace or ""
+
+    def is_purged(key: str) -> bool:
+        return key.startswith(namespace) and CacheNamespaces.matches(key[len(namespace) :], layer, zooms)
+
+    return await cache.raw("delete_where", is_purged)
+
+
 def setup_cache() -> None:
-    """Setup aiocache."""
+    """Setup aiocache.
+
+    This is called when the module is imported, as aiocache resolves the cache alias used by the decorators when they
+    are applied to the router functions.
+
+    The cache is held in memory by default. The "disk" backend stores it in a local SQLite database which persists
+    across restarts, and the "tiered" backend keeps recently used entries in memory on top of the database.
+    """
     config: dict[str, Any] = {
-        "cache": "aiocache.SimpleMemoryCache",
+        "cache": CACHE_BACKENDS[cache_setting.backend],
         "serializer": {"class": "aiocache.serializers.PickleSerializer"},
+        "namespace": cache_setting.namespace,
     }
+    if cache_setting.backend != "memory":
+        config["path"] = cache_setting.disk_path
+        config["max_bytes"] = cache_setting.disk_max_bytes
+    if cache_setting.backend == "tiered":
+        config["memory_ttl"] = cache_setting.memory_ttl
+
+    # Entries are kept until the hard ttl, and served while being refreshed once older than the soft ttl
     if cache_setting.ttl is not None:
         config["ttl"] = cache_setting.ttl
+    aiocache.caches.set_config({"default": config})
+
+
+setup_cache()
@@ -0,0 +1,107 @@
+"""Catalogue of metadata about the objects in the geospatial data bucket.
+
+The catalogue is a JSON document stored in the bucket itself, so it needs no separate database. It maps each object
+key to the metadata recorded for it, along with the ETag of the object the metadata describes, so that metadata about
+an object that has since been overwritten can be ignored. Statistics of each raster are stored as a separate
+document under `STATISTICS_PREFIX`, as they are updated far more often than the layouts.
+"""
+
+import json
+import logging
+from typing import Any
+
+from botocore.exceptions import ClientError
+from mypy_boto3_s3 import S3Client
+
+logger = logging.getLogger(__name__)
+
+# Key of the catalogue of raster layouts, see `geospatial_api.ingest`
+LAYOUTS_KEY = "_catalogue/layouts.json"
+# Prefix of the statistics computed for each raster, see `geospatial_api.raster_statistics`
+STATISTICS_PREFIX = "_catalogue/statistics/"
+
+
+def read_catalogue(s3_client: S3Client, bucket: str, key: str = LAYOUTS_KEY) -> dict[str, dict[str, Any]]:
+    """
+    Read a catalogue from the bucket.
+
+    Args:
+        s3_client: S3 Client used to read the catalogue.
+        bucket: Name of the bucket holding the catalogue.
+        key: Key of the catalogue object.
+
+    Returns:
+        Metadata of each object keyed by object key, which is empty if the catalogue does not exist or is unreadable.
+
+    """
+    try:
+        response = s3_client.get_object(Bucket=bucket, Key=key)
+        return json.loads(response["Body"].read())
+    except ClientError as error:
+        if error.response.get("Error", {}).get("Code") not in ("NoSuchKey", "404"):
+            logger.warning(f"Could not read the catalogue s3://{bucket}/{key}: {error}")
+    except ValueError as error:
+        logger.warning(f"Could not parse the catalogue s3://{bucket}/{key}: {error}")
+    return {}
+
+
+def update_catalogue(
+    s3_client: S3Client, bucket: str, entries: dict[str, dict[str, Any]], key: str = LAYOUTS_KEY
+) -> dict[str, dict[str, Any]]:
+    """
+    Add or replace entries in a catalogue, creating it if needed.
+
+    The catalogue is read, updated and written back, so it must only be updated by one process at a time.
+
+    Args:
+        s3_client: S3 Client used to read and write the catalogue.
+        bucket: Name of the bucket holding the catalogue.
+        entries: Metadata of each object to record, keyed by object key.
+        key: Key of the catalogue object.
+
+    Returns:
+        The updated catalogue.
+
+    """
+    catalogue = read_catalogue(s3_client, bucket, key)
+    catalogue.update(entries)
+    write_catalogue(s3_client, bucket, catalogue, key)
+    return catalogue
+
+
+def write_catalogue(s3_client: S3Client, bucket: str, catalogue: dict[str, Any], key: str = LAYOUTS_KEY) -> None:
+    """
+    Write a catalogue to the bucket, replacing any existing one.
+
+    Args:
+        s3_client: S3 Client used to write the catalogue.
+        bucket: Name of the bucket to hold the catalogue.
+        catalogue: Content of the catalogue.
+        key: Key of the catalogue object.
+
+    """
+    s3_client.put_object(
+        Bucket=bucket,
+        Key=key,
+        Body=json.dumps(catalogue, indent=2, sort_keys=True).encode(),
+        ContentType="application/json",
+    )
+
+
+def get_entry(catalogue: dict[str, dict[str, Any]], key: str, etag: str) -> dict[str, Any] | None:
+    """
+    Get the catalogue entry of an object, if it describes the current version of the object.
+
+    Args:
+        catalogue: Catalogue read with `read_catalogue`.
+        key: Key of the object.
+        etag: Current ETag of the object, with or without quotes.
+
+    Returns:
+        The entry, or None if there is none or it was recorded for a previous version of the object.
+
+    """
+    entry = catalogue.get(key)
+    if entry is None or entry.get("etag") != etag.strip('"'):
+        return None
+    return entry
@@ -0,0 +1,62 @@
+"""Resources shared by the whole application.
+
+The config and S3 client are created once, either at startup by the application lifespan or on first use, rather than
+separately by each module at import time.
+"""
+
+import threading
+from typing import Any
+
+from mypy_boto3_s3 import S3Client
+
+from geospatial_api.config import setup_config
+from geospatial_api.utils import create_s3_client
+
+
+class AppContext:
+    """Lazily created config and S3 client shared by the application."""
+
+    def __init__(self) -> None:
+        self._config: Any = None
+        self._s3_client: S3Client | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def config(self) -> Any:
+        if self._config is None:
+            with self._lock:
+                if self._config is None:
+                    self._config = setup_config()
+        return self._config
+
+    @property
+    def s3_client(self) -> S3Client:
+        if self._s3_client is None:
+            config = self.config
+            with self._lock:
+                if self._s3_client is None:
+                    self._s3_client = create_s3_client(config)
+        return self._s3_client
+
+    def startup(self) -> None:
+        """Create the shared resources, so that the first request does not have to wait for them."""
+        _ = self.s3_client
+
+    def reset(self) -> None:
+        """Discard the shared resources, so they are created again on next use."""
+        with self._lock:
+            self._config = None
+            self._s3_client = None
+
+
+app_context = AppContext()
+
+
+def get_config() -> Any:
+    """Get the API config."""
+    return app_context.config
+
+
+def get_s3_client() -> S3Client:
+    """Get the S3 client shared by the application. Also used as a FastAPI dependency."""
+    return app_context.s3_client
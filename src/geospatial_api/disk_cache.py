@@ -0,0 +1,349 @@
+"""Persistent tile cache tier stored in a local SQLite database.
+
+The disk cache keeps entries across restarts and deploys, up to a byte budget beyond which the least recently used
+entries are evicted. It can be used on its own, or underneath the in-memory cache with `TieredCache`.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+from aiocache import SimpleMemoryCache
+from aiocache.base import BaseCache
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the byte budget to evict down to once it is exceeded, so that eviction does not run on every write
+EVICTION_TARGET = 0.9
+# Access times of cache hits are recorded in memory and written in a single transaction once this many are pending,
+# or once the oldest is this many seconds old, so that reads do not each need a write transaction
+ACCESS_BATCH_SIZE = 256
+ACCESS_FLUSH_INTERVAL = 5.0
+
+
+class SQLiteBackend:
+    """Blocking SQLite store of cache entries with least recently used eviction.
+
+    A single connection is shared between threads and serialised with a lock. The database uses write-ahead logging,
+    so several worker processes can share the same file. Access times are written in batches, so the eviction order
+    lags slightly behind the reads of each worker.
+    """
+
+    def __init__(self, path: str | Path, max_bytes: int) -> None:
+        """
+        Args:
+            path: Path of the SQLite database file, which is created if it does not exist.
+            max_bytes: Byte budget of the stored values.
+        """
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value BLOB, size INTEGER, expires REAL, accessed INTEGER)"
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed)")
+        # Running estimate of the stored bytes, resynchronised from the database whenever it exceeds the budget
+        self._size = self.size()
+        # Access times of the entries read since the last flush, by key
+        self._accessed: dict[str, int] = {}
+        self._flushed = time.monotonic()
+
+    def size(self) -> int:
+        """Total size of the stored values in bytes."""
+        with self._lock:
+            return int(self._connection.execute("SELECT total(size) FROM entries").fetchone()[0])
+
+    def get(self, key: str) -> Any:
+        entry = self.get_entry(key)
+        return entry[0] if entry is not None else None
+
+    def get_entry(self, key: str) -> tuple[Any, float | None] | None:
+        """
+        Read an entry and record its access time.
+
+        Args:
+            key: Key of the entry.
+
+        Returns:
+            Value of the entry and the time it expires at, or None if there is no unexpired entry.
+
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT value, expires FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] is not None and row[1] <= now:
+                self._connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            self._accessed[key] = time.time_ns()
+            if len(self._accessed) >= ACCESS_BATCH_SIZE or time.monotonic() - self._flushed >= ACCESS_FLUSH_INTERVAL:
+                self._flush_accessed()
+        return row[0], row[1]
+
+    def _flush_accessed(self) -> None:
+        """Write the pending access times in a single transaction. Must be called with the lock held."""
+        if self._accessed:
+            self._connection.execute("BEGIN")
+            try:
+                self._connection.executemany(
+                    "UPDATE entries SET accessed = ? WHERE key = ?",
+                    [(accessed, key) for key, accessed in self._accessed.items()],
+                )
+            except Exception:
+                self._connection.execute("ROLLBACK")
+                raise
+            self._connection.execute("COMMIT")
+            self._accessed.clear()
+        self._flushed = time.monotonic()
+
+    def set(self, key: str, value: Any, ttl: float | None) -> None:
+        now = time.time()
+        size = len(value) if value is not None else 0
+        with self._lock:
+            replaced = self._connection.execute("SELECT size FROM entries WHERE key = ?", (key,)).fetchone()
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, expires, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now + ttl if ttl else None, time.time_ns()),
+            )
+            self._accessed.pop(key, None)
+        self._size += size - (replaced[0] if replaced is not None else 0)
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def evict(self) -> None:
+        """Remove expired entries, then the least recently used entries until the store is within its budget."""
+        with self._lock:
+            self._flush_accessed()
+            self._connection.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+            size = int(self._connection.execute("SELECT total(size) FROM entries").fetchone()[0])
+            excess = size - self.max_bytes * EVICTION_TARGET
+            if excess > 0:
+                evicted = []
+                for key, entry_size in self._connection.execute("SELECT key, size FROM entries ORDER BY accessed"):
+                    if excess <= 0:
+                        break
+                    evicted.append((key,))
+                    excess -= entry_size
+                    size -= entry_size
+                self._connection.executemany("DELETE FROM entries WHERE key = ?", evicted)
+                logger.info(f"Evicted {len(evicted)} entries from the disk cache {self.path}")
+        self._size = size
+
+    def delete(self, key: str) -> int:
+        with self._lock:
+            return self._connection.execute("DELETE FROM entries WHERE key = ?", (key,)).rowcount
+
+    def expire(self, key: str, ttl: float | None) -> bool:
+        with self._lock:
+            cursor = self._connection.execute(
+                "UPDATE entries SET expires = ? WHERE key = ?", (time.time() + ttl if ttl else None, key)
+            )
+        return cursor.rowcount > 0
+
+    def clear(self, prefix: str | None = None) -> None:
+        """Remove every entry, or only the entries whose key starts with a prefix."""
+        with self._lock:
+            if prefix:
+                self._connection.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            else:
+                self._connection.execute("DELETE FROM entries")
+        self._size = self.size()
+
+    def delete_where(self, predicate: Callable[[str], bool]) -> int:
+        """
+        Remove the entries whose key matches a predicate.
+
+        Args:
+            predicate: Function called with the key of every entry, returning whether to remove it.
+
+        Returns:
+            Number of entries removed.
+
+        """
+        with self._lock:
+            self._connection.create_function("key_matches", 1, lambda key: bool(predicate(key)))
+            deleted = self._connection.execute("DELETE FROM entries WHERE key_matches(key)").rowcount
+        self._size = self.size()
+        return deleted
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_accessed()
+            self._connection.close()
+
+
+class SQLiteCache(BaseCache):
+    """aiocache backend storing entries in a local SQLite database, with its blocking I/O run in worker threads."""
+
+    NAME = "sqlite"
+
+    def __init__(self, path: str | Path, max_bytes: int, serializer: Any = None, **kwargs: Any) -> None:
+        """
+        Args:
+            path: Path of the SQLite database file.
+            max_bytes: Byte budget of the stored values, beyond which the least recently used entries are evicted.
+            serializer: aiocache serializer of the stored values.
+            **kwargs: Options passed through to `aiocache.base.BaseCache`.
+        """
+        super().__init__(serializer=serializer, **kwargs)
+        self.backend = SQLiteBackend(path, max_bytes)
+
+    async def _get(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        return await asyncio.to_thread(self.backend.get, key)
+
+    async def _gets(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        return await self._get(key, encoding=encoding, _conn=_conn)
+
+    async def _multi_get(self, keys: list[str], encoding: str = "utf-8", _conn: Any = None) -> list[Any]:
+        return await asyncio.to_thread(lambda: [self.backend.get(key) for key in keys])
+
+    async def _set(
+        self, key: str, value: Any, ttl: float | None = None, _cas_token: Any = None, _conn: Any = None
+    ) -> bool:
+        await asyncio.to_thread(self.backend.set, key, value, ttl)
+        return True
+
+    async def _multi_set(self, pairs: list[tuple[str, Any]], ttl: float | None = None, _conn: Any = None) -> bool:
+        await asyncio.to_thread(lambda: [self.backend.set(key, value, ttl) for key, value in pairs])
+        return True
+
+    async def _add(self, key: str, value: Any, ttl: float | None = None, _conn: Any = None) -> bool:
+        if await self._exists(key):
+            raise ValueError(f"Key {key} already exists, use .set to update the value")
+        return await self._set(key, value, ttl=ttl)
+
+    async def _exists(self, key: str, _conn: Any = None) -> bool:
+        return await self._get(key) is not None
+
+    async def _increment(self, key: str, delta: int, _conn: Any = None) -> int:
+        value = int(await self._get(key) or 0) + delta
+        await self._set(key, value)
+        return value
+
+    async def _expire(self, key: str, ttl: float | None, _conn: Any = None) -> bool:
+        return await asyncio.to_thread(self.backend.expire, key, ttl)
+
+    async def _delete(self, key: str, _conn: Any = None) -> int:
+        return await asyncio.to_thread(self.backend.delete, key)
+
+    async def _clear(self, namespace: str | None = None, _conn: Any = None) -> bool:
+        await asyncio.to_thread(self.backend.clear, namespace)
+        return True
+
+    async def _raw(self, command: str, *args: Any, encoding: str = "utf-8", _conn: Any = None, **kwargs: Any) -> Any:
+        return await asyncio.to_thread(getattr(self.backend, command), *args, **kwargs)
+
+    async def _redlock_release(self, key: str, value: Any) -> int:
+        if await self._get(key) == value:
+            return await self._delete(key)
+        return 0
+
+    async def _close(self, *args: Any, _conn: Any = None, **kwargs: Any) -> None:
+        await asyncio.to_thread(self.backend.close)
+
+
+class TieredCache(BaseCache):
+    """aiocache backend keeping recently used entries in memory, on top of a persistent SQLite cache.
+
+    Entries are written to both tiers. Reads are served from memory where possible, and entries read from disk are
+    promoted back into memory. Entries only stay in memory for `memory_ttl` seconds, and never beyond their expiry on
+    disk, so the memory tier holds the working set while the disk tier holds everything within its byte budget.
+    """
+
+    NAME = "tiered"
+
+    def __init__(
+        self, path: str | Path, max_bytes: int, memory_ttl: float | None = None, serializer: Any = None, **kwargs: Any
+    ) -> None:
+        """
+        Args:
+            path: Path of the SQLite database file of the disk tier.
+            max_bytes: Byte budget of the disk tier.
+            memory_ttl: Maximum time in seconds entries are kept in the memory tier.
+            serializer: aiocache serializer of the stored values.
+            **kwargs: Options passed through to `aiocache.base.BaseCache`.
+        """
+        super().__init__(serializer=serializer, **kwargs)
+        self.memory_ttl = memory_ttl
+        # The tiers store the values serialised by this cache, under the keys built by this cache
+        self.memory = SimpleMemoryCache()
+        self.disk = SQLiteCache(path, max_bytes)
+
+    def _memory_ttl(self, ttl: float | None) -> float | None:
+        if self.memory_ttl is None:
+            return ttl
+        return min(ttl, self.memory_ttl) if ttl else self.memory_ttl
+
+    async def _get(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        value = await self.memory._get(key, encoding=encoding)
+        if value is None:
+            entry = await asyncio.to_thread(self.disk.backend.get_entry, key)
+            if entry is not None:
+                value, expires = entry
+                ttl = expires - time.time() if expires is not None else None
+                await self.memory._set(key, value, ttl=self._memory_ttl(ttl))
+        return value
+
+    async def _gets(self, key: str, encoding: str = "utf-8", _conn: Any = None) -> Any:
+        return await self._get(key, encoding=encoding, _conn=_conn)
+
+    async def _multi_get(self, keys: list[str], encoding: str = "utf-8", _conn: Any = None) -> list[Any]:
+        return [await self._get(key, encoding=encoding) for key in keys]
+
+    async def _set(
+        self, key: str, value: Any, ttl: float | None = None, _cas_token: Any = None, _conn: Any = None
+    ) -> bool:
+        await self.memory._set(key, value, ttl=self._memory_ttl(ttl))
+        return await self.disk._set(key, value, ttl=ttl)
+
+    async def _multi_set(self, pairs: list[tuple[str, Any]], ttl: float | None = None, _conn: Any = None) -> bool:
+        for key, value in pairs:
+            await self._set(key, value, ttl=ttl)
+        return True
+
+    async def _add(self, key: str, value: Any, ttl: float | None = None, _conn: Any = None) -> bool:
+        if await self._exists(key):
+            raise ValueError(f"Key {key} already exists, use .set to update the value")
+        return await self._set(key, value, ttl=ttl)
+
+    async def _exists(self, key: str, _conn: Any = None) -> bool:
+        return await self.memory._exists(key) or await self.disk._exists(key)
+
+    async def _increment(self, key: str, delta: int, _conn: Any = None) -> int:
+        value = int(await self._get(key) or 0) + delta
+        await self._set(key, value)
+        return value
+
+    async def _expire(self, key: str, ttl: float | None, _conn: Any = None) -> bool:
+        await self.memory._expire(key, self._memory_ttl(ttl))
+        return await self.disk._expire(key, ttl)
+
+    async def _delete(self, key: str, _conn: Any = None) -> int:
+        deleted = await self.memory._delete(key)
+        return max(deleted, await self.disk._delete(key))
+
+    async def _clear(self, namespace: str | None = None, _conn: Any = None) -> bool:
+        await self.memory._clear(namespace)
+        return await self.disk._clear(namespace)
+
+    async def _raw(self, command: str, *args: Any, encoding: str = "utf-8", _conn: Any = None, **kwargs: Any) -> Any:
+        return await self.disk._raw(command, *args, encoding=encoding, **kwargs)
+
+    async def _redlock_release(self, key: str, value: Any) -> int:
+        if await self._get(key) == value:
+            return await self._delete(key)
+        return 0
+
+    async def _close(self, *args: Any, _conn: Any = None, **kwargs: Any) -> None:
+        await self.disk._close()
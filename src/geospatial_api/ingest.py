@@ -0,0 +1,407 @@
+"""Validation and optimisation of the rasters in the geospatial data bucket.
+
+Tiles are read from rasters with HTTP range requests, so the internal layout of a raster decides how many bytes each
+tile costs. A raster that is not internally tiled is read in strips across its full width, and one without overviews
+is read at full resolution for every zoomed out tile. This module checks that each raster is a cloud optimised GeoTIFF
+(COG), rewrites those that are not into tiled and compressed COGs with overviews, and records the layout of every
+raster in the catalogue, see `geospatial_api.catalogue`.
+
+Rewritten rasters replace the original object, whose new ETag replaces the cached tiles of the old one.
+
+Examples:
+    Report the layout of every raster in the data bucket without changing anything::
+
+        python -m geospatial_api.ingest --dry-run
+
+    Optimise the rasters under a prefix, using zstd compression::
+
+        python -m geospatial_api.ingest --prefix raster/ --compression zstd
+"""
+
+import argparse
+import json
+import logging
+import math
+import sys
+import tempfile
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, get_args
+
+import numpy as np
+import rasterio
+from boto3.exceptions import Boto3Error
+from botocore.exceptions import BotoCoreError, ClientError
+from mypy_boto3_s3 import S3Client
+from rasterio.errors import RasterioError
+from rasterio.io import DatasetReader
+from rio_cogeo.cogeo import RIOResampling, cog_translate, cog_validate
+from rio_cogeo.profiles import cog_profiles
+
+from geospatial_api.catalogue import LAYOUTS_KEY, update_catalogue
+from geospatial_api.config import setup_config
+from geospatial_api.utils import create_s3_client, get_file_path
+
+logger = logging.getLogger(__name__)
+
+# Size in pixels of the tiles served by the API
+DEFAULT_TILESIZE = 256
+# Size in pixels of the internal blocks of rewritten rasters, a tile at any offset then reads at most four blocks
+DEFAULT_BLOCKSIZE = 512
+# Size in pixels above which both edges of a raster must be for it to be rewritten only to add overviews. rio-cogeo
+# recommends overviews above 512 pixels, but a zoomed out tile of a raster up to 1024 pixels reads only a few blocks
+MIN_OVERVIEW_SIZE = 1024
+# Lossless compressions that rasters can be rewritten with
+COMPRESSIONS = ("deflate", "zstd", "lzw")
+
+
+@dataclass
+class RasterLayout:
+    """Internal layout of a raster, and the estimated bytes read for each tile.
+
+    Attributes:
+        valid_cog: Whether the raster is a valid cloud optimised GeoTIFF.
+        width: Width of the raster in pixels.
+        height: Height of the raster in pixels.
+        count: Number of bands.
+        dtype: Data type of the first band.
+        compression: Compression of the raster, or None if uncompressed.
+        tiled: Whether the raster is stored in tiles rather than strips.
+        block_shape: Shape of the internal blocks as (height, width).
+        overviews: Decimation factor of each internal overview.
+        tile_bytes: Estimated bytes read for a tile, see `estimate_tile_bytes`.
+        errors: Reasons the raster is not a valid COG.
+        warnings: Issues with the raster that do not stop it being a valid COG.
+    """
+
+    valid_cog: bool
+    width: int
+    height: int
+    count: int
+    dtype: str
+    compression: str | None
+    tiled: bool
+    block_shape: tuple[int, int]
+    overviews: list[int]
+    tile_bytes: dict[str, int]
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+
+
+@dataclass
+class IngestResult:
+    """Outcome of ingesting a raster.
+
+    Attributes:
+        key: Key of the raster in the bucket.
+        etag: ETag of the raster after ingest.
+        before: Layout of the raster as found.
+        after: Layout of the rewritten raster, or None if it was not rewritten.
+    """
+
+    key: str
+    etag: str
+    before: RasterLayout
+    after: RasterLayout | None = None
+
+    def catalogue_entry(self) -> dict[str, Any]:
+        """Get the layout to record in the catalogue, along with the estimated tile bytes before any rewrite."""
+        return {
+            "etag": self.etag,
+            **asdict(self.after or self.before),
+            "optimized": self.after is not None,
+            "tile_bytes_before": self.before.tile_bytes if self.after is not None else None,
+        }
+
+
+def estimate_tile_bytes(dataset: DatasetReader, file_size: int, tilesize: int = DEFAULT_TILESIZE) -> dict[str, int]:
+    """
+    Estimate the bytes read to render a tile from a raster.
+
+    Every block a tile intersects is read whole, and a compressed pixel is assumed to be the same size throughout the
+    raster and its overviews.
+
+    Args:
+        dataset: Open raster.
+        file_size: Size of the raster file in bytes.
+        tilesize: Size in pixels of the tiles.
+
+    Returns:
+        Estimated bytes read for a tile at full resolution ("full_resolution"), and for a single tile covering the
+            whole raster ("full_extent"), which is read from the smallest overview at least a tile across.
+
+    """
+    levels = [1, *dataset.overviews(1)]
+    level_shapes = [(math.ceil(dataset.height / level), math.ceil(dataset.width / level)) for level in levels]
+    pixel_bytes = file_size / sum(height * width for height, width in level_shapes)
+    block_height, block_width = dataset.block_shapes[0]
+
+    def window_bytes(shape: tuple[int, int], window_size: int) -> int:
+        # A window that is not aligned to the blocks intersects one more block in each direction
+        rows = min(math.ceil(window_size / block_height) + 1, math.ceil(shape[0] / block_height))
+        columns = min(math.ceil(window_size / block_width) + 1, math.ceil(shape[1] / block_width))
+        return round(min(rows * block_height, shape[0]) * min(columns * block_width, shape[1]) * pixel_bytes)
+
+    overview_shapes = [shape for shape in level_shapes if max(shape) >= tilesize] or level_shapes[:1]
+    return {
+        "full_resolution": window_bytes(level_shapes[0], tilesize),
+        "full_extent": window_bytes(overview_shapes[-1], max(overview_shapes[-1])),
+    }
+
+
+def inspect_layout(path: str | Path, file_size: int, tilesize: int = DEFAULT_TILESIZE) -> RasterLayout:
+    """
+    Validate a raster as a COG and describe its layout.
+
+    Only the header of the raster is read, so a presigned url can be inspected without downloading the raster.
+
+    Args:
+        path: Local path or url of the raster.
+        file_size: Size of the raster file in bytes.
+        tilesize: Size in pixels of the tiles served from the raster.
+
+    Returns:
+        Layout of the raster.
+
+    """
+    valid, errors, warnings = cog_validate(str(path), quiet=True)
+    with rasterio.open(path) as dataset:
+        return RasterLayout(
+            valid_cog=valid,
+            width=dataset.width,
+            height=dataset.height,
+            count=dataset.count,
+            dtype=dataset.dtypes[0],
+            compression=dataset.compression.value.lower() if dataset.compression else None,
+            tiled=bool(dataset.profile.get("tiled", False)),
+            block_shape=dataset.block_shapes[0],
+            overviews=dataset.overviews(1),
+            tile_bytes=estimate_tile_bytes(dataset, file_size, tilesize),
+            errors=list(errors),
+            warnings=list(warnings),
+        )
+
+
+def needs_optimization(layout: RasterLayout, min_overview_size: int = MIN_OVERVIEW_SIZE) -> bool:
+    """
+    Check whether a raster should be rewritten, because it is not a valid COG, is uncompressed or lacks overviews.
+
+    Args:
+        layout: Layout of the raster.
+        min_overview_size: Size in pixels above which both edges of a raster must be for missing overviews to need a
+            rewrite.
+
+    Returns:
+        Whether the raster should be rewritten.
+
+    """
+    missing_overviews = not layout.overviews and min(layout.width, layout.height) > min_overview_size
+    return not layout.valid_cog or not layout.tiled or layout.compression is None or missing_overviews
+
+
+def optimize_raster(
+    src_path: str | Path,
+    dst_path: str | Path,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    compression: str = "deflate",
+    overview_resampling: RIOResampling = "nearest",
+) -> None:
+    """
+    Rewrite a raster as a tiled, compressed COG with overviews.
+
+    Args:
+        src_path: Local path of the raster.
+        dst_path: Local path to write the COG to.
+        blocksize: Width and height in pixels of the internal blocks.
+        compression: Lossless compression to use, one of `COMPRESSIONS`.
+        overview_resampling: Resampling method used to build the overviews. The default of nearest keeps the values of
+            categorical rasters, such as land cover, but "average" gives smoother overviews of continuous data.
+
+    """
+    with rasterio.open(src_path) as dataset:
+        dtype = np.dtype(dataset.dtypes[0])
+
+    profile = cog_profiles.get(compression)
+    # Predictors make neighbouring values more compressible, using floating point differences for float data
+    profile.update(blockxsize=blocksize, blockysize=blocksize, predictor=3 if dtype.kind == "f" else 2)
+    cog_translate(str(src_path), str(dst_path), profile, overview_resampling=overview_resampling, quiet=True)
+
+
+def list_rasters(s3_client: S3Client, bucket: str, prefix: str = "") -> list[str]:
+    """List the keys of the GeoTIFFs in a bucket."""
+    keys = []
+    for page in s3_client.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(item["Key"] for item in page.get("Contents", []) if item["Key"].lower().endswith((".tif", ".tiff")))
+    return keys
+
+
+def ingest_raster(
+    s3_client: S3Client,
+    bucket: str,
+    key: str,
+    workdir: Path,
+    dry_run: bool = False,
+    force: bool = False,
+    tilesize: int = DEFAULT_TILESIZE,
+    min_overview_size: int = MIN_OVERVIEW_SIZE,
+    blocksize: int = DEFAULT_BLOCKSIZE,
+    compression: str = "deflate",
+    overview_resampling: RIOResampling = "nearest",
+) -> IngestResult:
+    """
+    Validate a raster in S3, and replace it with an optimised COG if needed.
+
+    The raster is only downloaded if it is rewritten, otherwise just its header is read.
+
+    Args:
+        s3_client: S3 Client used to read and write the raster.
+        bucket: Name of the bucket holding the raster.
+        key: Key of the raster.
+        workdir: Directory to download and rewrite the raster in.
+        dry_run: Only report the layout of the raster, without rewriting it.
+        force: Rewrite the raster even if it is already optimised.
+        tilesize: Size in pixels of the tiles served from the raster.
+        min_overview_size: Size in pixels above which both edges of a raster must be for it to be rewritten only to
+            add overviews.
+        blocksize: Width and height in pixels of the internal blocks of a rewritten raster.
+        compression: Lossless compression of a rewritten raster, one of `COMPRESSIONS`.
+        overview_resampling: Resampling method used to build the overviews of a rewritten raster.
+
+    Raises:
+        ValueError: The rewritten raster is not a valid COG, in which case the original is kept.
+
+    Returns:
+        The layout of the raster before and after any rewrite.
+
+    """
+    url = f"s3://{bucket}/{key}"
+    head = s3_client.head_object(Bucket=bucket, Key=key)
+    result = IngestResult(
+        key=key,
+        etag=head["ETag"].strip('"'),
+        before=inspect_layout(get_file_path(url, s3_client), head["ContentLength"], tilesize),
+    )
+    if dry_run or not (force or needs_optimization(result.before, min_overview_size)):
+        return result
+
+    src_path, dst_path = workdir.joinpath("source.tif"), workdir.joinpath("optimized.tif")
+    logger.info(f"Rewriting {url} as a COG")
+    s3_client.download_file(bucket, key, str(src_path))
+    optimize_raster(src_path, dst_path, blocksize, compression, overview_resampling)
+    after = inspect_layout(dst_path, dst_path.stat().st_size, tilesize)
+    if not after.valid_cog:
+        raise ValueError(f"Rewriting {url} did not produce a valid COG: {after.errors}")
+
+    s3_client.upload_file(str(dst_path), bucket, key, ExtraArgs={"ContentType": "image/tiff"})
+    result.etag = s3_client.head_object(Bucket=bucket, Key=key)["ETag"].strip('"')
+    result.after = after
+    return result
+
+
+def ingest(
+    s3_client: S3Client, bucket: str, prefix: str = "", dry_run: bool = False, **options: Any
+) -> list[IngestResult]:
+    """
+    Validate every raster in a bucket, rewrite those that are not optimised, and record their layouts.
+
+    A raster that cannot be read or rewritten is logged and skipped, leaving its catalogue entry unchanged.
+
+    Args:
+        s3_client: S3 Client used to read and write the rasters and the catalogue.
+        bucket: Name of the bucket holding the rasters.
+        prefix: Only ingest rasters with keys starting with this prefix.
+        dry_run: Only report the layout of each raster, without rewriting rasters or updating the catalogue.
+        **options: Other options passed to `ingest_raster`.
+
+    Returns:
+        The outcome of ingesting each raster.
+
+    """
+    results = []
+    for key in list_rasters(s3_client, bucket, prefix):
+        with tempfile.TemporaryDirectory() as workdir:
+            try:
+                results.append(ingest_raster(s3_client, bucket, key, Path(workdir), dry_run, **options))
+            except (Boto3Error, BotoCoreError, ClientError, RasterioError, ValueError):
+                logger.exception(f"Failed to ingest s3://{bucket}/{key}")
+
+    if results and not dry_run:
+        update_catalogue(s3_client, bucket, {result.key: result.catalogue_entry() for result in results}, LAYOUTS_KEY)
+    return results
+
+
+def format_size(size: int) -> str:
+    """Format a number of bytes for display."""
+    value = float(size)
+    for unit in ["B", "KiB", "MiB"]:
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GiB"
+
+
+def format_report(results: list[IngestResult]) -> str:
+    """Format the outcome of an ingest as a table of the estimated bytes read per tile before and after."""
+    header = f"{'raster':<60} {'valid':>5} {'rewritten':>9} {'tile bytes (full resolution)':>32} {'(full extent)':>26}"
+    lines = [header, "-" * len(header)]
+    for result in results:
+        before, after = result.before.tile_bytes, (result.after or result.before).tile_bytes
+        resolution = f"{format_size(before['full_resolution'])} -> {format_size(after['full_resolution'])}"
+        extent = f"{format_size(before['full_extent'])} -> {format_size(after['full_extent'])}"
+        valid = "yes" if (result.after or result.before).valid_cog else "no"
+        rewritten = "yes" if result.after is not None else "no"
+        lines.append(f"{result.key:<60} {valid:>5} {rewritten:>9} {resolution:>32} {extent:>26}")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m geospatial_api.ingest",
+        description="Validate the rasters in the geospatial data bucket and rewrite those that are not optimised COGs.",
+    )
+    parser.add_argument("--bucket", help="Bucket holding the rasters, defaults to the configured data bucket.")
+    parser.add_argument("--prefix", default="", help="Only ingest rasters with keys starting with this prefix.")
+    parser.add_argument("--dry-run", action="store_true", help="Report the layouts without changing anything.")
+    parser.add_argument("--force", action="store_true", help="Rewrite rasters even if they are already optimised.")
+    parser.add_argument("--tilesize", type=int, default=DEFAULT_TILESIZE, help="Size in pixels of the tiles served.")
+    parser.add_argument(
+        "--min-overview-size",
+        type=int,
+        default=MIN_OVERVIEW_SIZE,
+        help="Only rewrite rasters to add overviews if both edges are larger than this many pixels.",
+    )
+    parser.add_argument("--blocksize", type=int, default=DEFAULT_BLOCKSIZE, help="Block size of rewritten rasters.")
+    parser.add_argument("--compression", choices=COMPRESSIONS, default="deflate", help="Compression to rewrite with.")
+    parser.add_argument(
+        "--overview-resampling",
+        choices=get_args(RIOResampling),
+        default="nearest",
+        help="Resampling method used to build overviews, e.g. average.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print the catalogue entries as JSON rather than a table.")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    config = setup_config()
+    results = ingest(
+        create_s3_client(config),
+        args.bucket or config.geospatial_data_bucket,
+        args.prefix,
+        args.dry_run,
+        force=args.force,
+        tilesize=args.tilesize,
+        min_overview_size=args.min_overview_size,
+        blocksize=args.blocksize,
+        compression=args.compression,
+        overview_resampling=args.overview_resampling,
+    )
+
+    if args.json:
+        print(json.dumps({result.key: result.catalogue_entry() for result in results}, indent=2))
+    else:
+        print(format_report(results))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,18 @@
 import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
 
 from driutils.logger import setup_logging
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from .cache import setup_cache
-from .config import setup_config
+from .access_log import AccessLogMiddleware, access_log
+from .context import app_context, get_config
+from .memory import configure_gdal_cache
 from .metrics import Metrics
-from .routers import healthcheck, titiler_main, vector_main
+from .routers import admin, healthcheck, mosaic_main, timeseries_main, titiler_main, vector_main
 from .routers import main as main_router
+from .settings import memory_setting
 
 logger = logging.getLogger(__name__)
 
@@ -16,13 +20,26 @@ logger = logging.getLogger(__name__)
 setup_logging()
 
 # Setup Metadata
-config = setup_config()
+config = get_config()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """Create the shared resources and background services on startup, and stop them on shutdown."""
+    configure_gdal_cache(memory_setting.gdal_cache_mb, override="gdal_cache_mb" in memory_setting.model_fields_set)
+    app_context.startup()
+    metrics.start_exporter()
+    access_log.start()
+    yield
+    access_log.stop()
+    metrics.shutdown()
+
 
 # Setup the base application
 # --------------------------
 
 # Initialise API
-app = FastAPI(docs_url=None)
+app = FastAPI(docs_url=None, lifespan=lifespan)
 
 # Add middleware
 app.add_middleware(
@@ -32,8 +49,7 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialise the cache
-app.add_event_handler("startup", setup_cache)
+app.add_middleware(AccessLogMiddleware)
 
 # Setup the API
 # ------------------------
@@ -58,7 +74,10 @@ api.state.config = config
 api.include_router(healthcheck.router)
 api.include_router(main_router.router)
 api.include_router(titiler_main.router, prefix="/maps", tags=["Raster Data"])
+api.include_router(mosaic_main.router, prefix="/mosaic", tags=["Mosaic Data"])
 api.include_router(vector_main.router, tags=["Vector Data"])
+api.include_router(timeseries_main.router, tags=["Time Series"])
+api.include_router(admin.router, tags=["Admin"])
 
 
 # Mount services into base application
@@ -0,0 +1,197 @@
+"""Memory limits for tile rendering.
+
+A large tile, such as a 1024x1024 `@4x` tile of many bands with a buffer, can need hundreds of MB while it is read,
+post processed and rendered. Running many such renders at once is what exhausts the memory of a process, so the memory
+each render needs is estimated before its data is read and reserved from a budget shared by the process:
+
+- A render estimated to need more than the per-request limit is rejected, as it could never be rendered safely.
+- A render that would take the process over its total budget waits for other renders to finish, and is shed with a
+  `Retry-After` header if memory does not become available in time.
+
+GDAL's block cache is the other large consumer of memory. It defaults to 5% of the machine's memory in every process,
+so it is sized explicitly from the settings instead.
+"""
+
+import math
+import os
+import threading
+from types import TracebackType
+from typing import Any, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+
+from geospatial_api.access_log import annotate_request
+from geospatial_api.admission import render_admission
+from geospatial_api.metrics import RENDER_MEMORY_RESERVED, RENDER_SHED, known_layers
+from geospatial_api.settings import memory_setting
+
+# Bands and bytes per value assumed for readers that do not expose their dataset, such as mosaics, erring on the large
+# side as RGBA float64
+DEFAULT_BANDS = 4
+DEFAULT_ITEMSIZE = 8
+MB = 1024**2
+
+
+def configure_gdal_cache(cache_mb: int, override: bool = False) -> None:
+    """
+    Size GDAL's block cache, unless `GDAL_CACHEMAX` is already set.
+
+    GDAL reads the size of its cache when it first caches a block, so this only takes effect if called before any data
+    is read, which is done on startup. It applies to each process separately.
+
+    Args:
+        cache_mb: Size of the block cache in MB.
+        override: Replace any `GDAL_CACHEMAX` already set, as when the size is configured explicitly.
+
+    """
+    if override:
+        os.environ["GDAL_CACHEMAX"] = str(cache_mb)
+    else:
+        os.environ.setdefault("GDAL_CACHEMAX", str(cache_mb))
+
+
+def estimate_tile_memory(
+    tilesize: int,
+    bands: int,
+    itemsize: int,
+    buffer: float | None = None,
+    padding: int | None = None,
+    post_process: bool = False,
+) -> int:
+    """
+    Estimate the peak memory needed to read, post process and render a tile.
+
+    The data read, including any padding, and its mask are held throughout. Rendering rescales the data to 8 bits one
+    band at a time, as floating point, then encodes it as an RGBA image. Post processing algorithms typically produce a
+    further floating point copy of the data.
+
+    Args:
+        tilesize: Width and height of the tile in pixels.
+        bands: Number of bands read.
+        itemsize: Bytes per value of the data read.
+        buffer: Pixels added to each side of the tile.
+        padding: Pixels read around the tile for resampling, which are discarded.
+        post_process: Whether the data is post processed before rendering.
+
+    Returns:
+        Estimated peak memory in bytes.
+
+    """
+    output_pixels = (tilesize + 2 * math.ceil(buffer or 0)) ** 2
+    read_pixels = (tilesize + 2 * math.ceil(buffer or 0) + 2 * (padding or 0)) ** 2
+    data = read_pixels * bands * (itemsize + 1)
+    processed = output_pixels * bands * 8 if post_process else 0
+    rendered = output_pixels * (8 + bands) + output_pixels * 4 * 2
+    return data + processed + rendered
+
+
+def get_band_profile(src_dst: Any, indexes: Sequence[int] | None = None) -> tuple[int, int]:
+    """
+    Get the number of bands a reader will read, and their largest size in bytes per value.
+
+    Args:
+        src_dst: Open rio-tiler reader.
+        indexes: Band indexes requested, defaults to all bands.
+
+    Returns:
+        Number of bands and bytes per value, assuming `DEFAULT_BANDS` and `DEFAULT_ITEMSIZE` where the reader does not
+            expose its dataset.
+
+    """
+    dataset = getattr(src_dst, "dataset", None)
+    if dataset is None:
+        return len(indexes) if indexes else DEFAULT_BANDS, DEFAULT_ITEMSIZE
+    return len(indexes) if indexes else dataset.count, max(np.dtype(dtype).itemsize for dtype in dataset.dtypes)
+
+
+class MemoryBudget:
+    """Estimated memory reserved by the renders in progress, limited per request and in total."""
+
+    def __init__(self, request_limit: int, total_limit: int, timeout: float) -> None:
+        """
+        Args:
+            request_limit: Maximum memory in bytes a single render may reserve.
+            total_limit: Maximum memory in bytes reserved by all renders at once.
+            timeout: Seconds to wait for memory to be released before shedding a render.
+        """
+        self.request_limit = min(request_limit, total_limit)
+        self.total_limit = total_limit
+        self.timeout = timeout
+        self.reserved = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int, layer: str, advice: str = "") -> None:
+        """
+        Reserve memory, waiting for other renders to release it if needed.
+
+        Must be called on a render thread, as it blocks while waiting.
+
+        Args:
+            size: Memory to reserve in bytes.
+            layer: Name of the layer being rendered.
+            advice: How to make a request that needs less memory, added to the error if the request needs too much.
+
+        Raises:
+            HTTPException: 400 if the render needs more than the per-request limit, or 503 if memory did not become
+                available within the timeout.
+
+        """
+        if size > self.request_limit:
+            RENDER_SHED.labels(reason="request_memory", layer=known_layers.label(layer)).inc()
+            annotate_request(shed="request_memory")
+            raise HTTPException(
+                status_code=400,
+                detail=(
+                    f"This request would need about {size // MB} MB, more than the limit of "
+                    f"{self.request_limit // MB} MB. {advice}"
+                ).strip(),
+            )
+
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.reserved + size <= self.total_limit, self.timeout):
+                raise render_admission.shed("memory", layer, 503, "The server does not have enough memory free.")
+            self.reserved += size
+        RENDER_MEMORY_RESERVED.inc(size)
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.reserved -= size
+            self._condition.notify_all()
+        RENDER_MEMORY_RESERVED.dec(size)
+
+    def reservation(self, layer: str, advice: str = "") -> "MemoryReservation":
+        """Start reserving memory for a render, which is all released once the render completes."""
+        return MemoryReservation(self, layer, advice)
+
+
+class MemoryReservation:
+    """Memory reserved by one render, which grows as its needs become known and is released on exit."""
+
+    def __init__(self, budget: MemoryBudget, layer: str, advice: str = "") -> None:
+        self.budget = budget
+        self.layer = layer
+        self.advice = advice
+        self.size = 0
+
+    def __enter__(self) -> "MemoryReservation":
+        return self
+
+    def __exit__(
+        self, exc_type: type[BaseException] | None, exc: BaseException | None, traceback: TracebackType | None
+    ) -> None:
+        if self.size:
+            self.budget.release(self.size)
+            self.size = 0
+
+    def grow(self, size: int) -> None:
+        """Reserve more memory, see `MemoryBudget.acquire`."""
+        self.budget.acquire(size, self.layer, self.advice)
+        self.size += size
+
+
+memory_budget = MemoryBudget(
+    request_limit=memory_setting.request_limit_mb * MB,
+    total_limit=memory_setting.total_limit_mb * MB,
+    timeout=memory_setting.wait_timeout,
+)
@@ -1,7 +1,280 @@
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Iterable, Iterator
+
 import prometheus_client as prom
 from fastapi import FastAPI
-from prometheus_client import CollectorRegistry
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
 from prometheus_fastapi_instrumentator import Instrumentator
+from starlette.responses import Response
+
+from geospatial_api.access_log import annotate_request, record_stage, request_record
+from geospatial_api.settings import metrics_setting, mosaic_setting
+from geospatial_api.utils import get_layer_name
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "geospatial_api"
+
+# Environment variable pointing prometheus_client at the directory shared by all worker processes. This must be set
+# before the application is imported.
+MULTIPROC_DIR_ENV = "PROMETHEUS_MULTIPROC_DIR"
+LABELS = ["layer", "zoom", "format"]
+# Layer label of requests for layers that are not known, so that requests for arbitrary urls cannot create an unbounded
+# number of series
+OTHER_LAYER = "other"
+
+
+class KnownLayers:
+    """Names of the layers that metrics are labelled with, all other layers being labelled `OTHER_LAYER`.
+
+    Layers are known if they are configured, or once they have been listed in the catalogue of available data.
+    """
+
+    def __init__(self, names: Iterable[str] = ()) -> None:
+        self._names = set(names)
+        self._lock = threading.Lock()
+
+    def add(self, names: Iterable[str]) -> None:
+        with self._lock:
+            self._names.update(names)
+
+    def label(self, layer: str) -> str:
+        """Get the metric label of a layer name."""
+        return layer if not layer or layer in self._names else OTHER_LAYER
+
+
+known_layers = KnownLayers(
+    [*metrics_setting.layers, *(get_layer_name(layer_url) for layer_url in mosaic_setting.layers or [])]
+)
+
+STAGE_DURATION = Histogram(
+    "stage_duration_seconds",
+    "Time spent in each stage of the tile pipeline.",
+    ["stage", *LABELS],
+    namespace=NAMESPACE,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+CACHE_HITS = Counter("cache_hits_total", "Requests served from the cache.", LABELS, namespace=NAMESPACE)
+CACHE_MISSES = Counter("cache_misses_total", "Requests not found in the cache.", LABELS, namespace=NAMESPACE)
+CACHE_STALE = Counter(
+    "cache_stale_total",
+    "Requests served from an expired cache entry while it is refreshed.",
+    LABELS,
+    namespace=NAMESPACE,
+)
+CACHE_REFRESH_ERRORS = Counter(
+    "cache_refresh_errors_total",
+    "Background refreshes of expired cache entries that failed.",
+    LABELS,
+    namespace=NAMESPACE,
+)
+CACHE_BYTES = Counter(
+    "cache_bytes_total", "Bytes read from or written to the cache.", ["operation", *LABELS], namespace=NAMESPACE
+)
+RAW_CACHE_REQUESTS = Counter(
+    "raw_tile_cache_requests_total",
+    "Lookups of decoded tile data, which skip reading the data when found.",
+    ["result", *LABELS],
+    namespace=NAMESPACE,
+)
+RENDER_QUEUE_DEPTH = Gauge(
+    "render_queue_depth",
+    "Renders admitted and waiting for or running on a render thread.",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+RENDER_MEMORY_RESERVED = Gauge(
+    "render_memory_reserved_bytes",
+    "Estimated memory reserved by the tiles being rendered.",
+    namespace=NAMESPACE,
+    multiprocess_mode="livesum",
+)
+RENDER_SHED = Counter(
+    "render_shed_total", "Renders rejected by admission control.", ["reason", "layer"], namespace=NAMESPACE
+)
+GDAL_HTTP_REQUESTS = Counter(
+    "gdal_http_requests_total", "HTTP range requests made by GDAL when reading data.", LABELS, namespace=NAMESPACE
+)
+GDAL_HTTP_BYTES = Counter(
+    "gdal_http_bytes_total", "Bytes requested by GDAL HTTP range requests.", LABELS, namespace=NAMESPACE
+)
+
+# Labels of the request currently being processed, used to attribute GDAL HTTP requests which are only visible through
+# GDAL's debug logging
+stage_labels: ContextVar[dict[str, str] | None] = ContextVar("stage_labels", default=None)
+
+# GDAL config options needed to collect GDAL HTTP request statistics
+GDAL_HTTP_STATS_ENV = {"CPL_DEBUG": "ON"} if metrics_setting.gdal_http_stats else {}
+
+
+def get_stage_labels(src_path: str | Path | None, z: int | str | None = None, fmt: object = None) -> dict[str, str]:
+    """
+    Build the metric labels for a request.
+
+    Args:
+        src_path: Path or url of the data being read, labelled with its layer name if the layer is known, see
+            `KnownLayers`.
+        z: Zoom level of the requested tile, if relevant.
+        fmt: Requested output format. Either a string or an enum such as titiler's ImageType.
+
+    Returns:
+        Dictionary of metric labels.
+
+    """
+    return {
+        "layer": known_layers.label(get_layer_name(src_path)) if src_path else "",
+        "zoom": "" if z is None else str(z),
+        "format": str(getattr(fmt, "value", fmt) or "auto"),
+    }
+
+
+@contextmanager
+def track_stage(stage: str, labels: dict[str, str] | None) -> Iterator[None]:
+    """
+    Record the time spent within the context against a pipeline stage.
+
+    Args:
+        stage: Name of the stage, e.g. "cache_lookup".
+        labels: Metric labels from `get_stage_labels`. Nothing is recorded if this is None.
+
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        duration = time.perf_counter() - start
+        record_stage(stage, duration)
+        if labels is not None:
+            STAGE_DURATION.labels(stage=stage, **labels).observe(duration)
+
+
+def record_cache_hit(labels: dict[str, str] | None, size: int) -> None:
+    """Record a cache hit and the number of bytes served from the cache."""
+    annotate_request(cache="HIT")
+    if labels is not None:
+        CACHE_HITS.labels(**labels).inc()
+        CACHE_BYTES.labels(operation="read", **labels).inc(size)
+
+
+def record_cache_stale(labels: dict[str, str] | None, size: int) -> None:
+    """Record a request served from an expired cache entry and the number of bytes served."""
+    annotate_request(cache="STALE")
+    if labels is not None:
+        CACHE_STALE.labels(**labels).inc()
+        CACHE_BYTES.labels(operation="read", **labels).inc(size)
+
+
+def record_cache_refresh_error(labels: dict[str, str] | None) -> None:
+    """Record a failed background refresh of an expired cache entry."""
+    if labels is not None:
+        CACHE_REFRESH_ERRORS.labels(**labels).inc()
+
+
+def record_cache_miss(labels: dict[str, str] | None) -> None:
+    """Record a cache miss."""
+    annotate_request(cache="MISS")
+    if labels is not None:
+        CACHE_MISSES.labels(**labels).inc()
+
+
+def record_cache_write(labels: dict[str, str] | None, size: int) -> None:
+    """Record the number of bytes written to the cache."""
+    if labels is not None:
+        CACHE_BYTES.labels(operation="write", **labels).inc(size)
+
+
+def record_raw_cache(labels: dict[str, str] | None, hit: bool) -> None:
+    """Record a lookup of decoded tile data."""
+    annotate_request(raw_cache="HIT" if hit else "MISS")
+    if labels is not None:
+        RAW_CACHE_REQUESTS.labels(result="hit" if hit else "miss", **labels).inc()
+
+
+class GDALHTTPStatsHandler(logging.Handler):
+    """Count the HTTP range requests GDAL makes, using the `/vsicurl/` debug messages forwarded by rasterio.
+
+    Requires the `CPL_DEBUG` GDAL config option to be enabled, see `GDAL_HTTP_STATS_ENV`.
+    """
+
+    range_pattern = re.compile(r"(\d+)-(\d+)")
+
+    def emit(self, record: logging.LogRecord) -> None:
+        message = record.getMessage()
+        if "Downloading" not in message:
+            return
+
+        labels = stage_labels.get() or get_stage_labels(None)
+        ranges = self.range_pattern.findall(message.split("Downloading", 1)[1].split("(", 1)[0])
+        size = sum(int(end) - int(start) + 1 for start, end in ranges)
+        GDAL_HTTP_REQUESTS.labels(**labels).inc()
+        GDAL_HTTP_BYTES.labels(**labels).inc(size)
+
+        if (access_record := request_record.get()) is not None:
+            access_record["gdal_http_requests"] = access_record.get("gdal_http_requests", 0) + 1
+            access_record["gdal_http_bytes"] = access_record.get("gdal_http_bytes", 0) + size
+
+
+def get_registry() -> CollectorRegistry:
+    """
+    Get the registry to export metrics from.
+
+    When running with multiple worker processes, each worker writes its metrics to its own files within the shared
+    multiprocess directory. The returned registry then aggregates the metrics from all of these files, so that every
+    worker exports the metrics of the whole pod.
+
+    Returns:
+        Registry aggregating all worker processes in multiprocess mode, otherwise the default registry.
+
+    """
+    if MULTIPROC_DIR_ENV not in os.environ:
+        return prom.REGISTRY
+
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def is_process_alive(pid: int) -> bool:
+    """Check whether a process with the given pid is running."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_dead_worker_files(path: str | Path) -> None:
+    """
+    Remove the live gauge files of worker processes that are no longer running.
+
+    Counter and histogram files are kept so that the aggregated values never go backwards.
+
+    Args:
+        path: The prometheus multiprocess directory.
+
+    """
+    pids = {int(file.stem.rsplit("_", 1)[-1]) for file in Path(path).glob("*_*.db") if file.stem[-1].isdigit()}
+    for pid in pids:
+        if not is_process_alive(pid):
+            logger.info(f"Removing metrics of dead worker process {pid}")
+            multiprocess.mark_process_dead(pid, str(path))
 
 
 class Metrics:
@@ -18,18 +291,45 @@ class Metrics:
     def setup_metrics(self, service: FastAPI) -> None:
         """Setup metrics for FastAPI services.
 
-        Default metrics from fastapi instrumentator are included here.
-        Custom metrics are also collected in the routers.
+        Default metrics from fastapi instrumentator are included here. Custom metrics for the tile pipeline are
+        defined in this module and collected by the cache and routers. Metrics are exposed on a `/metrics` route of
+        the service, and by the exporter started with `start_exporter`.
 
         Args:
             service: The FastAPI service.
         """
         # Start instrumentation and add the default metrics
-        instrumentator = Instrumentator(excluded_handlers=["/openapi.json"])
+        instrumentator = Instrumentator(excluded_handlers=["/openapi.json", "/metrics"])
         instrumentator.instrument(service, metric_namespace=self.service_name)
 
-        # Set new registry
-        self.registry = CollectorRegistry()
+        # Count GDAL HTTP requests from rasterio's logging of GDAL debug messages
+        if metrics_setting.gdal_http_stats:
+            gdal_logger = logging.getLogger("rasterio._env")
+            gdal_logger.setLevel(logging.DEBUG)
+            gdal_logger.addHandler(GDALHTTPStatsHandler(level=logging.DEBUG))
+
+        self.registry = get_registry()
+        service.add_api_route("/metrics", self.metrics_endpoint, include_in_schema=False)
+
+    def metrics_endpoint(self) -> Response:
+        """Expose the metrics in the prometheus text format."""
+        return Response(generate_latest(self.registry), media_type=CONTENT_TYPE_LATEST)
+
+    def start_exporter(self) -> None:
+        """Start the metrics exporter on the configured port.
+
+        When running with multiple workers only the first worker to start can bind to the port. As its registry
+        aggregates all workers, the other workers skip starting their own exporter rather than failing.
+        """
+        if multiproc_dir := os.environ.get(MULTIPROC_DIR_ENV):
+            remove_dead_worker_files(multiproc_dir)
+
+        try:
+            prom.start_http_server(metrics_setting.port, registry=self.registry)
+        except OSError:
+            logger.info(f"Metrics port {metrics_setting.port} is in use, metrics are exported by another worker")
 
-        # Export metrics to port 8080
-        prom.start_http_server(8080)
+    def shutdown(self) -> None:
+        """Mark this worker's metrics as dead when it shuts down."""
+        if multiproc_dir := os.environ.get(MULTIPROC_DIR_ENV):
+            multiprocess.mark_process_dead(os.getpid(), multiproc_dir)
@@ -0,0 +1,374 @@
+"""Mosaic reading of layers made up of many COG granules.
+
+A mosaic layer is an S3 prefix (or local directory) containing one or more COGs. The footprint of every granule is
+held in an in-memory spatial index so that only the granules intersecting a requested tile are opened.
+
+Building an index opens every granule of the layer, so only the configured layers may be requested, if any are
+configured, and layers with more than `max_granules` granules are rejected. Indexes are rebuilt once they are older
+than the ttl, reusing the footprints of granules that have not changed.
+"""
+
+import hashlib
+import logging
+import math
+import threading
+import time
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from pathlib import Path
+from statistics import median
+from typing import Any, Callable, Literal, Sequence
+from urllib.parse import urlparse
+
+from fastapi import HTTPException, Query
+from morecantile import TileMatrixSet
+from mypy_boto3_s3 import S3Client
+from rio_tiler.constants import WGS84_CRS
+from rio_tiler.errors import EmptyMosaicError, TileOutsideBounds
+from rio_tiler.io import Reader
+from rio_tiler.models import ImageData
+from rio_tiler.mosaic import mosaic_reader
+from rio_tiler.mosaic.methods import PixelSelectionMethod
+from titiler.core.dependencies import DefaultDependency
+from typing_extensions import Annotated
+
+from geospatial_api.context import get_s3_client
+from geospatial_api.settings import mosaic_setting
+from geospatial_api.utils import get_file_path, get_source_id, get_source_version, object_versions
+
+logger = logging.getLogger(__name__)
+
+GRANULE_SUFFIXES = (".tif", ".tiff")
+
+BoundingBox = tuple[float, float, float, float]
+
+
+@dataclass(frozen=True)
+class Granule:
+    """A single COG within a mosaic layer.
+
+    Attributes:
+        url: S3 url or local file path of the granule.
+        bounds: Footprint of the granule in WGS84 as (west, south, east, north).
+        version: Version of the granule the footprint was read from, see `geospatial_api.utils.get_source_version`.
+    """
+
+    url: str
+    bounds: BoundingBox
+    version: str = ""
+
+
+def bounds_intersect(a: BoundingBox, b: BoundingBox) -> bool:
+    """Check whether two (west, south, east, north) bounding boxes intersect."""
+    return a[0] < b[2] and a[2] > b[0] and a[1] < b[3] and a[3] > b[1]
+
+
+class FootprintIndex:
+    """Uniform grid spatial index of granule footprints.
+
+    The grid cell size is taken from the median granule extent, so each granule only occupies a handful of cells and a
+    tile lookup only has to consider the granules registered in the cells it touches. This keeps the per-tile lookup
+    cost roughly constant as the number of granules in a layer grows.
+    """
+
+    def __init__(self, granules: Sequence[Granule], path_resolver: Callable[[str], str], version: str = "") -> None:
+        """
+        Args:
+            granules: Granules making up the mosaic, in priority order for first-valid pixel selection.
+            path_resolver: Function converting a granule url into a path that can be opened by rasterio.
+            version: Version of the granules the index was built from, which changes if any granule is overwritten.
+        """
+        self.granules = list(granules)
+        self.path_resolver = path_resolver
+        self.version = version
+
+        widths = [granule.bounds[2] - granule.bounds[0] for granule in self.granules]
+        heights = [granule.bounds[3] - granule.bounds[1] for granule in self.granules]
+        self.cell_size = max(median(widths), median(heights), 1e-6) if self.granules else 1.0
+
+        self._cells: dict[tuple[int, int], list[int]] = defaultdict(list)
+        for idx, granule in enumerate(self.granules):
+            for cell in self._cells_for(granule.bounds):
+                self._cells[cell].append(idx)
+
+    def __len__(self) -> int:
+        return len(self.granules)
+
+    def _cell_range(self, bounds: BoundingBox) -> tuple[range, range]:
+        west, south, east, north = bounds
+        columns = range(math.floor(west / self.cell_size), math.floor(east / self.cell_size) + 1)
+        rows = range(math.floor(south / self.cell_size), math.floor(north / self.cell_size) + 1)
+        return columns, rows
+
+    def _cells_for(self, bounds: BoundingBox) -> list[tuple[int, int]]:
+        columns, rows = self._cell_range(bounds)
+        return [(column, row) for column in columns for row in rows]
+
+    def search(self, bounds: BoundingBox) -> list[Granule]:
+        """Find the granules intersecting a bounding box.
+
+        Args:
+            bounds: WGS84 bounding box as (west, south, east, north).
+
+        Returns:
+            Intersecting granules, in the order they were added to the index.
+
+        """
+        columns, rows = self._cell_range(bounds)
+        if len(columns) * len(rows) > len(self._cells):
+            # The query covers more cells than are populated, so checking the populated cells is cheaper
+            cells = [cell for cell in self._cells if cell[0] in columns and cell[1] in rows]
+        else:
+            cells = [(column, row) for column in columns for row in rows]
+
+        candidates: set[int] = set()
+        for cell in cells:
+            candidates.update(self._cells.get(cell, ()))
+
+        return [self.granules[idx] for idx in sorted(candidates) if bounds_intersect(self.granules[idx].bounds, bounds)]
+
+
+def list_granules(layer_url: str, s3_client: S3Client) -> list[str]:
+    """
+    List the granules making up a mosaic layer.
+
+    Args:
+        layer_url: S3 prefix (e.g. `S3://bucket/raster/gblcm/`) or local directory containing the granules.
+        s3_client: S3 Client used to list the objects under an S3 prefix.
+
+    Returns:
+        Sorted list of granule urls.
+
+    """
+    url_parts = urlparse(layer_url)
+
+    if url_parts.scheme.lower() == "s3":
+        prefix = url_parts.path.lstrip("/")
+        paginator = s3_client.get_paginator("list_objects_v2")
+        urls = []
+        for page in paginator.paginate(Bucket=url_parts.netloc, Prefix=prefix):
+            for item in page.get("Contents", []):
+                if item["Key"].lower().endswith(GRANULE_SUFFIXES):
+                    url = f"S3://{url_parts.netloc}/{item['Key']}"
+                    # The listing includes every object's ETag, so record them to save a HEAD request per granule
+                    object_versions.record(url, item["ETag"])
+                    urls.append(url)
+        return sorted(urls)
+
+    directory = Path(get_file_path(layer_url, s3_client))
+    return sorted(path.as_uri() for path in directory.iterdir() if path.suffix.lower() in GRANULE_SUFFIXES)
+
+
+def read_footprint(url: str, path_resolver: Callable[[str], str], version: str = "") -> Granule:
+    """Open a granule to find its WGS84 footprint."""
+    with Reader(path_resolver(url)) as src_dst:
+        return Granule(url=url, bounds=tuple(src_dst.get_geographic_bounds(WGS84_CRS)), version=version)
+
+
+def get_layer_id(layer_url: str) -> str:
+    """Get a normalised identifier for a mosaic layer, ignoring any trailing slash."""
+    return get_source_id(layer_url).rstrip("/")
+
+
+def check_layer(layer_url: str) -> None:
+    """
+    Check a mosaic layer may be requested.
+
+    Args:
+        layer_url: S3 prefix or local directory of the layer.
+
+    Raises:
+        HTTPException: 404 if mosaic layers are configured and the layer is not one of them.
+
+    """
+    if mosaic_setting.layers is not None and get_layer_id(layer_url) not in map(get_layer_id, mosaic_setting.layers):
+        raise HTTPException(status_code=404, detail=f"{layer_url} is not a mosaic layer.")
+
+
+def build_footprint_index(
+    layer_url: str, s3_client: S3Client, previous: FootprintIndex | None = None
+) -> FootprintIndex:
+    """
+    Build the footprint index for a mosaic layer.
+
+    The granule headers are read concurrently, as for large layers this is dominated by S3 latency. Granules of a
+    previous index of the layer that have not changed since are not read again.
+
+    Args:
+        layer_url: S3 prefix or local directory containing the granules.
+        s3_client: S3 Client used to list and sign the granules.
+        previous: Previous index of the layer, whose footprints are reused.
+
+    Raises:
+        HTTPException: 400 if the layer has more than `max_granules` granules.
+
+    Returns:
+        Footprint index of all granules in the layer.
+
+    """
+    path_resolver = partial(get_file_path, s3_client=s3_client)
+    urls = list_granules(layer_url, s3_client)
+    if len(urls) > mosaic_setting.max_granules:
+        raise HTTPException(
+            status_code=400, detail=f"{layer_url} has more than {mosaic_setting.max_granules} granules."
+        )
+
+    versions = [get_source_version(url, s3_client) for url in urls]
+    known = {(granule.url, granule.version): granule for granule in previous.granules} if previous else {}
+    missing = [(url, version) for url, version in zip(urls, versions) if (url, version) not in known]
+
+    with ThreadPoolExecutor(max_workers=mosaic_setting.threads) as executor:
+        read = executor.map(lambda granule: read_footprint(granule[0], path_resolver, granule[1]), missing)
+        known.update(((granule.url, granule.version), granule) for granule in read)
+    granules = [known[(url, version)] for url, version in zip(urls, versions)]
+
+    layer_version = hashlib.sha1()
+    for url, version in zip(urls, versions):
+        layer_version.update(f"{url}={version};".encode())
+
+    logger.info(f"Built footprint index for {layer_url} with {len(granules)} granules, reading {len(missing)}")
+    return FootprintIndex(granules, path_resolver, version=layer_version.hexdigest())
+
+
+class FootprintIndexRegistry:
+    """In-memory store of the footprint indexes of recently used layers, rebuilt once they are older than the ttl."""
+
+    def __init__(self, ttl: int, max_size: int) -> None:
+        self.ttl = ttl
+        self.max_size = max_size
+        self._indexes: OrderedDict[str, tuple[float, FootprintIndex]] = OrderedDict()
+        self._build_locks: dict[str, threading.Lock] = defaultdict(threading.Lock)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._indexes)
+
+    def _is_fresh(self, entry: tuple[float, FootprintIndex] | None) -> bool:
+        return entry is not None and time.monotonic() - entry[0] <= self.ttl
+
+    def get(self, layer_url: str, s3_client: S3Client) -> FootprintIndex:
+        """Return the index for a layer, building it if it is missing or has expired.
+
+        Each layer is built under its own lock, so building a large layer does not block lookups for other layers. The
+        least recently used indexes are discarded once more than `max_size` are held.
+
+        Raises:
+            HTTPException: The layer may not be requested, see `check_layer` and `build_footprint_index`.
+        """
+        check_layer(layer_url)
+        with self._lock:
+            entry = self._indexes.get(layer_url)
+            if entry is not None:
+                self._indexes.move_to_end(layer_url)
+            if self._is_fresh(entry):
+                return entry[1]  # type: ignore
+            build_lock = self._build_locks[layer_url]
+
+        with build_lock:
+            entry = self._indexes.get(layer_url)
+            if not self._is_fresh(entry):
+                previous = entry[1] if entry is not None else None
+                entry = (time.monotonic(), build_footprint_index(layer_url, s3_client, previous))
+                self._store(layer_url, entry)
+
+        return entry[1]  # type: ignore
+
+    def _store(self, layer_url: str, entry: tuple[float, FootprintIndex]) -> None:
+        with self._lock:
+            self._indexes[layer_url] = entry
+            self._indexes.move_to_end(layer_url)
+            while len(self._indexes) > self.max_size:
+                evicted, _ = self._indexes.popitem(last=False)
+                self._build_locks.pop(evicted, None)
+
+    def __getitem__(self, layer_url: str) -> FootprintIndex:
+        return self._indexes[layer_url][1]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._indexes.clear()
+            self._build_locks.clear()
+
+
+footprint_indexes = FootprintIndexRegistry(ttl=mosaic_setting.index_ttl, max_size=mosaic_setting.max_indexes)
+
+
+@dataclass
+class MosaicParams(DefaultDependency):
+    """Mosaic reader parameters."""
+
+    pixel_selection: Annotated[
+        Literal["first", "mean"],
+        Query(description="Method used to combine overlapping granules: first valid pixel, or the mean of all."),
+    ] = "first"
+
+
+class MosaicReader:
+    """Reader exposing a mosaic layer through the `tile` interface of a rio-tiler reader.
+
+    The footprint index for the layer is normally built by the mosaic path dependency, and is only built again here if
+    it has since been discarded.
+    """
+
+    colormap = None
+
+    def __init__(self, input: str, tms: TileMatrixSet, pixel_selection: str = "first") -> None:  # noqa A002
+        """
+        Args:
+            input: S3 prefix or local directory of the mosaic layer.
+            tms: Tile matrix set used to locate tiles.
+            pixel_selection: Name of the rio-tiler pixel selection method used to merge granules.
+        """
+        self.input = input
+        self.tms = tms
+        self.pixel_selection = pixel_selection
+        self.index = footprint_indexes.get(input, get_s3_client())
+
+    def __enter__(self) -> "MosaicReader":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        pass
+
+    def _read_granule(self, url: str, x: int, y: int, z: int, **kwargs: Any) -> ImageData:
+        with Reader(self.index.path_resolver(url), tms=self.tms) as src_dst:
+            return src_dst.tile(x, y, z, **kwargs)
+
+    def tile(self, x: int, y: int, z: int, **kwargs: Any) -> ImageData:
+        """
+        Read a tile from every intersecting granule in parallel and merge them.
+
+        Args:
+            x: Tile column index.
+            y: Tile row index.
+            z: Tile zoom level.
+            **kwargs: Options passed through to `rio_tiler.io.Reader.tile`.
+
+        Raises:
+            TileOutsideBounds: No granule contains data for the requested tile.
+
+        Returns:
+            The merged tile.
+
+        """
+        granules = self.index.search(tuple(self.tms.bounds(x, y, z)))
+        if not granules:
+            raise TileOutsideBounds(f"Tile {z}/{x}/{y} does not intersect any granule of {self.input}")
+
+        try:
+            image, _ = mosaic_reader(
+                [granule.url for granule in granules],
+                self._read_granule,
+                x,
+                y,
+                z,
+                pixel_selection=PixelSelectionMethod[self.pixel_selection].value(),
+                threads=mosaic_setting.threads,
+                **kwargs,
+            )
+        except EmptyMosaicError as error:
+            raise TileOutsideBounds(str(error)) from error
+
+        return image
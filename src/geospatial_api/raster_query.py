@@ -0,0 +1,196 @@
+"""Batch point sampling and zonal statistics of rasters.
+
+Both read the dataset directly with windowed reads rather than through a tile reader. Points are grouped by the
+internal block of the COG they fall in, so that each block is read and decompressed once however many points it holds.
+Zonal statistics are computed from a single masked read of the window covering the area, whose memory is reserved from
+the render memory budget before it is read, see `geospatial_api.memory`.
+"""
+
+import math
+from typing import Any, Sequence
+
+import numpy as np
+from affine import Affine
+from rasterio.crs import CRS
+from rasterio.enums import Resampling
+from rasterio.errors import WindowError
+from rasterio.features import bounds as geometry_bounds
+from rasterio.features import geometry_mask
+from rasterio.io import DatasetReader
+from rasterio.transform import rowcol
+from rasterio.warp import transform, transform_geom
+from rasterio.windows import Window, from_bounds
+
+from geospatial_api.memory import MemoryReservation
+
+WGS84 = CRS.from_epsg(4326)
+
+
+def sample_points(
+    dataset: DatasetReader,
+    coordinates: Sequence[Sequence[float]],
+    indexes: Sequence[int] | None = None,
+    coord_crs: CRS = WGS84,
+) -> np.ma.MaskedArray:
+    """
+    Read the pixel values at many points.
+
+    Args:
+        dataset: Open dataset to sample.
+        coordinates: (x, y) coordinates of the points.
+        indexes: Band indexes to read, defaults to all bands.
+        coord_crs: CRS of the coordinates.
+
+    Returns:
+        Masked array of shape (points, bands). Points outside the dataset or on nodata pixels are masked.
+
+    """
+    indexes = list(indexes or dataset.indexes)
+    values = np.ma.masked_all((len(coordinates), len(indexes)), dtype=np.result_type(*dataset.dtypes))
+    if not len(coordinates):
+        return values
+
+    xs, ys = zip(*[(point[0], point[1]) for point in coordinates])
+    if coord_crs != dataset.crs:
+        xs, ys = transform(coord_crs, dataset.crs, xs, ys)
+    rows, cols = (np.asarray(axis) for axis in rowcol(dataset.transform, xs, ys))
+    inside = (rows >= 0) & (rows < dataset.height) & (cols >= 0) & (cols < dataset.width)
+
+    # Number every internal block of the dataset, and read each block containing a point once
+    block_height, block_width = dataset.block_shapes[0]
+    block_columns = math.ceil(dataset.width / block_width)
+    blocks = (rows // block_height) * block_columns + cols // block_width
+
+    for block in np.unique(blocks[inside]):
+        points = np.flatnonzero(inside & (blocks == block))
+        row_off = (block // block_columns) * block_height
+        col_off = (block % block_columns) * block_width
+        window = Window(
+            col_off, row_off, min(block_width, dataset.width - col_off), min(block_height, dataset.height - row_off)
+        )
+        data = dataset.read(indexes, window=window, masked=True)
+        values[points] = data[:, rows[points] - row_off, cols[points] - col_off].T
+
+    return values
+
+
+def band_statistics(band: np.ma.MaskedArray, pixels: int) -> dict[str, Any]:
+    """
+    Summarise the valid values of a band.
+
+    Args:
+        band: Masked band values.
+        pixels: Number of pixels within the area, used to report the percentage of valid pixels.
+
+    Returns:
+        Count, percentage of valid pixels, and the minimum, maximum, mean, standard deviation, sum and median of the
+        valid values, which are None if there are none.
+
+    """
+    valid = band.compressed()
+    statistics: dict[str, Any] = {
+        "count": int(valid.size),
+        "valid_percent": round(100 * valid.size / pixels, 2) if pixels else 0.0,
+    }
+    for name, reduction in [
+        ("min", np.min),
+        ("max", np.max),
+        ("mean", np.mean),
+        ("std", np.std),
+        ("sum", np.sum),
+        ("median", np.median),
+    ]:
+        statistics[name] = float(reduction(valid)) if valid.size else None
+    return statistics
+
+
+def estimate_zonal_memory(bands: int, height: int, width: int, itemsize: int) -> int:
+    """
+    Estimate the peak memory needed to compute zonal statistics of a window.
+
+    The data read and its mask are held throughout, along with the mask of the area. The valid values of a band are
+    then copied, and copied again to compute their median.
+
+    Args:
+        bands: Number of bands read.
+        height: Height of the data read in pixels.
+        width: Width of the data read in pixels.
+        itemsize: Bytes per value of the data read.
+
+    Returns:
+        Estimated peak memory in bytes.
+
+    """
+    pixels = height * width
+    return pixels * bands * (itemsize + 1) + pixels * (1 + 2 * itemsize)
+
+
+def zonal_statistics(
+    dataset: DatasetReader,
+    geometry: dict[str, Any],
+    indexes: Sequence[int] | None = None,
+    geometry_crs: CRS = WGS84,
+    max_size: int | None = 1024,
+    reservation: MemoryReservation | None = None,
+) -> dict[str, dict[str, Any]]:
+    """
+    Compute statistics of the pixels within a polygon.
+
+    Only the window covering the polygon is read. If the window is larger than `max_size` pixels it is read at a lower
+    resolution, which uses the dataset's overviews where available.
+
+    Args:
+        dataset: Open dataset to summarise.
+        geometry: GeoJSON geometry of the area.
+        indexes: Band indexes to summarise, defaults to all bands.
+        geometry_crs: CRS of the geometry.
+        max_size: Maximum width or height of the window read in pixels, or None to always read at full resolution.
+        reservation: Memory reservation of the request, which is grown by the memory needed before the data is read.
+
+    Raises:
+        HTTPException: There is not enough memory to read the window, see `geospatial_api.memory`.
+
+    Returns:
+        Statistics of each band, keyed by band name (e.g. "b1"), see `band_statistics`.
+
+    """
+    indexes = list(indexes or dataset.indexes)
+    if geometry_crs != dataset.crs:
+        geometry = transform_geom(geometry_crs, dataset.crs, geometry)
+
+    # Expand the window to whole pixels covering the geometry, and clip it to the dataset
+    bounds_window = from_bounds(*geometry_bounds(geometry), transform=dataset.transform)
+    col_off, row_off = math.floor(bounds_window.col_off), math.floor(bounds_window.row_off)
+    window = Window(
+        col_off,
+        row_off,
+        math.ceil(bounds_window.col_off + bounds_window.width) - col_off,
+        math.ceil(bounds_window.row_off + bounds_window.height) - row_off,
+    )
+    try:
+        window = window.intersection(Window(0, 0, dataset.width, dataset.height))
+    except WindowError:
+        return {f"b{idx}": band_statistics(np.ma.masked_all(0), 0) for idx in indexes}
+
+    scale = max(window.width, window.height) / max_size if max_size else 1
+    out_height = max(1, round(window.height / max(scale, 1)))
+    out_width = max(1, round(window.width / max(scale, 1)))
+    if reservation is not None:
+        itemsize = max(np.dtype(dataset.dtypes[idx - 1]).itemsize for idx in indexes)
+        reservation.grow(estimate_zonal_memory(len(indexes), out_height, out_width, itemsize))
+    data = dataset.read(
+        indexes,
+        window=window,
+        out_shape=(len(indexes), out_height, out_width),
+        masked=True,
+        resampling=Resampling.nearest,
+    )
+
+    window_transform = dataset.window_transform(window) * Affine.scale(
+        window.width / out_width, window.height / out_height
+    )
+    outside = geometry_mask([geometry], out_shape=(out_height, out_width), transform=window_transform)
+    data.mask = np.ma.getmaskarray(data) | outside
+    pixels = int((~outside).sum())
+
+    return {f"b{idx}": band_statistics(band, pixels) for idx, band in zip(indexes, data)}
@@ -0,0 +1,284 @@
+"""Raster info and band statistics, computed once per version of a raster and persisted.
+
+Viewers read the info and statistics of a raster every time it is opened, to rescale its tiles. Both only change when
+the raster is overwritten, so they are computed once per version of the raster and kept in a document per raster. The
+documents are held in memory, and those of S3 rasters are also stored as sidecars in the bucket, so they survive
+restarts and are shared between processes.
+
+Statistics are approximate by default. They are computed from the coarsest overview whose longest edge is at least
+`max_size` pixels, so larger values give more accurate statistics at the cost of reading more data.
+"""
+
+import json
+import logging
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Any, Sequence
+from urllib.parse import urlparse
+
+import numpy as np
+import rasterio
+from botocore.exceptions import ClientError
+from mypy_boto3_s3 import S3Client
+from rasterio.enums import Resampling
+from rio_tiler.io import Reader
+from rio_tiler.utils import get_array_statistics
+
+from geospatial_api.catalogue import STATISTICS_PREFIX, read_catalogue, write_catalogue
+from geospatial_api.memory import memory_budget
+from geospatial_api.settings import statistics_setting
+from geospatial_api.utils import get_layer_name, get_source_id, replace_non_finite
+
+logger = logging.getLogger(__name__)
+
+# Percentiles reported by default, matching TiTiler
+DEFAULT_PERCENTILES = [2, 98]
+
+
+@dataclass
+class StatisticsDocument:
+    """Info and statistics of one version of a raster.
+
+    Attributes:
+        version: Version of the raster described, see `geospatial_api.utils.get_source_version`.
+        info: Info of the raster as returned by the rio-tiler reader, or None if not yet read.
+        statistics: Statistics of each band, keyed by `statistics_key` and then band name (e.g. "b1").
+    """
+
+    version: str
+    info: dict[str, Any] | None = None
+    statistics: dict[str, dict[str, dict[str, Any]]] = field(default_factory=dict)
+
+
+def statistics_level(width: int, height: int, overviews: Sequence[int], max_size: int | None) -> int:
+    """
+    Choose the resolution to compute statistics at.
+
+    Args:
+        width: Width of the raster in pixels.
+        height: Height of the raster in pixels.
+        overviews: Decimation factors of the overviews of the raster.
+        max_size: Minimum longest edge in pixels of the data read, or None to read at full resolution.
+
+    Returns:
+        Decimation factor of the coarsest overview with a longest edge of at least `max_size`, or 1 for full resolution.
+
+    """
+    if max_size is None:
+        return 1
+    return max((level for level in [1, *overviews] if max(width, height) / level >= max_size), default=1)
+
+
+def statistics_key(
+    level: int, categorical: bool, categories: list[float] | None, percentiles: list[int], bins: int
+) -> str:
+    """Build the key of statistics computed at an overview level with the given options."""
+    options = {"categorical": categorical, "categories": categories, "percentiles": percentiles, "bins": bins}
+    return f"{level}:{json.dumps(options, sort_keys=True)}"
+
+
+def read_info(src_path: str) -> dict[str, Any]:
+    """Read the info of a raster, as returned by the TiTiler `/info` endpoint."""
+    with Reader(src_path) as src_dst:
+        return src_dst.info().model_dump(exclude_none=True, by_alias=True, mode="json")
+
+
+def estimate_statistics_memory(bands: int, height: int, width: int, itemsize: int) -> int:
+    """
+    Estimate the peak memory needed to compute the statistics of bands of a raster.
+
+    The masked data read is held throughout. Each band is then summarised in turn, using temporary arrays of up to the
+    size of the band, including a floating point coverage array and sorted copies of the valid values.
+
+    Args:
+        bands: Number of bands read.
+        height: Height in pixels of the data read.
+        width: Width in pixels of the data read.
+        itemsize: Bytes per value of the data read.
+
+    Returns:
+        Estimated peak memory in bytes.
+
+    """
+    pixels = height * width
+    return pixels * bands * (itemsize + 1) + pixels * (16 + 3 * itemsize)
+
+
+def compute_statistics(
+    src_path: str,
+    indexes: Sequence[int],
+    level: int,
+    categorical: bool = False,
+    categories: list[float] | None = None,
+    percentiles: list[int] | None = None,
+    bins: int = 10,
+) -> dict[str, dict[str, Any]]:
+    """
+    Compute the statistics of bands of a raster at an overview level.
+
+    The memory needed is reserved from the render memory budget before the data is read, see `geospatial_api.memory`.
+    Must be called on a render thread, as it may wait for memory to be released.
+
+    Args:
+        src_path: Local path or signed url of the raster.
+        indexes: Band indexes to summarise.
+        level: Decimation factor of the overview to read, see `statistics_level`.
+        categorical: Count the pixels of each value rather than computing a histogram.
+        categories: Values to count for categorical statistics, defaults to every value found.
+        percentiles: Percentiles to compute.
+        bins: Number of histogram bins.
+
+    Raises:
+        HTTPException: 400 if the data read would need more than the per-request memory limit, or 503 if memory did not
+            become available in time.
+
+    Returns:
+        Statistics of each band, keyed by band name (e.g. "b1"), in the format of the TiTiler `/statistics` endpoint.
+            Statistics of bands that are entirely masked are None rather than NaN.
+
+    """
+    advice = "Request statistics of a coarser overview, with a smaller max_size and without exact."
+    with memory_budget.reservation(get_layer_name(src_path), advice) as reservation:
+        with rasterio.open(src_path) as dataset:
+            out_shape = (len(indexes), math.ceil(dataset.height / level), math.ceil(dataset.width / level))
+            itemsize = max(np.dtype(dataset.dtypes[idx - 1]).itemsize for idx in indexes)
+            reservation.grow(estimate_statistics_memory(*out_shape, itemsize))
+            data = dataset.read(list(indexes), out_shape=out_shape, masked=True, resampling=Resampling.nearest)
+
+        bands = get_array_statistics(
+            data,
+            categorical=categorical,
+            categories=categories,
+            percentiles=percentiles or DEFAULT_PERCENTILES,
+            bins=bins,
+        )
+    return {f"b{idx}": replace_non_finite(band) for idx, band in zip(indexes, bands)}
+
+
+def get_sidecar_location(url: str) -> tuple[str, str] | None:
+    """Get the bucket and key of the statistics sidecar of a raster, or None for rasters that are not in S3."""
+    url_parts = urlparse(url)
+    if url_parts.scheme.lower() != "s3":
+        return None
+    return url_parts.netloc, f"{STATISTICS_PREFIX}{url_parts.path.lstrip('/')}.json"
+
+
+class StatisticsStore:
+    """Statistics documents of recently used rasters held in memory, in front of sidecars stored in S3.
+
+    A document is replaced by an empty one when the raster it describes is overwritten, so that statistics are never
+    served for a previous version of a raster. Documents of rasters with an unknown version are only held in memory.
+    """
+
+    def __init__(self, max_size: int, persist: bool = True) -> None:
+        self.max_size = max_size
+        self.persist = persist
+        self._documents: OrderedDict[str, StatisticsDocument] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+    def _remember(self, url: str, document: StatisticsDocument) -> None:
+        source_id = get_source_id(url)
+        with self._lock:
+            self._documents[source_id] = document
+            self._documents.move_to_end(source_id)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+    def load(self, url: str, version: str, s3_client: S3Client) -> StatisticsDocument:
+        """
+        Get the document of the current version of a raster, from memory, its sidecar, or else a new empty document.
+
+        Args:
+            url: S3 url or local path of the raster.
+            version: Current version of the raster.
+            s3_client: S3 Client used to read the sidecar.
+
+        Returns:
+            Document of the raster.
+
+        """
+        source_id = get_source_id(url)
+        with self._lock:
+            document = self._documents.get(source_id)
+            if document is not None:
+                self._documents.move_to_end(source_id)
+        if document is not None and document.version == version:
+            return document
+
+        document = StatisticsDocument(version=version)
+        location = get_sidecar_location(url)
+        if self.persist and version and location is not None:
+            stored = read_catalogue(s3_client, *location)
+            if stored.get("version") == version:
+                document = StatisticsDocument(**stored)
+        self._remember(url, document)
+        return document
+
+    def update(
+        self,
+        url: str,
+        document: StatisticsDocument,
+        s3_client: S3Client,
+        info: dict[str, Any] | None = None,
+        key: str | None = None,
+        statistics: dict[str, dict[str, Any]] | None = None,
+    ) -> None:
+        """
+        Add info or statistics to a document, and store it.
+
+        Args:
+            url: S3 url or local path of the raster.
+            document: Document of the raster, from `load`.
+            s3_client: S3 Client used to write the sidecar.
+            info: Info of the raster to add.
+            key: Key of the statistics to add, see `statistics_key`.
+            statistics: Statistics of each band to add.
+
+        """
+        with self._lock:
+            if info is not None:
+                document.info = info
+            if key is not None and statistics is not None:
+                document.statistics.setdefault(key, {}).update(statistics)
+            content = asdict(document)
+        self._remember(url, document)
+
+        location = get_sidecar_location(url)
+        if self.persist and document.version and location is not None:
+            bucket, sidecar_key = location
+            try:
+                write_catalogue(s3_client, bucket, content, sidecar_key)
+            except ClientError as error:
+                logger.warning(f"Could not store the statistics of {url}: {error}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._documents.clear()
+
+
+statistics_store = StatisticsStore(max_size=statistics_setting.cache_size, persist=statistics_setting.persist)
+
+
+def get_document(url: str, src_path: str, version: str, s3_client: S3Client) -> StatisticsDocument:
+    """
+    Get the statistics document of a raster, reading the raster info if it is not yet known.
+
+    Args:
+        url: S3 url or local path of the raster.
+        src_path: Path or signed url the raster can be opened with.
+        version: Current version of the raster.
+        s3_client: S3 Client used to read and write the sidecar.
+
+    Returns:
+        Document of the raster, including its info.
+
+    """
+    document = statistics_store.load(url, version, s3_client)
+    if document.info is None:
+        statistics_store.update(url, document, s3_client, info=read_info(src_path))
+    return document
@@ -0,0 +1,157 @@
+"""In-process cache of decoded tile data, below the cache of rendered tiles.
+
+Rendered tiles are cached by every request parameter, so changing only how a tile is rendered (its colormap, rescaling
+or format) misses that cache. The data read for the tile does not depend on those parameters, so it is cached here
+keyed only by what was read, and a change of rendering re-renders the cached data without reading from S3.
+"""
+
+import threading
+import zlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any
+
+import numpy as np
+from rio_tiler.models import ImageData
+
+from geospatial_api.metrics import record_raw_cache
+from geospatial_api.settings import cache_setting
+from geospatial_api.utils import get_source_id
+
+# zlib compression level of cached tile data, favouring speed as tiles are compressed on every cache miss
+COMPRESSION_LEVEL = 1
+# Bytes decompressed at a time when restoring a tile
+DECOMPRESS_CHUNK_SIZE = 1024**2
+
+
+@dataclass(frozen=True)
+class RawTile:
+    """Compressed tile data and the metadata needed to rebuild the tile.
+
+    Attributes:
+        data: zlib compressed array values.
+        mask: zlib compressed, bit packed array mask.
+        dtype: Data type of the array.
+        shape: Shape of the array as (bands, height, width).
+        image: Tile metadata, the keyword arguments of `ImageData` other than the array.
+        colormap: Colormap of the dataset the tile was read from, if any.
+    """
+
+    data: bytes
+    mask: bytes
+    dtype: str
+    shape: tuple[int, ...]
+    image: dict[str, Any]
+    colormap: Any = None
+
+    @classmethod
+    def from_image(cls, image: ImageData, colormap: Any = None) -> "RawTile":
+        array = image.array
+        return cls(
+            # zlib reads the arrays through the buffer protocol, so they are compressed without first being copied
+            data=zlib.compress(np.ascontiguousarray(array.data), COMPRESSION_LEVEL),
+            mask=zlib.compress(np.packbits(np.ma.getmaskarray(array)), COMPRESSION_LEVEL),
+            dtype=array.dtype.str,
+            shape=array.shape,
+            image={
+                "assets": image.assets,
+                "bounds": image.bounds,
+                "crs": image.crs,
+                "metadata": image.metadata,
+                "band_names": image.band_names,
+                "dataset_statistics": image.dataset_statistics,
+                "cutline_mask": image.cutline_mask,
+            },
+            colormap=colormap,
+        )
+
+    @property
+    def size(self) -> int:
+        return len(self.data) + len(self.mask)
+
+    def to_image(self) -> ImageData:
+        """Decompress the tile into a new `ImageData`, which can be modified without changing the cached tile."""
+        # Decompress in chunks straight into the new array, rather than into bytes that would then need copying
+        data = np.empty(self.shape, dtype=self.dtype)
+        data_bytes = data.reshape(-1).view(np.uint8)
+        decompressor = zlib.decompressobj()
+        pending, offset = self.data, 0
+        while pending:
+            chunk = decompressor.decompress(pending, DECOMPRESS_CHUNK_SIZE)
+            data_bytes[offset : offset + len(chunk)] = np.frombuffer(chunk, dtype=np.uint8)
+            offset += len(chunk)
+            pending = decompressor.unconsumed_tail
+        if tail := decompressor.flush():
+            data_bytes[offset : offset + len(tail)] = np.frombuffer(tail, dtype=np.uint8)
+
+        mask_bits = np.frombuffer(zlib.decompress(self.mask), dtype=np.uint8)
+        mask = np.unpackbits(mask_bits, count=data.size).reshape(self.shape).view(bool)
+        return ImageData(np.ma.MaskedArray(data, mask=mask), **self.image)
+
+
+def raw_tile_key(src_path: str, source_version: str, tms: str, z: int, x: int, y: int, **read_params: Any) -> str:
+    """
+    Build the key of the data read for a tile.
+
+    Args:
+        src_path: Path or url of the data, which is normalised so presigned urls of the same object share a key.
+        source_version: Version of the data, see `geospatial_api.utils.get_source_version`.
+        tms: Identifier of the tile matrix set.
+        z: Tile zoom level.
+        x: Tile column index.
+        y: Tile row index.
+        **read_params: Every other parameter affecting the data read, such as the tile size and band indexes.
+
+    Returns:
+        Cache key of the tile data.
+
+    """
+    params = ",".join(f"{name}={value!r}" for name, value in sorted(read_params.items()))
+    return f"{get_source_id(src_path)}@{source_version}:{tms}/{z}/{x}/{y}:{params}"
+
+
+class RawTileCache:
+    """Thread-safe least recently used cache of tile data, limited to a total compressed size in bytes."""
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._tiles: OrderedDict[str, RawTile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._tiles)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any tile data can be cached, so callers can skip preparing tiles when the cache is disabled."""
+        return self.max_bytes > 0
+
+    def get(self, key: str, labels: dict[str, str] | None = None) -> RawTile | None:
+        with self._lock:
+            tile = self._tiles.get(key)
+            if tile is not None:
+                self._tiles.move_to_end(key)
+        record_raw_cache(labels, hit=tile is not None)
+        return tile
+
+    def set(self, key: str, tile: RawTile) -> None:
+        if tile.size > self.max_bytes:
+            return
+
+        with self._lock:
+            if (previous := self._tiles.pop(key, None)) is not None:
+                self.size -= previous.size
+            self._tiles[key] = tile
+            self.size += tile.size
+            while self.size > self.max_bytes:
+                _, evicted = self._tiles.popitem(last=False)
+                self.size -= evicted.size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tiles.clear()
+            self.size = 0
+
+
+raw_tiles = RawTileCache(max_bytes=cache_setting.raw_max_bytes)
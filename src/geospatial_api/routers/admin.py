@@ -0,0 +1,107 @@
+import os
+import secrets
+from typing import Any
+
+import aiocache
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from typing_extensions import Annotated
+
+from geospatial_api.cache import ALL_LAYERS, cache_namespaces, cache_stats, purge_disk_cache
+from geospatial_api.raw_cache import raw_tiles
+from geospatial_api.settings import admin_setting
+
+
+def verify_admin_token(x_admin_token: Annotated[str | None, Header()] = None) -> None:
+    """
+    Check the request has the admin token.
+
+    Raises:
+        HTTPException: The admin API is disabled as no token is configured, or the token is missing or wrong.
+
+    """
+    if admin_setting.token is None:
+        raise HTTPException(status_code=403, detail="The admin API is disabled.")
+    if x_admin_token is None or not secrets.compare_digest(x_admin_token, admin_setting.token):
+        raise HTTPException(status_code=401, detail="Invalid admin token.")
+
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(verify_admin_token)])
+
+MAX_ZOOM = 30
+
+
+def zoom_range(min_zoom: int | None, max_zoom: int | None) -> range | None:
+    """Build the range of zoom levels to purge, or None to purge every zoom level."""
+    if min_zoom is None and max_zoom is None:
+        return None
+    if min_zoom is not None and max_zoom is not None and min_zoom > max_zoom:
+        raise HTTPException(status_code=422, detail="min_zoom must not be greater than max_zoom.")
+    return range(min_zoom or 0, (max_zoom if max_zoom is not None else MAX_ZOOM) + 1)
+
+
+ZoomQuery = Annotated[int | None, Query(ge=0, le=MAX_ZOOM)]
+
+
+@router.get("/cache/stats")
+def get_cache_stats() -> dict[str, Any]:
+    """
+    \f
+    Cache statistics of the process serving the request.
+
+    Returns:
+        Hits, misses, hit ratio, entries and bytes written since the last purge, per layer and in total, and the process
+            id of the worker they were recorded by.
+    """
+    return {**cache_stats.summary(), "worker": os.getpid()}
+
+
+@router.delete("/cache")
+async def purge_cache(min_zoom: ZoomQuery = None, max_zoom: ZoomQuery = None) -> dict[str, Any]:
+    """
+    \f
+    Purge the whole cache, or a range of zoom levels across all layers.
+
+    Args:
+        min_zoom: Lowest zoom level to purge. Defaults to 0 if only max_zoom is given.
+        max_zoom: Highest zoom level to purge. Defaults to the maximum zoom if only min_zoom is given.
+
+    Returns:
+        Description of what was purged, including the process id of the worker that received the purge.
+    """
+    zooms = zoom_range(min_zoom, max_zoom)
+    if zooms is None:
+        cache_namespaces.purge_all()
+        # Every entry is now unreachable, so the memory can be released straight away
+        await aiocache.caches.get("default").clear()
+        raw_tiles.clear()
+    else:
+        cache_namespaces.purge_zooms(zooms)
+        await purge_disk_cache(ALL_LAYERS, zooms)
+
+    cache_stats.purge(ALL_LAYERS, zooms)
+    return {"layer": ALL_LAYERS, "zooms": [zooms.start, zooms.stop - 1] if zooms else None, "worker": os.getpid()}
+
+
+@router.delete("/cache/layers/{layer}")
+async def purge_layer(layer: str, min_zoom: ZoomQuery = None, max_zoom: ZoomQuery = None) -> dict[str, Any]:
+    """
+    \f
+    Purge the cached data of a layer, optionally only for a range of zoom levels.
+
+    Args:
+        layer: Name of the layer, as listed by the available_data endpoint.
+        min_zoom: Lowest zoom level to purge. Defaults to 0 if only max_zoom is given.
+        max_zoom: Highest zoom level to purge. Defaults to the maximum zoom if only min_zoom is given.
+
+    Returns:
+        Description of what was purged, including the process id of the worker that received the purge.
+    """
+    zooms = zoom_range(min_zoom, max_zoom)
+    if zooms is None:
+        cache_namespaces.purge_layer(layer)
+    else:
+        cache_namespaces.purge_zooms(zooms, layer)
+    await purge_disk_cache(layer, zooms)
+
+    cache_stats.purge(layer, zooms)
+    return {"layer": layer, "zooms": [zooms.start, zooms.stop - 1] if zooms else None, "worker": os.getpid()}
@@ -1,35 +1,207 @@
 """Custom TilerFactory with caching, based on https://developmentseed.org/titiler/examples/code/tiler_with_cache/."""
 
 import logging
+import warnings
 from dataclasses import dataclass
-from typing import Callable, Literal, Type
+from typing import Any, Callable, Literal, Sequence, Type
 
+import numpy as np
 import rasterio
 from fastapi import Depends, HTTPException, Path
+from morecantile import TileMatrixSet
 from pydantic import Field
-from rio_tiler.errors import TileOutsideBounds
+from rasterio.dtypes import dtype_ranges
+from rio_tiler.colormap import apply_cmap
+from rio_tiler.errors import InvalidDatatypeWarning, TileOutsideBounds
 from rio_tiler.io import BaseReader, Reader
-from rio_tiler.utils import CRS_to_uri
+from rio_tiler.models import ImageData
+from rio_tiler.types import ColorMapType, IntervalTuple
+from rio_tiler.utils import CRS_to_uri, render
 from starlette.responses import Response
 from titiler.core.dependencies import BidxExprParams, DatasetParams, DefaultDependency, ImageRenderingParams, TileParams
 from titiler.core.factory import TilerFactory as TiTilerFactory
 from titiler.core.factory import img_endpoint_params
 from titiler.core.resources.enums import ImageType
+from titiler.core.utils import rescale_array
 from typing_extensions import Annotated
 
-from geospatial_api.cache import CachedTiles
+from geospatial_api.admission import get_client_id
+from geospatial_api.cache import CachedTiles, cache_namespaces
+from geospatial_api.memory import MemoryReservation, estimate_tile_memory, get_band_profile, memory_budget
+from geospatial_api.metrics import GDAL_HTTP_STATS_ENV, get_stage_labels, stage_labels, track_stage
+from geospatial_api.mosaic import MosaicReader
+from geospatial_api.raw_cache import RawTile, raw_tile_key, raw_tiles
+from geospatial_api.utils import get_layer_name
 
 logger = logging.getLogger(__name__)
 
 
+def DefaultVersionParams() -> str:
+    """Version dependency for factories without versioned sources, whose cached tiles are only removed by their ttl."""
+    return ""
+
+
+# Data types each output format can encode, as in titiler.core.utils.render_image
+FORMAT_DTYPES = {
+    ImageType.png: ["uint8", "uint16"],
+    ImageType.jpeg: ["uint8"],
+    ImageType.jpg: ["uint8"],
+    ImageType.webp: ["uint8"],
+    ImageType.jp2: ["uint8", "int16", "uint16"],
+}
+
+
+def render_tile_image(
+    image: ImageData,
+    colormap: ColorMapType | None = None,
+    output_format: ImageType | None = None,
+    add_mask: bool = True,
+    rescale: Sequence[IntervalTuple] | None = None,
+    color_formula: str | None = None,
+    **kwargs: Any,
+) -> tuple[bytes, str]:
+    """
+    Render a tile as an image, as `titiler.core.utils.render_image` but without copying its data.
+
+    TiTiler copies the data and mask of the image before rendering it, so that rescaling the data to the output data
+    type cannot modify the image. Tiles are discarded once rendered, so the copy only adds the size of the tile data to
+    the peak memory of every render. The data of the image is rescaled in place instead.
+
+    Args:
+        image: Tile data, which may be modified.
+        colormap: Colormap to apply to single band data.
+        output_format: Image format, defaults to PNG if the tile has masked pixels and JPEG otherwise.
+        add_mask: Whether to add the mask to the image as an alpha band.
+        rescale: Ranges to linearly rescale the values of each band from.
+        color_formula: rio-color formula to apply.
+        **kwargs: GDAL creation options of the image.
+
+    Returns:
+        The encoded image and its media type.
+
+    """
+    if rescale:
+        image.rescale(rescale)
+    if color_formula:
+        image.apply_color_formula(color_formula)
+
+    data, mask = image.data, image.mask
+    datatype_range = image.dataset_statistics or (dtype_ranges[str(data.dtype)],)
+    if colormap:
+        data, alpha_from_cmap = apply_cmap(data, colormap)
+        mask = np.bitwise_and(alpha_from_cmap, mask)
+        datatype_range = (dtype_ranges[str(data.dtype)],)
+
+    if not output_format:
+        output_format = ImageType.jpeg if mask.all() else ImageType.png
+
+    valid_dtypes = FORMAT_DTYPES.get(output_format, [])
+    if valid_dtypes and data.dtype not in valid_dtypes:
+        warnings.warn(
+            f"Invalid type: `{data.dtype}` for the `{output_format}` driver. "
+            "Data will be rescaled using min/max type bounds or dataset_statistics.",
+            InvalidDatatypeWarning,
+            stacklevel=1,
+        )
+        data = rescale_array(data, mask, in_range=datatype_range)
+
+    creation_options = {**kwargs, **output_format.profile}
+    if output_format == ImageType.tif:
+        creation_options.setdefault("transform", image.transform)
+        if image.crs:
+            creation_options.setdefault("crs", image.crs)
+
+    content = render(data, mask if add_mask else None, img_format=output_format.driver, **creation_options)
+    return content, output_format.mediatype
+
+
 @dataclass
 class TilerFactory(TiTilerFactory):
     default_tms = "WebMercatorQuad"
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, version_dependency: Callable[..., str] = DefaultVersionParams, **kwargs):
+        """
+        Args:
+            version_dependency: Dependency returning the version of the requested data. It is included in the tile
+                cache key, so that tiles are regenerated as soon as the data is overwritten.
+        """
+        self.version_dependency = version_dependency
+        kwargs.setdefault("render_func", render_tile_image)
         super().__init__(*args, **kwargs)
         self.reader: Type[BaseReader] = Reader
 
+    def read_tile(
+        self,
+        src_path: str,
+        tms: TileMatrixSet,
+        z: int,
+        x: int,
+        y: int,
+        scale: int,
+        reader_params: DefaultDependency,
+        tile_params: TileParams,
+        layer_params: BidxExprParams,
+        dataset_params: DatasetParams,
+        env: dict,
+        labels: dict[str, str],
+        reservation: MemoryReservation,
+        post_process: bool = False,
+    ) -> tuple[ImageData, Any]:
+        """
+        Read the data of a tile.
+
+        Args:
+            src_path: The path to the raster. This can be a local file path or an S3 url.
+            tms: Tile matrix set of the tile.
+            z: Tile zoom level.
+            x: Tile column index.
+            y: Tile row index.
+            scale: Tile size scale, 1 for 256x256 tiles.
+            reader_params: Parameters passed to the reader.
+            tile_params: Tile parameters, such as the buffer and padding.
+            layer_params: Band indexes or expression to read.
+            dataset_params: Dataset parameters, such as the nodata value and resampling method.
+            env: GDAL environment options.
+            labels: Metric labels of the request.
+            reservation: Memory reservation of the request, which is grown by the memory needed to render the tile
+                before its data is read.
+            post_process: Whether the tile will be post processed.
+
+        Raises:
+            HTTPException: The tile is outside of the raster bounds, or there is not enough memory to render it.
+
+        Returns:
+            The tile data and the colormap of the dataset, if any.
+
+        """
+        with rasterio.Env(**{**GDAL_HTTP_STATS_ENV, **env}):
+            logger.info(f"opening data with reader: {self.reader}")
+            with track_stage("dataset_open", labels):
+                src_dst = self.reader(src_path, tms=tms, **reader_params.as_dict())
+            with src_dst:
+                bands, itemsize = get_band_profile(src_dst, layer_params.indexes)
+                reservation.grow(
+                    estimate_tile_memory(
+                        scale * 256, bands, itemsize, tile_params.buffer, tile_params.padding, post_process
+                    )
+                )
+                try:
+                    with track_stage("read", labels):
+                        image = src_dst.tile(
+                            x,
+                            y,
+                            z,
+                            tilesize=scale * 256,
+                            **tile_params.as_dict(),
+                            **layer_params.as_dict(),
+                            **dataset_params.as_dict(),
+                        )
+                    dst_colormap = getattr(src_dst, "colormap", None)
+                except TileOutsideBounds:
+                    raise HTTPException(status_code=500, detail="Requested tile is outside of the raster bounds.")
+
+        return image, dst_colormap
+
     def register_routes(self) -> None:
         """This Method register routes to the router."""
 
@@ -93,6 +265,7 @@ class TilerFactory(TiTilerFactory):
                 ),
             ] = None,
             src_path: str = Depends(self.path_dependency),
+            source_version: str = Depends(self.version_dependency),
             reader_params: DefaultDependency = Depends(self.reader_dependency),
             tile_params: TileParams = Depends(self.tile_dependency),
             layer_params: BidxExprParams = Depends(self.layer_dependency),
@@ -101,6 +274,7 @@ class TilerFactory(TiTilerFactory):
             colormap: str = Depends(self.colormap_dependency),
             render_params: ImageRenderingParams = Depends(self.render_dependency),
             env: dict = Depends(self.environment_dependency),
+            client_id: str = Depends(get_client_id),
         ) -> Response:
             """
             Create a single map tile from the provided dataset.
@@ -117,6 +291,7 @@ class TilerFactory(TiTilerFactory):
                 format: The format of the image, e.g. PNG. This will be automatically determined from the source path
                     if no value is provided.
                 src_path: The path to the raster to extract a tile from. This can be a local file path or an S3 url.
+                source_version: Version of the raster, used only to key the tile cache.
                 reader_params: Paramsters to pass through to the tile reader.
                 tile_params: Tile specific parameters to use when creating the tile. For example whether to buffer the
                     boundary of the tile, and if so by what distance (m).
@@ -126,6 +301,7 @@ class TilerFactory(TiTilerFactory):
                 colormap: Name of the colourmap to apply (if relevant). For example "viridis".
                 render_params: Image rendering parameters, for example whether to add a mask to the output tile.
                 env: Dictionary of any environment variables to use during processing.
+                client_id: Identifier of the client, used only to limit the renders queued for each client.
 
             Returns:
                 Response object containing the tile image bytes alongside headers detailing the tile boundaries, CRS,
@@ -133,33 +309,72 @@ class TilerFactory(TiTilerFactory):
 
             """
             # """Create map tile from a dataset."""
+            labels = get_stage_labels(src_path, z, format)
+            stage_labels.set(labels)
+
             tms = self.supported_tms.get(tileMatrixSetId)
-            with rasterio.Env(**env):
-                logger.info(f"opening data with reader: {self.reader}")
-                with self.reader(src_path, tms=tms, **reader_params.as_dict()) as src_dst:
-                    try:
-                        image = src_dst.tile(
-                            x,
-                            y,
-                            z,
-                            tilesize=scale * 256,
-                            **tile_params.as_dict(),
-                            **layer_params.as_dict(),
-                            **dataset_params.as_dict(),
-                        )
-                        dst_colormap = getattr(src_dst, "colormap", None)
-                    except TileOutsideBounds:
-                        raise HTTPException(status_code=500, detail="Requested tile is outside of the raster bounds.")
-
-            if post_process:
-                image = post_process(image)
-
-            content, media_type = self.render_func(
-                image,
-                output_format=format,
-                colormap=colormap or dst_colormap,
-                **render_params.as_dict(),
+            layer = get_layer_name(src_path)
+            # Namespaced like the tile cache, so purging a layer or zoom level also purges the data read for its tiles
+            raw_key = cache_namespaces.prefix(layer, z) + raw_tile_key(
+                src_path,
+                source_version,
+                tileMatrixSetId,
+                z,
+                x,
+                y,
+                tilesize=scale * 256,
+                **reader_params.as_dict(),
+                **tile_params.as_dict(),
+                **layer_params.as_dict(),
+                **dataset_params.as_dict(),
             )
+            # Memory is reserved until the tile has been rendered, once the size of its data is known
+            with memory_budget.reservation(layer, "Request a smaller scale, buffer or fewer bands.") as reservation:
+                # Tile data already read with other rendering parameters is re-rendered without being read again
+                raw_tile = raw_tiles.get(raw_key, labels) if raw_tiles.enabled else None
+                if raw_tile is not None:
+                    reservation.grow(
+                        estimate_tile_memory(
+                            scale * 256,
+                            raw_tile.shape[0],
+                            np.dtype(raw_tile.dtype).itemsize,
+                            tile_params.buffer,
+                            tile_params.padding,
+                            post_process is not None,
+                        )
+                    )
+                    image, dst_colormap = raw_tile.to_image(), raw_tile.colormap
+                else:
+                    image, dst_colormap = self.read_tile(
+                        src_path,
+                        tms,
+                        z,
+                        x,
+                        y,
+                        scale,
+                        reader_params,
+                        tile_params,
+                        layer_params,
+                        dataset_params,
+                        env,
+                        labels,
+                        reservation,
+                        post_process is not None,
+                    )
+                    if raw_tiles.enabled:
+                        raw_tiles.set(raw_key, RawTile.from_image(image, dst_colormap))
+
+                if post_process:
+                    with track_stage("post_process", labels):
+                        image = post_process(image)
+
+                with track_stage("render", labels):
+                    content, media_type = self.render_func(
+                        image,
+                        output_format=format,
+                        colormap=colormap or dst_colormap,
+                        **render_params.as_dict(),
+                    )
 
             headers: dict[str, str] = {}
             if image.bounds is not None:
@@ -168,3 +383,12 @@ class TilerFactory(TiTilerFactory):
                 headers["Content-Crs"] = f"<{uri}>"
 
             return Response(content, media_type=media_type, headers=headers)
+
+
+@dataclass
+class MosaicTilerFactory(TilerFactory):
+    """Cached TilerFactory serving layers made up of many COG granules as a single mosaic."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.reader = MosaicReader
@@ -4,14 +4,13 @@ from fastapi import APIRouter, Depends
 from fastapi.responses import JSONResponse
 from mypy_boto3_s3 import S3Client
 
-from geospatial_api.config import setup_config
-from geospatial_api.utils import get_s3_client
+from geospatial_api.catalogue import get_entry, read_catalogue
+from geospatial_api.context import get_config, get_s3_client
+from geospatial_api.metrics import known_layers
+from geospatial_api.utils import object_versions
 
 router = APIRouter()
 
-config = setup_config()
-s3 = get_s3_client()
-
 EXT_MAPPING = {"tif": "raster", "geojson": "vector"}
 
 # Temporary mapping of layer names to map centres to be used until a database is available to provide the information
@@ -27,14 +26,18 @@ LAYER_CENTRES = {
 
 
 @router.get("/available_data")
-def available_data(s3_client: S3Client = Depends(lambda: s3)) -> dict[str, Any]:
+def available_data(s3_client: S3Client = Depends(get_s3_client), config: Any = Depends(get_config)) -> dict[str, Any]:
     data = []
     items = s3_client.list_objects_v2(Bucket=config.geospatial_data_bucket)
+    layouts = read_catalogue(s3_client, config.geospatial_data_bucket)
 
     for idx, item in enumerate(items.get("Contents", [])):
         key = item["Key"]
         if any([key.endswith(suffix) for suffix in EXT_MAPPING.keys()]):
             name, ext = key.split("/")[-1].split(".")
+            # Record the version of each object from the listing, so cached tiles of overwritten layers are replaced
+            object_versions.record(f"S3://{config.geospatial_data_bucket}/{item['Key']}", item["ETag"])
+            known_layers.add([name])
             data.append(
                 {
                     "id": idx,
@@ -44,6 +47,8 @@ def available_data(s3_client: S3Client = Depends(lambda: s3)) -> dict[str, Any]:
                     "geojson": None,
                     "map_centre": get_map_centre(name),
                     "colourmap_name": "terrain" if "greyscale" in name.lower() else None,
+                    # Layout recorded by `geospatial_api.ingest`, if the object has not changed since
+                    "layout": get_entry(layouts, key, item["ETag"]),
                 }
             )
     return JSONResponse(data)
@@ -0,0 +1,31 @@
+import logging
+
+from fastapi import Depends
+from mypy_boto3_s3 import S3Client
+
+from geospatial_api.context import get_s3_client
+from geospatial_api.mosaic import MosaicParams, footprint_indexes
+from geospatial_api.routers.cached_titiler import MosaicTilerFactory
+
+logger = logging.getLogger(__name__)
+
+
+def MosaicPathParams(layer: str, s3_client: S3Client = Depends(get_s3_client)) -> str:
+    """Ensure the footprint index for the requested mosaic layer is available, and return the layer url."""
+    footprint_indexes.get(layer, s3_client)
+    return layer
+
+
+def MosaicVersionParams(layer: str, s3_client: S3Client = Depends(get_s3_client)) -> str:
+    """Get the version of the requested mosaic layer, which changes when its granules are added to or overwritten."""
+    return footprint_indexes.get(layer, s3_client).version
+
+
+# Create a TilerFactory for layers split into many Cloud-Optimized GeoTIFF granules
+mosaic = MosaicTilerFactory(
+    path_dependency=MosaicPathParams,
+    version_dependency=MosaicVersionParams,
+    reader_dependency=MosaicParams,
+    router_prefix="/mosaic",
+)
+router = mosaic.router
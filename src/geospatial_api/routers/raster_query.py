@@ -0,0 +1,164 @@
+"""TiTiler factory extension adding batch point and area queries to the raster router."""
+
+from dataclasses import dataclass
+from typing import Any
+
+import rasterio
+from fastapi import Body, Depends, HTTPException, Query
+from mypy_boto3_s3 import S3Client
+from pydantic import BaseModel, Field
+from rasterio.crs import CRS
+from rasterio.io import DatasetReader
+from starlette.concurrency import run_in_threadpool
+from titiler.core.factory import FactoryExtension
+from titiler.core.factory import TilerFactory as TiTilerFactory
+from typing_extensions import Annotated
+
+from geospatial_api.admission import get_client_id, render_admission
+from geospatial_api.context import get_s3_client
+from geospatial_api.memory import memory_budget
+from geospatial_api.raster_query import WGS84, sample_points, zonal_statistics
+from geospatial_api.routers.vector_main import load_geojson
+from geospatial_api.utils import get_layer_name, replace_non_finite
+
+# Maximum number of points that can be sampled in a single request
+MAX_POINTS = 10000
+MEMORY_ADVICE = "Request statistics with a smaller max_size or fewer bands."
+
+
+class PointsRequest(BaseModel):
+    """Points to sample, as (x, y) coordinates."""
+
+    coordinates: list[Annotated[list[float], Field(min_length=2, max_length=2)]] = Field(max_length=MAX_POINTS)
+
+
+def get_features(geojson_data: dict[str, Any]) -> list[dict[str, Any]]:
+    """Get the features of a GeoJSON FeatureCollection, Feature or bare geometry as a list of features."""
+    if geojson_data.get("type") == "FeatureCollection":
+        return list(geojson_data.get("features", []))
+    if geojson_data.get("type") == "Feature":
+        return [geojson_data]
+    return [{"type": "Feature", "properties": {}, "geometry": geojson_data}]
+
+
+@dataclass
+class rasterQueryExtension(FactoryExtension):
+    """Add batch point sampling (`POST /points`) and zonal statistics (`POST /statistics`) endpoints.
+
+    Both endpoints open the dataset once per request and run on the render threads, see
+    `geospatial_api.admission.RenderAdmission`.
+    """
+
+    def register(self, factory: TiTilerFactory) -> None:
+        @factory.router.post("/points", responses={200: {"description": "Pixel values at each point."}})
+        async def points(
+            body: PointsRequest,
+            src_path: str = Depends(factory.path_dependency),
+            bidx: Annotated[list[int] | None, Query(description="Band indexes to sample, defaults to all.")] = None,
+            coord_crs: Annotated[str, Query(description="CRS of the coordinates.")] = "EPSG:4326",
+            env: dict = Depends(factory.environment_dependency),
+            client_id: str = Depends(get_client_id),
+        ) -> dict[str, Any]:
+            """
+            Sample the pixel values of a raster at many points.
+
+            Points are grouped by the internal block of the raster they fall in, so each block is only read once.
+
+            Args:
+                body: Coordinates of the points to sample.
+                src_path: The path to the raster. This can be a local file path or an S3 url.
+                bidx: Band indexes to sample, defaults to all bands.
+                coord_crs: CRS of the coordinates, defaults to WGS84 longitude and latitude.
+                env: GDAL environment options.
+                client_id: Identifier of the client, used to limit the renders queued for each client.
+
+            Returns:
+                The coordinates, the names of the bands sampled, and the values of each band at each point. Values are
+                    null where a point is outside the raster or on a nodata or NaN pixel.
+
+            """
+
+            def read() -> dict[str, Any]:
+                with rasterio.Env(**env), rasterio.open(src_path) as dataset:
+                    values = sample_points(dataset, body.coordinates, bidx, CRS.from_user_input(coord_crs))
+                    indexes = bidx or dataset.indexes
+
+                return {
+                    "coordinates": body.coordinates,
+                    "band_names": [f"b{idx}" for idx in indexes],
+                    "values": replace_non_finite(values.tolist(None)),
+                }
+
+            return await render_admission.run(read, get_layer_name(src_path), client_id)
+
+        @factory.router.post(
+            "/statistics", responses={200: {"description": "GeoJSON features with zonal statistics of each band."}}
+        )
+        async def statistics(
+            geojson_data: Annotated[
+                dict[str, Any] | None,
+                Body(description="GeoJSON FeatureCollection, Feature or Polygon geometry in WGS84."),
+            ] = None,
+            src_path: str = Depends(factory.path_dependency),
+            vector_url: Annotated[
+                str | None, Query(description="S3 url or local path of GeoJSON features to use instead of a body.")
+            ] = None,
+            bidx: Annotated[list[int] | None, Query(description="Band indexes to summarise, defaults to all.")] = None,
+            max_size: Annotated[
+                int, Query(gt=0, description="Maximum width or height in pixels of the data read for each area.")
+            ] = 1024,
+            env: dict = Depends(factory.environment_dependency),
+            s3_client: S3Client = Depends(get_s3_client),
+            client_id: str = Depends(get_client_id),
+        ) -> dict[str, Any]:
+            """
+            Compute zonal statistics of a raster for one or more areas.
+
+            Args:
+                geojson_data: Areas to summarise, as GeoJSON in WGS84.
+                src_path: The path to the raster. This can be a local file path or an S3 url.
+                vector_url: Url of a GeoJSON vector layer, as accepted by the `/vector` endpoint, whose features are the
+                    areas to summarise. Used if no GeoJSON body is given.
+                bidx: Band indexes to summarise, defaults to all bands.
+                max_size: Maximum width or height in pixels of the data read for each area. Larger areas are read at a
+                    lower resolution from the raster overviews.
+                env: GDAL environment options.
+                s3_client: S3 Client used to read the vector layer.
+                client_id: Identifier of the client, used to limit the renders queued for each client.
+
+            Raises:
+                HTTPException: 400 if reading an area would need more than the per-request memory limit, or 503 if
+                    memory did not become available in time.
+
+            Returns:
+                GeoJSON FeatureCollection of the areas, with the statistics of each band in a `statistics` property.
+                    Statistics of bands with no valid pixels within an area are null.
+
+            """
+            if geojson_data is None:
+                if vector_url is None:
+                    raise HTTPException(status_code=400, detail="Either a GeoJSON body or a vector_url is required.")
+                geojson_data = await run_in_threadpool(load_geojson, vector_url, s3_client)
+            features = get_features(geojson_data)
+
+            layer = get_layer_name(src_path)
+
+            def summarise(dataset: DatasetReader, geometry: dict[str, Any]) -> dict[str, dict[str, Any]]:
+                with memory_budget.reservation(layer, MEMORY_ADVICE) as reservation:
+                    return replace_non_finite(zonal_statistics(dataset, geometry, bidx, WGS84, max_size, reservation))
+
+            def read() -> list[dict[str, Any]]:
+                with rasterio.Env(**env), rasterio.open(src_path) as dataset:
+                    return [
+                        {
+                            **feature,
+                            "properties": {
+                                **(feature.get("properties") or {}),
+                                "statistics": summarise(dataset, feature["geometry"]),
+                            },
+                        }
+                        for feature in features
+                    ]
+
+            summarised = await render_admission.run(read, layer, client_id)
+            return {"type": "FeatureCollection", "features": summarised}
@@ -0,0 +1,133 @@
+"""TiTiler factory extension serving raster info and statistics computed once per version of each raster."""
+
+from dataclasses import dataclass
+from functools import partial
+from typing import Any
+
+from fastapi import Depends, Query
+from fastapi.responses import JSONResponse
+from mypy_boto3_s3 import S3Client
+from starlette.concurrency import run_in_threadpool
+from titiler.core.factory import FactoryExtension
+from titiler.core.factory import TilerFactory as TiTilerFactory
+from typing_extensions import Annotated
+
+from geospatial_api.access_log import annotate_request
+from geospatial_api.admission import get_client_id, render_admission
+from geospatial_api.context import get_s3_client
+from geospatial_api.raster_statistics import (
+    DEFAULT_PERCENTILES,
+    compute_statistics,
+    get_document,
+    statistics_key,
+    statistics_level,
+    statistics_store,
+)
+from geospatial_api.routers.cached_titiler import DefaultVersionParams
+from geospatial_api.settings import statistics_setting
+from geospatial_api.utils import get_layer_name
+
+
+@dataclass
+class rasterStatisticsExtension(FactoryExtension):
+    """Add raster info (`GET /info`) and band statistics (`GET /statistics`) endpoints.
+
+    Results are computed once per version of a raster and then served from memory or a sidecar in S3, see
+    `geospatial_api.raster_statistics`.
+    """
+
+    def register(self, factory: TiTilerFactory) -> None:
+        version_dependency = getattr(factory, "version_dependency", DefaultVersionParams)
+
+        @factory.router.get("/info", responses={200: {"description": "Info of the raster."}})
+        async def info(
+            url: Annotated[str, Query(description="S3 url or local path of the raster.")],
+            src_path: str = Depends(factory.path_dependency),
+            source_version: str = Depends(version_dependency),
+            s3_client: S3Client = Depends(get_s3_client),
+        ) -> dict[str, Any]:
+            """
+            Get the info of a raster, such as its bounds, CRS, data type and overviews.
+
+            Args:
+                url: S3 url or local path of the raster.
+                src_path: The path to the raster. This can be a local file path or a signed S3 url.
+                source_version: Version of the raster, so that info is read again once it has been overwritten.
+                s3_client: S3 Client used to read and store the persisted info.
+
+            Returns:
+                Info of the raster, in the format of the TiTiler `/info` endpoint.
+
+            """
+            document = await run_in_threadpool(get_document, url, src_path, source_version, s3_client)
+            return document.info  # type: ignore
+
+        @factory.router.get("/statistics", responses={200: {"description": "Statistics of each band of the raster."}})
+        async def statistics(
+            url: Annotated[str, Query(description="S3 url or local path of the raster.")],
+            src_path: str = Depends(factory.path_dependency),
+            bidx: Annotated[list[int] | None, Query(description="Band indexes to summarise, defaults to all.")] = None,
+            max_size: Annotated[
+                int, Query(gt=0, description="Minimum longest edge in pixels of the overview the statistics use.")
+            ] = statistics_setting.max_size,
+            exact: Annotated[bool, Query(description="Compute the statistics at full resolution.")] = False,
+            categorical: Annotated[bool, Query(description="Count the pixels of each value.")] = False,
+            c: Annotated[list[float] | None, Query(description="Values to count for categorical statistics.")] = None,
+            p: Annotated[list[int] | None, Query(description="Percentiles to compute, defaults to 2 and 98.")] = None,
+            histogram_bins: Annotated[int, Query(gt=0, description="Number of histogram bins.")] = 10,
+            source_version: str = Depends(version_dependency),
+            s3_client: S3Client = Depends(get_s3_client),
+            client_id: str = Depends(get_client_id),
+        ) -> JSONResponse:
+            """
+            Get the statistics of the bands of a raster.
+
+            Statistics are approximate unless `exact` is set. They are computed from the coarsest overview with a
+            longest edge of at least `max_size` pixels, so larger values are more accurate but slower to compute. They
+            are computed once per version of the raster, overview and set of options, and served from storage after.
+
+            Args:
+                url: S3 url or local path of the raster.
+                src_path: The path to the raster. This can be a local file path or a signed S3 url.
+                bidx: Band indexes to summarise, defaults to all bands.
+                max_size: Minimum longest edge in pixels of the overview the statistics are computed from.
+                exact: Compute the statistics at full resolution, ignoring `max_size`. Rejected with a 400 if reading
+                    the raster would need more than the per-request memory limit.
+                categorical: Count the pixels of each value rather than computing a histogram.
+                c: Values to count for categorical statistics, defaults to every value found.
+                p: Percentiles to compute.
+                histogram_bins: Number of histogram bins.
+                source_version: Version of the raster, so that statistics are computed again once it is overwritten.
+                s3_client: S3 Client used to read and store the persisted statistics.
+                client_id: Identifier of the client, used to limit the renders queued for each client.
+
+            Returns:
+                Statistics of each band keyed by band name, in the format of the TiTiler `/statistics` endpoint. The
+                    decimation factor of the overview used is given in an `X-Statistics-Overview` header.
+
+            """
+            document = await run_in_threadpool(get_document, url, src_path, source_version, s3_client)
+            raster_info: dict[str, Any] = document.info  # type: ignore
+            indexes = bidx or list(range(1, raster_info["count"] + 1))
+            width, height, overviews = raster_info["width"], raster_info["height"], raster_info.get("overviews", [])
+            level = statistics_level(width, height, overviews, None if exact else max_size)
+            percentiles = p or DEFAULT_PERCENTILES
+            key = statistics_key(level, categorical, c, percentiles, histogram_bins)
+
+            missing = [idx for idx in indexes if f"b{idx}" not in document.statistics.get(key, {})]
+            annotate_request(statistics_cache="MISS" if missing else "HIT")
+            if missing:
+                computed = await render_admission.run(
+                    partial(compute_statistics, src_path, missing, level, categorical, c, percentiles, histogram_bins),
+                    get_layer_name(url),
+                    client_id,
+                )
+                await run_in_threadpool(
+                    partial(statistics_store.update, url, document, s3_client, key=key, statistics=computed)
+                )
+
+            band_statistics = document.statistics[key]
+            return JSONResponse(
+                {f"b{idx}": band_statistics[f"b{idx}"] for idx in indexes},
+                headers={"X-Statistics-Overview": str(level)},
+            )
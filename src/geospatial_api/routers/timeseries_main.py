@@ -0,0 +1,133 @@
+import io
+from enum import Enum
+from functools import partial
+from typing import Any
+
+import numpy as np
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import JSONResponse
+from mypy_boto3_s3 import S3Client
+from starlette.responses import Response
+from typing_extensions import Annotated
+
+from geospatial_api.admission import get_client_id, render_admission
+from geospatial_api.context import get_s3_client
+from geospatial_api.memory import memory_budget
+from geospatial_api.mosaic import list_granules
+from geospatial_api.settings import timeseries_setting
+from geospatial_api.timeseries import JSON_VALUE_BYTES, NPY_VALUE_BYTES, read_timeseries
+from geospatial_api.utils import get_file_path, get_layer_name, get_source_version, replace_non_finite
+
+router = APIRouter(tags=["Time Series"])
+
+MEMORY_ADVICE = "Request a smaller bbox or max_size, fewer bands or fewer timesteps."
+
+
+class TimeseriesFormat(str, Enum):
+    """Output formats of a time series."""
+
+    json = "json"
+    npy = "npy"
+
+
+def parse_coordinates(value: str, name: str, length: int) -> tuple[float, ...]:
+    """Parse comma separated coordinates from a query parameter."""
+    try:
+        coordinates = tuple(float(coordinate) for coordinate in value.split(","))
+    except ValueError:
+        coordinates = ()
+    if len(coordinates) != length:
+        raise HTTPException(status_code=400, detail=f"{name} must be {length} comma separated numbers.")
+    return coordinates
+
+
+@router.get("/timeseries")
+async def timeseries(
+    layer: Annotated[
+        str | None, Query(description="S3 prefix or local directory containing one COG per timestep, in name order.")
+    ] = None,
+    url: Annotated[list[str] | None, Query(description="S3 urls or local paths of the COG of each timestep.")] = None,
+    point: Annotated[str | None, Query(description="WGS84 point to read, as `lon,lat`.")] = None,
+    bbox: Annotated[str | None, Query(description="WGS84 bounding box to read, as `west,south,east,north`.")] = None,
+    bidx: Annotated[list[int] | None, Query(description="Band indexes to read, defaults to all.")] = None,
+    max_size: Annotated[int, Query(gt=0, le=1024, description="Maximum width or height of a bounding box.")] = 256,
+    format: TimeseriesFormat = TimeseriesFormat.json,  # noqa A002
+    s3_client: S3Client = Depends(get_s3_client),
+    client_id: str = Depends(get_client_id),
+) -> Response:
+    """
+    Read a point or bounding box from every timestep of a layer stored as one COG per timestep.
+
+    The timesteps are read concurrently, so a long time series can be fetched in a single request.
+
+    Args:
+        layer: S3 prefix or local directory containing the COG of each timestep, ordered by name.
+        url: S3 urls or local paths of the COG of each timestep, in time order. Used if no layer is given.
+        point: WGS84 point to read, as `lon,lat`.
+        bbox: WGS84 bounding box to read, as `west,south,east,north`, if no point is given.
+        bidx: Band indexes to read, defaults to all bands.
+        max_size: Maximum width or height in pixels of the data read for a bounding box.
+        format: Output format. Either JSON, or a NumPy `.npy` array of float32 values with NaN for missing data.
+        s3_client: S3 Client used to list and sign the COGs.
+        client_id: Identifier of the client, used to limit the renders queued for each client.
+
+    Raises:
+        HTTPException: 400 if reading the time series would need more than the per-request memory limit, or 503 if
+            memory did not become available in time.
+
+    Returns:
+        For JSON, the timestep names and urls, the band names, and the values of shape (timesteps, bands) for a point
+            or (timesteps, bands, height, width) for a bounding box, with null for missing or NaN data. For npy, the
+            values alone, with the band names in an `X-Band-Names` header.
+
+    """
+    if (layer is None) == (url is None):
+        raise HTTPException(status_code=400, detail="Either a layer or a list of urls is required.")
+    if (point is None) == (bbox is None):
+        raise HTTPException(status_code=400, detail="Either a point or a bbox is required.")
+    coordinates = parse_coordinates(point, "point", 2) if point is not None else None
+    bounds = parse_coordinates(bbox, "bbox", 4) if bbox is not None else None
+
+    def read() -> Response:
+        urls = list_granules(layer, s3_client) if layer is not None else list(url or [])
+        if not urls:
+            raise HTTPException(status_code=404, detail="No COGs were found for the time series.")
+        if len(urls) > timeseries_setting.max_timesteps:
+            raise HTTPException(
+                status_code=400, detail=f"At most {timeseries_setting.max_timesteps} timesteps can be read at once."
+            )
+
+        path_resolver = partial(get_file_path, s3_client=s3_client)
+        version_resolver = partial(get_source_version, s3_client=s3_client)
+        output_itemsize = NPY_VALUE_BYTES if format == TimeseriesFormat.npy else JSON_VALUE_BYTES
+        with memory_budget.reservation(layer_name, MEMORY_ADVICE) as reservation:
+            indexes, values = read_timeseries(
+                urls,
+                path_resolver,
+                coordinates,  # type: ignore
+                bounds,  # type: ignore
+                bidx,
+                max_size,
+                reservation=reservation,
+                output_itemsize=output_itemsize,
+                version_resolver=version_resolver,
+            )
+            band_names = [f"b{idx}" for idx in indexes]
+
+            if format == TimeseriesFormat.npy:
+                buffer = io.BytesIO()
+                np.save(buffer, values.astype(np.float32).filled(np.nan))
+                return Response(
+                    buffer.getvalue(), media_type="application/x-npy", headers={"X-Band-Names": ",".join(band_names)}
+                )
+
+            content: dict[str, Any] = {
+                "timesteps": [get_layer_name(timestep_url) for timestep_url in urls],
+                "urls": urls,
+                "band_names": band_names,
+                "values": replace_non_finite(values.tolist(None)),
+            }
+            return JSONResponse(content)
+
+    layer_name = get_layer_name(layer or url[0])  # type: ignore
+    return await render_admission.run(read, layer_name, client_id)
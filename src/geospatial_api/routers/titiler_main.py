@@ -1,29 +1,45 @@
 import logging
 
-from fastapi import Depends
+from fastapi import Depends, Request
 from mypy_boto3_s3 import S3Client
 from titiler.extensions import cogValidateExtension, cogViewerExtension, wmsExtension
 
+from geospatial_api.context import get_s3_client
+from geospatial_api.metrics import get_stage_labels, track_stage
 from geospatial_api.routers.cached_titiler import TilerFactory
-from geospatial_api.utils import get_file_path, get_s3_client
+from geospatial_api.routers.raster_query import rasterQueryExtension
+from geospatial_api.routers.raster_statistics import rasterStatisticsExtension
+from geospatial_api.utils import get_file_path, get_source_version
 
 logger = logging.getLogger(__name__)
 
-s3 = get_s3_client()
-
 
 # Custom Path dependency which will sign s3 url
-def DatasetPathParams(url: str, s3_client: S3Client = Depends(lambda: s3)) -> str:
+def DatasetPathParams(request: Request, url: str, s3_client: S3Client = Depends(get_s3_client)) -> str:
     """Create dataset path from args"""
+    labels = get_stage_labels(url, request.path_params.get("z"), request.path_params.get("format"))
     # Use your provider library to sign the URL
-    file_path = get_file_path(url, s3_client)
+    with track_stage("presign", labels):
+        file_path = get_file_path(url, s3_client)
     return file_path
 
 
+def DatasetVersionParams(url: str, s3_client: S3Client = Depends(get_s3_client)) -> str:
+    """Get the version of the dataset, so that cached tiles are not served once it has been overwritten."""
+    return get_source_version(url, s3_client)
+
+
 # Create a TilerFactory for Cloud-Optimized GeoTIFFs
 cog = TilerFactory(
     path_dependency=DatasetPathParams,
+    version_dependency=DatasetVersionParams,
     router_prefix="/maps",
-    extensions=[wmsExtension(), cogValidateExtension(), cogViewerExtension()],
+    extensions=[
+        wmsExtension(),
+        cogValidateExtension(),
+        cogViewerExtension(),
+        rasterQueryExtension(),
+        rasterStatisticsExtension(),
+    ],
 )
 router = cog.router
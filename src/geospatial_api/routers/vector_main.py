@@ -3,23 +3,50 @@ from urllib.parse import urlparse
 
 import geojson
 from fastapi import APIRouter, Depends
+from fastapi.responses import JSONResponse
 from mypy_boto3_s3 import S3Client
 
-from geospatial_api.utils import get_file_path, get_s3_client
+from geospatial_api.admission import get_client_id
+from geospatial_api.cache import CachedVector
+from geospatial_api.context import get_s3_client
+from geospatial_api.utils import get_file_path, get_source_version
 
 router = APIRouter(tags=["Vector Data"])
-s3 = get_s3_client()
 
 
-@router.get("/vector")
-def read_index(url: str, s3_client: S3Client = Depends(lambda: s3)) -> dict[str, Any]:
+def VectorVersionParams(url: str, s3_client: S3Client = Depends(get_s3_client)) -> str:
+    """Get the version of the vector data, so that it is not served from the cache once it has been overwritten."""
+    return get_source_version(url, s3_client)
+
+
+def load_geojson(url: str, s3_client: S3Client) -> dict[str, Any]:
+    """
+    Load GeoJSON vector data.
+
+    Args:
+        url: S3 url or local file path of the GeoJSON.
+        s3_client: S3 Client used to read S3 objects.
+
+    Returns:
+        The GeoJSON data.
+
+    """
     url_parts = urlparse(url)
     if url_parts.scheme.lower() == "s3":
         response = s3_client.get_object(Bucket=url_parts.netloc, Key=url_parts.path.lstrip("/"))
-        geojson_data = geojson.load(response["Body"])
-    else:
-        file_path = get_file_path(url, s3_client)
-        with open(file_path) as geojson_file:
-            geojson_data = geojson.load(geojson_file)
+        return geojson.load(response["Body"])
+
+    file_path = get_file_path(url, s3_client)
+    with open(file_path) as geojson_file:
+        return geojson.load(geojson_file)
 
-    return geojson_data
+
+@router.get("/vector")
+@CachedVector(alias="default")
+def read_index(
+    url: str,
+    source_version: str = Depends(VectorVersionParams),
+    s3_client: S3Client = Depends(get_s3_client),
+    client_id: str = Depends(get_client_id),
+) -> JSONResponse:
+    return JSONResponse(load_geojson(url, s3_client))
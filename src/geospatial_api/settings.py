@@ -1,3 +1,5 @@
+from typing import Literal
+
 from pydantic_settings import BaseSettings
 
 
@@ -6,7 +8,15 @@ class CacheSettings(BaseSettings):
 
     endpoint: str | None = None
     ttl: int = 3600
+    soft_ttl: int = 600
     namespace: str = ""
+    version_ttl: int = 30
+    backend: Literal["memory", "disk", "tiered"] = "memory"
+    disk_path: str = "/tmp/geospatial_api/tile_cache.sqlite"
+    disk_max_bytes: int = 2 * 1024**3
+    memory_ttl: int = 300
+    raw_max_bytes: int = 256 * 1024**2
+    namespaces_path: str | None = None
 
     class Config:
         """model config"""
@@ -16,3 +26,141 @@ class CacheSettings(BaseSettings):
 
 
 cache_setting = CacheSettings()
+
+
+class MosaicSettings(BaseSettings):
+    """Mosaic settings"""
+
+    threads: int = 8
+    index_ttl: int = 300
+    max_indexes: int = 64
+    max_granules: int = 10000
+    layers: list[str] | None = None
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "MOSAIC_"
+
+
+mosaic_setting = MosaicSettings()
+
+
+class MetricsSettings(BaseSettings):
+    """Metrics settings"""
+
+    port: int = 8080
+    gdal_http_stats: bool = False
+    layers: list[str] = []
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "METRICS_"
+
+
+metrics_setting = MetricsSettings()
+
+
+class AccessLogSettings(BaseSettings):
+    """Access log settings"""
+
+    path: str | None = None
+    queue_size: int = 10000
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "ACCESS_LOG_"
+
+
+access_log_setting = AccessLogSettings()
+
+
+class AdminSettings(BaseSettings):
+    """Admin API settings"""
+
+    token: str | None = None
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "ADMIN_"
+
+
+admin_setting = AdminSettings()
+
+
+class RenderSettings(BaseSettings):
+    """Render admission control settings"""
+
+    threads: int = 16
+    max_queue: int = 64
+    layer_limit: int = 48
+    client_limit: int = 16
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "RENDER_"
+
+
+render_setting = RenderSettings()
+
+
+class TimeseriesSettings(BaseSettings):
+    """Time series settings"""
+
+    threads: int = 16
+    max_timesteps: int = 1000
+    handle_cache_size: int = 256
+    handle_ttl: int = 600
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "TIMESERIES_"
+
+
+timeseries_setting = TimeseriesSettings()
+
+
+class StatisticsSettings(BaseSettings):
+    """Raster statistics settings"""
+
+    max_size: int = 1024
+    cache_size: int = 1024
+    persist: bool = True
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "STATISTICS_"
+
+
+statistics_setting = StatisticsSettings()
+
+
+class MemorySettings(BaseSettings):
+    """Tile rendering memory settings"""
+
+    gdal_cache_mb: int = 256
+    request_limit_mb: int = 256
+    total_limit_mb: int = 1024
+    wait_timeout: float = 5.0
+
+    class Config:
+        """model config"""
+
+        env_file = ".env"
+        env_prefix = "MEMORY_"
+
+
+memory_setting = MemorySettings()
@@ -0,0 +1,222 @@
+"""Time series reads across layers stored as one COG per timestep.
+
+Every timestep is read concurrently on a bounded thread pool shared by all requests. Open datasets are kept in a shared
+pool of handles, so repeated requests for the same layer skip re-opening each COG and re-reading its header.
+
+A bounding box of many timesteps can need a lot of memory, so the memory needed is reserved from the render memory
+budget once the shape of the data is known, before any timestep is read, see `geospatial_api.memory`.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable, Iterator, Sequence
+
+import numpy as np
+import rasterio
+from rasterio.enums import Resampling
+from rasterio.io import DatasetReader
+from rasterio.warp import transform_bounds
+from rasterio.windows import from_bounds
+
+from geospatial_api.memory import MemoryReservation
+from geospatial_api.raster_query import WGS84, sample_points
+from geospatial_api.settings import timeseries_setting
+from geospatial_api.utils import get_source_id
+
+BoundingBox = tuple[float, float, float, float]
+
+# Bytes per value of a time series converted to JSON, as a Python float in a list and then as text
+JSON_VALUE_BYTES = 64
+# Bytes per value of a time series written as npy, as a float32 array and then as the response body
+NPY_VALUE_BYTES = 8
+
+
+class DatasetHandleCache:
+    """Pool of open datasets shared between requests.
+
+    A dataset handle can only be used by one thread at a time, so handles are checked out of the pool while in use and
+    several handles may be open for the same dataset. Idle handles are closed once the pool is full, least recently
+    used first, or once they are older than the ttl, which must be shorter than the expiry of presigned urls.
+    """
+
+    def __init__(self, max_size: int, ttl: int) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._idle: OrderedDict[str, list[tuple[float, DatasetReader]]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _checkout(self, source_id: str) -> tuple[float, DatasetReader] | None:
+        expired = []
+        handle = None
+        with self._lock:
+            handles = self._idle.get(source_id, [])
+            while handles:
+                self._size -= 1
+                candidate = handles.pop()
+                if time.monotonic() - candidate[0] <= self.ttl:
+                    handle = candidate
+                    break
+                expired.append(candidate[1])
+
+        for dataset in expired:
+            dataset.close()
+        return handle
+
+    def _checkin(self, source_id: str, handle: tuple[float, DatasetReader]) -> None:
+        evicted = []
+        with self._lock:
+            self._idle.setdefault(source_id, []).append(handle)
+            self._idle.move_to_end(source_id)
+            self._size += 1
+            while self._size > self.max_size:
+                oldest_id, handles = next(iter(self._idle.items()))
+                evicted.append(handles.pop(0)[1])
+                self._size -= 1
+                if not handles:
+                    del self._idle[oldest_id]
+
+        for dataset in evicted:
+            dataset.close()
+
+    @contextmanager
+    def open(self, url: str, path_resolver: Callable[[str], str], version: str = "") -> Iterator[DatasetReader]:
+        """
+        Check out an open dataset, opening it if no idle handle is available.
+
+        Args:
+            url: S3 url or local path of the dataset.
+            path_resolver: Function converting the url into a path that can be opened by rasterio.
+            version: Version of the dataset, see `geospatial_api.utils.get_source_version`. Handles of a previous
+                version are never reused, so an overwritten dataset is opened again.
+
+        Yields:
+            The open dataset, which is returned to the pool afterwards unless reading it failed.
+
+        """
+        source_id = f"{get_source_id(url)}@{version}"
+        handle = self._checkout(source_id) or (time.monotonic(), rasterio.open(path_resolver(url)))
+        try:
+            yield handle[1]
+        except Exception:
+            handle[1].close()
+            raise
+        self._checkin(source_id, handle)
+
+    def clear(self) -> None:
+        with self._lock:
+            handles = [dataset for idle in self._idle.values() for _, dataset in idle]
+            self._idle.clear()
+            self._size = 0
+
+        for dataset in handles:
+            dataset.close()
+
+
+dataset_handles = DatasetHandleCache(max_size=timeseries_setting.handle_cache_size, ttl=timeseries_setting.handle_ttl)
+executor = ThreadPoolExecutor(max_workers=timeseries_setting.threads, thread_name_prefix="timeseries")
+
+
+def bbox_window_shape(dataset: DatasetReader, bbox: BoundingBox, max_size: int) -> tuple[int, int]:
+    """Get the shape of the data to read for a WGS84 bounding box, at most `max_size` pixels wide or high."""
+    window = from_bounds(*transform_bounds(WGS84, dataset.crs, *bbox), transform=dataset.transform)
+    scale = max(window.width / max_size, window.height / max_size, 1)
+    return max(1, math.ceil(window.height / scale)), max(1, math.ceil(window.width / scale))
+
+
+def read_bbox(
+    dataset: DatasetReader, bbox: BoundingBox, indexes: Sequence[int], shape: tuple[int, int]
+) -> np.ma.MaskedArray:
+    """Read the data within a WGS84 bounding box resampled to a fixed shape, masking anything outside the dataset."""
+    window = from_bounds(*transform_bounds(WGS84, dataset.crs, *bbox), transform=dataset.transform)
+    return dataset.read(
+        indexes,
+        window=window,
+        out_shape=(len(indexes), *shape),
+        boundless=True,
+        masked=True,
+        resampling=Resampling.nearest,
+    )
+
+
+def estimate_timeseries_memory(timesteps: int, bands: int, pixels: int, itemsize: int, output_itemsize: int) -> int:
+    """
+    Estimate the peak memory needed to read a time series and convert it to its output format.
+
+    Every timestep is read with its mask, then copied when the timesteps are stacked. The stacked values are then
+    converted to the output format while held.
+
+    Args:
+        timesteps: Number of timesteps read.
+        bands: Number of bands read.
+        pixels: Number of pixels read from each band, one for a point.
+        itemsize: Bytes per value of the data read.
+        output_itemsize: Bytes per value of the output, e.g. `JSON_VALUE_BYTES`.
+
+    Returns:
+        Estimated peak memory in bytes.
+
+    """
+    values = timesteps * bands * pixels
+    return values * (itemsize + 1) * 2 + values * output_itemsize
+
+
+def read_timeseries(
+    urls: Sequence[str],
+    path_resolver: Callable[[str], str],
+    point: tuple[float, float] | None = None,
+    bbox: BoundingBox | None = None,
+    indexes: Sequence[int] | None = None,
+    max_size: int = 256,
+    reservation: MemoryReservation | None = None,
+    output_itemsize: int = 0,
+    version_resolver: Callable[[str], str] | None = None,
+) -> tuple[list[int], np.ma.MaskedArray]:
+    """
+    Read a point or bounding box from every timestep of a time series.
+
+    Args:
+        urls: S3 urls or local paths of the COG of each timestep, in time order.
+        path_resolver: Function converting a url into a path that can be opened by rasterio.
+        point: WGS84 (longitude, latitude) of the point to read.
+        bbox: WGS84 (west, south, east, north) bounding box to read, if no point is given.
+        indexes: Band indexes to read, defaults to all bands of the first timestep.
+        max_size: Maximum width or height in pixels of the data read for a bounding box.
+        reservation: Memory reservation of the request, which is grown by the memory needed before the timesteps are
+            read.
+        output_itemsize: Bytes per value of the output the values will be converted to, reserved with the data read.
+        version_resolver: Function getting the version of a url, so that overwritten COGs are opened again rather than
+            read from a pooled handle of a previous version.
+
+    Raises:
+        HTTPException: There is not enough memory to read the time series, see `geospatial_api.memory`.
+
+    Returns:
+        The band indexes read, and a masked array of shape (timesteps, bands) for a point or (timesteps, bands, height,
+        width) for a bounding box. Every timestep of a bounding box is resampled to the grid of the first timestep.
+
+    """
+    versions = [version_resolver(url) for url in urls] if version_resolver is not None else [""] * len(urls)
+    with dataset_handles.open(urls[0], path_resolver, versions[0]) as dataset:
+        indexes = list(indexes or dataset.indexes)
+        shape = bbox_window_shape(dataset, bbox, max_size) if bbox is not None else None
+        itemsize = max(np.dtype(dataset.dtypes[idx - 1]).itemsize for idx in indexes)
+
+    if reservation is not None:
+        pixels = math.prod(shape) if shape is not None else 1
+        reservation.grow(estimate_timeseries_memory(len(urls), len(indexes), pixels, itemsize, output_itemsize))
+
+    def read(url: str, version: str) -> np.ma.MaskedArray:
+        with dataset_handles.open(url, path_resolver, version) as dataset:
+            if point is not None:
+                return sample_points(dataset, [point], indexes)[0]
+            return read_bbox(dataset, bbox, indexes, shape)  # type: ignore
+
+    return indexes, np.ma.stack(list(executor.map(read, urls, versions)))
@@ -1,19 +1,42 @@
+import logging
+import math
+import time
 from pathlib import Path
-from urllib.parse import urlparse
+from typing import Any
+from urllib.parse import urlparse, urlunparse
 
 import boto3
 import boto3.session
+import numpy as np
 from botocore.client import Config
+from botocore.exceptions import BotoCoreError, ClientError
 from mypy_boto3_s3 import S3Client
 
-from geospatial_api.config import LocalConfig, setup_config
+from geospatial_api.config import LocalConfig
+from geospatial_api.settings import cache_setting
+
+logger = logging.getLogger(__name__)
 
 boto3_config = Config(max_pool_connections=100)
 
-config = setup_config()
+# Error codes of a HEAD request for an object that does not exist
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+
 
+def create_s3_client(config: Any) -> S3Client:
+    """
+    Create an S3 client for the environment the API is running in.
 
-def get_s3_client() -> S3Client:
+    Creating a client is relatively slow, so the application shares a single client, see
+    `geospatial_api.context.get_s3_client`.
+
+    Args:
+        config: The API config.
+
+    Returns:
+        S3 client, pointing at localstack when running locally.
+
+    """
     if isinstance(config, LocalConfig):
         session = boto3.session.Session(
             aws_access_key_id=config.AWS_ACCESS_KEY_ID,
@@ -64,6 +87,88 @@ def get_file_path(url: str | Path, s3_client: S3Client) -> str:
         return file_path
 
 
+class ObjectVersions:
+    """Versions of the S3 objects read by the API, used to invalidate cached data when an object is overwritten.
+
+    The version of an object is its ETag. Versions are either fetched with a HEAD request, which is then reused for
+    `ttl` seconds, or recorded from bucket listings, which include the ETag of every object for free.
+    """
+
+    def __init__(self, ttl: int) -> None:
+        self.ttl = ttl
+        self._versions: dict[str, tuple[float, str]] = {}
+
+    def record(self, url: str, version: str) -> None:
+        """Record the current version of an object, e.g. from a bucket listing."""
+        self._versions[get_source_id(url)] = (time.monotonic(), version.strip('"'))
+
+    def get(self, url: str, s3_client: S3Client) -> str:
+        """
+        Get the version of an S3 object, only requesting it from S3 if the known version is older than the ttl.
+
+        If the version cannot be requested, for example because S3 is unavailable, the last known version is reused for
+        another `ttl` seconds, so that cached data keyed on it can still be served.
+
+        Args:
+            url: S3 url of the object.
+            s3_client: S3 Client used to fetch the object's version.
+
+        Returns:
+            The ETag of the object, or an empty string if it does not exist or its version has never been known.
+
+        """
+        source_id = get_source_id(url)
+        entry = self._versions.get(source_id)
+        if entry is not None and time.monotonic() - entry[0] <= self.ttl:
+            return entry[1]
+
+        url_parts = urlparse(url)
+        try:
+            response = s3_client.head_object(Bucket=url_parts.netloc, Key=url_parts.path.lstrip("/"))
+        except (BotoCoreError, ClientError) as error:
+            missing = isinstance(error, ClientError) and error.response.get("Error", {}).get("Code") in NOT_FOUND_CODES
+            if entry is None or missing:
+                logger.warning(f"Unable to get the version of {url}: {error}")
+                self._versions.pop(source_id, None)
+                return ""
+            logger.warning(f"Unable to get the version of {url}, reusing the last known version: {error}")
+            self._versions[source_id] = (time.monotonic(), entry[1])
+            return entry[1]
+
+        self.record(url, response["ETag"])
+        return self._versions[source_id][1]
+
+    def clear(self) -> None:
+        self._versions.clear()
+
+
+object_versions = ObjectVersions(ttl=cache_setting.version_ttl)
+
+
+def get_source_version(url: str | Path, s3_client: S3Client) -> str:
+    """
+    Get the version of the data at a url, which changes whenever the data is overwritten.
+
+    For S3 urls this is the object's ETag, see `ObjectVersions`. For local files it is the modification time and size.
+
+    Args:
+        url: S3 url or local file path.
+        s3_client: S3 Client used to fetch the version of S3 objects.
+
+    Returns:
+        Version of the data, or an empty string if it does not exist.
+
+    """
+    if isinstance(url, str) and urlparse(url).scheme.lower() == "s3":
+        return object_versions.get(url, s3_client)
+
+    try:
+        stat = Path(urlparse(str(url)).path.replace("//", "/")).stat()
+    except OSError:
+        return ""
+    return f"{stat.st_mtime_ns}-{stat.st_size}"
+
+
 def check_path_exists(path: str | Path) -> None:
     """
     Check a local file path exists
@@ -78,3 +183,61 @@ def check_path_exists(path: str | Path) -> None:
     path = Path(path)
     if not path.exists():
         raise FileExistsError(f"The provided path does not exist: {str(path)}")
+
+
+def get_layer_name(path: str | Path) -> str:
+    """
+    Get the layer name from a file path, S3 url or presigned url.
+
+    The layer name is the file name of the source data without its extension (or the final directory name for mosaic
+    layers), matching the names listed by the available_data endpoint.
+
+    Args:
+        path: Path or url of the layer's source data.
+
+    Returns:
+        Name of the layer.
+
+    """
+    return Path(urlparse(str(path)).path).stem
+
+
+def get_source_id(url: str | Path) -> str:
+    """
+    Get a normalised identifier for a data source.
+
+    The scheme is lower-cased, repeated slashes are collapsed and any query string is removed, so that S3 urls, file
+    urls and presigned urls for the same object always give the same identifier.
+
+    Args:
+        url: Path or url of the source data.
+
+    Returns:
+        Normalised url of the source data.
+
+    """
+    url_parts = urlparse(str(url))
+    return urlunparse((url_parts.scheme.lower(), url_parts.netloc, url_parts.path.replace("//", "/"), "", "", ""))
+
+
+def replace_non_finite(value: Any) -> Any:
+    """
+    Replace NaN and infinite floats nested in lists and dicts with None, so that the value can be serialised as JSON.
+
+    Statistics and pixel values of bands that are entirely masked or nodata are NaN, which the JSON responses of the API
+    refuse to serialise.
+
+    Args:
+        value: Value to convert, e.g. the statistics of each band.
+
+    Returns:
+        The value, with every non-finite float replaced by None.
+
+    """
+    if isinstance(value, (float, np.floating)):
+        return float(value) if math.isfinite(value) else None
+    if isinstance(value, dict):
+        return {key: replace_non_finite(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [replace_non_finite(item) for item in value]
+    return value
@@ -1,9 +1,19 @@
 from pathlib import Path
+from typing import Iterator
 
 import pytest
 
+from geospatial_api.raw_cache import raw_tiles
+
 
 @pytest.fixture
 def data_dir() -> Path:
     data_dir = Path(__file__).parents[1].joinpath("data")
     return data_dir
+
+
+@pytest.fixture(autouse=True)
+def clear_raw_tiles() -> Iterator[None]:
+    """Start every test without tile data read by previous tests, which would skip the reads being tested."""
+    raw_tiles.clear()
+    yield
@@ -0,0 +1,95 @@
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+
+from geospatial_api.main import app
+from geospatial_api.routers.cached_titiler import TilerFactory
+from geospatial_api.settings import admin_setting
+
+client = TestClient(app)
+
+ADMIN_HEADERS = {"X-Admin-Token": "secret"}
+
+
+@pytest.fixture(autouse=True)
+def admin_token(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(admin_setting, "token", "secret")
+
+
+def tile_url(data_dir: Path) -> str:
+    raster_path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+    return f"api/maps/tiles/WebMercatorQuad/16/32261/21043.png?url=file:///{raster_path}"
+
+
+class TestAdminAuth:
+    def test_missing_token(self) -> None:
+        response = client.get("/api/admin/cache/stats")
+        assert response.status_code == 401
+
+    def test_disabled_without_token(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check the admin API cannot be used unless a token has been configured."""
+        monkeypatch.setattr(admin_setting, "token", None)
+
+        response = client.get("/api/admin/cache/stats", headers=ADMIN_HEADERS)
+
+        assert response.status_code == 403
+
+
+class TestCacheAdmin:
+    def test_cache_stats(self, data_dir: Path) -> None:
+        """Check cache hits and misses are reported for the layer."""
+        client.delete("/api/admin/cache/layers/test_raster_3857_cog_greyscale", headers=ADMIN_HEADERS)
+        before = client.get("/api/admin/cache/stats", headers=ADMIN_HEADERS).json()
+        before_layer = before["layers"].get("test_raster_3857_cog_greyscale", {"hits": 0, "misses": 0})
+
+        client.get(tile_url(data_dir))
+        client.get(tile_url(data_dir))
+
+        response = client.get("/api/admin/cache/stats", headers=ADMIN_HEADERS)
+        assert response.status_code == 200
+        layer_stats = response.json()["layers"]["test_raster_3857_cog_greyscale"]
+        assert layer_stats["hits"] == before_layer["hits"] + 1
+        assert layer_stats["misses"] == before_layer["misses"] + 1
+        assert layer_stats["entries"] == 1
+        assert layer_stats["bytes"] > 0
+
+    @pytest.mark.parametrize(
+        "purge_url",
+        [
+            "/api/admin/cache",
+            "/api/admin/cache?min_zoom=10&max_zoom=16",
+            "/api/admin/cache/layers/test_raster_3857_cog_greyscale",
+            "/api/admin/cache/layers/test_raster_3857_cog_greyscale?min_zoom=16",
+        ],
+    )
+    def test_purge(self, data_dir: Path, purge_url: str) -> None:
+        """Check a tile is read and rendered again after its layer or zoom level is purged."""
+        client.delete("/api/admin/cache", headers=ADMIN_HEADERS)
+        client.get(tile_url(data_dir))
+        assert client.get(tile_url(data_dir)).headers["X-Cache"] == "HIT"
+
+        response = client.delete(purge_url, headers=ADMIN_HEADERS)
+
+        assert response.status_code == 200
+        assert response.json()["worker"] == os.getpid()
+        read_tile = mock.patch.object(TilerFactory, "read_tile", autospec=True, side_effect=TilerFactory.read_tile)
+        with read_tile as mock_read:
+            assert client.get(tile_url(data_dir)).headers["X-Cache"] == "MISS"
+            mock_read.assert_called_once()
+
+    def test_purge_other_zooms(self, data_dir: Path) -> None:
+        """Check purging other zoom levels keeps the cached tile."""
+        client.get(tile_url(data_dir))
+
+        client.delete("/api/admin/cache/layers/test_raster_3857_cog_greyscale?max_zoom=15", headers=ADMIN_HEADERS)
+
+        with mock.patch.object(TilerFactory, "tile") as mock_tile:
+            assert client.get(tile_url(data_dir)).headers["X-Cache"] == "HIT"
+            mock_tile.assert_not_called()
+
+    def test_invalid_zoom_range(self) -> None:
+        response = client.delete("/api/admin/cache?min_zoom=10&max_zoom=5", headers=ADMIN_HEADERS)
+        assert response.status_code == 422
@@ -17,6 +17,7 @@ class TestAvailableData:
                 "geojson": None,
                 "map_centre": [54.008128, -2.774925],
                 "colourmap_name": "terrain",
+                "layout": None,
             },
             {
                 "id": 1,
@@ -26,6 +27,7 @@ class TestAvailableData:
                 "geojson": None,
                 "map_centre": [54.008128, -2.774925],
                 "colourmap_name": None,
+                "layout": None,
             },
             {
                 "id": 2,
@@ -35,6 +37,7 @@ class TestAvailableData:
                 "geojson": None,
                 "map_centre": [54.008128, -2.774925],
                 "colourmap_name": None,
+                "layout": None,
             },
         ]
 
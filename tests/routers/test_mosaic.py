@@ -0,0 +1,36 @@
+import shutil
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from geospatial_api.main import app
+from geospatial_api.mosaic import footprint_indexes
+
+client = TestClient(app)
+
+
+class TestMosaic:
+    def test_mosaic_from_file_url(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path, tmp_path: Path) -> None:
+        """Check a tile can be created from a directory of rasters."""
+        monkeypatch.setenv("AIOCACHE_DISABLE", 1)
+        # The granules of a mosaic layer share the same bands
+        for name in ("a.tif", "b.tif"):
+            shutil.copy(data_dir.joinpath("test_raster_3857_cog_rendered.tif"), tmp_path.joinpath(name))
+
+        response = client.get(
+            f"api/mosaic/tiles/WebMercatorQuad/16/32261/21043.png?layer=file:///{tmp_path}&pixel_selection=first"
+        )
+
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/png"
+        assert len(footprint_indexes[f"file:///{tmp_path}"]) == 2
+
+    def test_mosaic_tile_outside_granules(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path) -> None:
+        """Check a tile away from all granules is rejected."""
+        monkeypatch.setenv("AIOCACHE_DISABLE", 1)
+
+        response = client.get(f"api/mosaic/tiles/WebMercatorQuad/16/0/0.png?layer=file:///{data_dir}")
+
+        assert response.status_code == 500
+        assert response.json() == {"detail": "Requested tile is outside of the raster bounds."}
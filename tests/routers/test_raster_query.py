@@ -0,0 +1,125 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import rasterio
+from fastapi.testclient import TestClient
+from rasterio.transform import from_origin
+
+from geospatial_api.main import app
+from geospatial_api.memory import memory_budget
+
+client = TestClient(app)
+
+POLYGON = {"type": "Polygon", "coordinates": [[[1, 1], [3, 1], [3, 3], [1, 3], [1, 1]]]}
+
+
+@pytest.fixture
+def nan_raster(tmp_path: Path) -> Path:
+    """Write a float raster in WGS84 whose pixels are all NaN, without a nodata value."""
+    path = tmp_path.joinpath("nan.tif")
+    profile = {
+        "driver": "GTiff",
+        "width": 8,
+        "height": 8,
+        "count": 1,
+        "dtype": "float32",
+        "crs": "EPSG:4326",
+        "transform": from_origin(0, 8, 1, 1),
+    }
+    with rasterio.open(path, "w", **profile) as dataset:
+        dataset.write(np.full((1, 8, 8), np.nan, dtype=np.float32))
+    return path
+
+
+class TestPoints:
+    def test_points_from_file_url(self, data_dir: Path) -> None:
+        """Check values are returned for every point, and are null for points outside the raster."""
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+        coordinates = [[-2.7823, 53.9965], [-2.7824, 53.9966], [0.0, 0.0]]
+
+        response = client.post(f"api/maps/points?url=file:///{raster_path}", json={"coordinates": coordinates})
+
+        assert response.status_code == 200
+        result = response.json()
+        assert result["coordinates"] == coordinates
+        assert len(result["values"]) == 3
+        assert all(len(values) == len(result["band_names"]) for values in result["values"])
+        assert result["values"][2] == [None] * len(result["band_names"])
+
+    def test_invalid_coordinates(self, data_dir: Path) -> None:
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+
+        response = client.post(f"api/maps/points?url=file:///{raster_path}", json={"coordinates": [[0.0]]})
+
+        assert response.status_code == 422
+
+    def test_nan_values(self, nan_raster: Path) -> None:
+        """Check NaN pixel values are returned as nulls."""
+        response = client.post(f"api/maps/points?url=file:///{nan_raster}", json={"coordinates": [[2.5, 2.5]]})
+
+        assert response.status_code == 200
+        assert response.json()["values"] == [[None]]
+
+
+class TestAreaStatistics:
+    def test_statistics_from_vector_layer(self, data_dir: Path) -> None:
+        """Check statistics are returned for each feature of a vector layer."""
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+        vector_path = data_dir.joinpath("test_vector_4326.geojson")
+
+        response = client.post(f"api/maps/statistics?url=file:///{raster_path}&vector_url=file:///{vector_path}")
+
+        assert response.status_code == 200
+        features = response.json()["features"]
+        assert len(features) > 0
+        for feature in features:
+            assert feature["properties"]["id"] is not None
+            assert {"count", "valid_percent", "min", "max", "mean", "std", "sum", "median"} <= set(
+                feature["properties"]["statistics"]["b1"]
+            )
+
+    def test_statistics_outside_raster(self, data_dir: Path) -> None:
+        """Check an area outside the raster has no valid pixels."""
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+        polygon = {"type": "Polygon", "coordinates": [[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]]]}
+
+        response = client.post(f"api/maps/statistics?url=file:///{raster_path}", json=polygon)
+
+        assert response.status_code == 200
+        statistics = response.json()["features"][0]["properties"]["statistics"]["b1"]
+        assert statistics["count"] == 0
+        assert statistics["mean"] is None
+
+    def test_missing_area(self, data_dir: Path) -> None:
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+
+        response = client.post(f"api/maps/statistics?url=file:///{raster_path}")
+
+        assert response.status_code == 400
+
+    def test_invalid_max_size(self, data_dir: Path) -> None:
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+
+        response = client.post(f"api/maps/statistics?url=file:///{raster_path}&max_size=0", json=POLYGON)
+
+        assert response.status_code == 422
+
+    def test_over_memory_limit(self, monkeypatch: pytest.MonkeyPatch, nan_raster: Path) -> None:
+        """Check an area needing more than the per-request memory limit is rejected before it is read."""
+        monkeypatch.setattr(memory_budget, "request_limit", 16)
+
+        response = client.post(f"api/maps/statistics?url=file:///{nan_raster}", json=POLYGON)
+
+        assert response.status_code == 400
+        assert "smaller max_size" in response.json()["detail"]
+        assert memory_budget.reserved == 0
+
+    def test_nan_values(self, nan_raster: Path) -> None:
+        """Check the statistics of an area whose pixels are all NaN are returned as nulls."""
+        response = client.post(f"api/maps/statistics?url=file:///{nan_raster}", json=POLYGON)
+
+        assert response.status_code == 200
+        statistics = response.json()["features"][0]["properties"]["statistics"]["b1"]
+        assert statistics["count"] == 4
+        assert statistics["mean"] is None
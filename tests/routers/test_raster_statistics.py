@@ -0,0 +1,93 @@
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+import rasterio
+from fastapi.testclient import TestClient
+from rasterio.transform import from_origin
+
+from geospatial_api.main import app
+from geospatial_api.memory import memory_budget
+from geospatial_api.raster_statistics import compute_statistics, statistics_store
+
+client = TestClient(app)
+
+
+class TestInfo:
+    def test_info_from_file_url(self, data_dir: Path) -> None:
+        statistics_store.clear()
+        raster_path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+
+        response = client.get(f"api/maps/info?url=file:///{raster_path}")
+
+        assert response.status_code == 200
+        assert {"bounds", "crs", "dtype", "count", "width", "height"} <= set(response.json())
+
+
+class TestStatistics:
+    def test_statistics_computed_once(self, data_dir: Path) -> None:
+        """Check repeated requests for the statistics of a raster are served without computing them again."""
+        statistics_store.clear()
+        raster_path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+
+        with patch(
+            "geospatial_api.routers.raster_statistics.compute_statistics", side_effect=compute_statistics
+        ) as mock_compute:
+            first = client.get(f"api/maps/statistics?url=file:///{raster_path}")
+            second = client.get(f"api/maps/statistics?url=file:///{raster_path}")
+
+        assert first.status_code == 200
+        assert first.json() == second.json()
+        assert "b1" in first.json()
+        assert "X-Statistics-Overview" in first.headers
+        assert mock_compute.call_count == 1
+
+    def test_options_computed_separately(self, data_dir: Path) -> None:
+        """Check statistics with other percentiles are not served from those already computed."""
+        statistics_store.clear()
+        raster_path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+
+        client.get(f"api/maps/statistics?url=file:///{raster_path}")
+        response = client.get(f"api/maps/statistics?url=file:///{raster_path}&p=50")
+
+        assert response.status_code == 200
+        assert "percentile_50" in response.json()["b1"]
+
+    def test_exact_over_memory_limit(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path) -> None:
+        """Check full resolution statistics are rejected if reading the raster would need too much memory."""
+        statistics_store.clear()
+        monkeypatch.setattr(memory_budget, "request_limit", 1024)
+        raster_path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+
+        response = client.get(f"api/maps/statistics?url=file:///{raster_path}&exact=true")
+
+        assert response.status_code == 400
+        assert "without exact" in response.json()["detail"]
+        assert memory_budget.reserved == 0
+
+    def test_all_nodata(self, tmp_path: Path) -> None:
+        """Check the statistics of a band that is entirely nodata are served as nulls, including once stored."""
+        statistics_store.clear()
+        raster_path = tmp_path.joinpath("nodata.tif")
+        profile = {
+            "driver": "GTiff",
+            "width": 64,
+            "height": 64,
+            "count": 1,
+            "dtype": "float32",
+            "nodata": -9999.0,
+            "crs": "EPSG:3857",
+            "transform": from_origin(0, 640, 10, 10),
+        }
+        with rasterio.open(raster_path, "w", **profile) as dataset:
+            dataset.write(np.full((1, 64, 64), -9999.0, dtype=np.float32))
+
+        first = client.get(f"api/maps/statistics?url=file:///{raster_path}")
+        second = client.get(f"api/maps/statistics?url=file:///{raster_path}")
+
+        assert first.status_code == 200
+        assert second.status_code == 200
+        assert first.json()["b1"]["mean"] is None
+        assert first.json()["b1"]["masked_pixels"] == 64 * 64
+        assert second.json() == first.json()
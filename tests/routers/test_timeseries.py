@@ -0,0 +1,83 @@
+import io
+from pathlib import Path
+
+import numpy as np
+import pytest
+import rasterio
+from fastapi.testclient import TestClient
+from rasterio.transform import from_origin
+
+from geospatial_api.main import app
+from geospatial_api.memory import memory_budget
+
+client = TestClient(app)
+
+POINT = "-2.7823,53.9965"
+
+
+class TestTimeseries:
+    def test_point_from_layer(self, data_dir: Path) -> None:
+        """Check a point is read from every COG in a directory."""
+        response = client.get(f"api/timeseries?layer=file:///{data_dir}&point={POINT}&bidx=1")
+
+        assert response.status_code == 200
+        result = response.json()
+        assert result["timesteps"] == ["test_raster_3857_cog_greyscale", "test_raster_3857_cog_rendered"]
+        assert result["band_names"] == ["b1"]
+        assert np.shape(result["values"]) == (2, 1)
+
+    def test_bbox_npy(self, data_dir: Path) -> None:
+        """Check a bounding box is returned as a NumPy array of shape (timesteps, bands, height, width)."""
+        urls = "&".join(
+            f"url=file:///{data_dir.joinpath(name)}"
+            for name in ["test_raster_3857_cog_rendered.tif", "test_raster_3857_cog_greyscale.tif"]
+        )
+
+        response = client.get(f"api/timeseries?{urls}&bbox=-2.785,53.9949,-2.7795,53.998&bidx=1&max_size=16&format=npy")
+
+        assert response.status_code == 200
+        assert response.headers["x-band-names"] == "b1"
+        values = np.load(io.BytesIO(response.content))
+        assert values.dtype == np.float32
+        assert values.shape[:2] == (2, 1)
+        assert max(values.shape[2:]) <= 16
+
+    def test_bbox_over_memory_limit(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path) -> None:
+        """Check a bounding box needing more than the per-request memory limit is rejected before it is read."""
+        monkeypatch.setattr(memory_budget, "request_limit", 1024)
+
+        response = client.get(f"api/timeseries?layer=file:///{data_dir}&bbox=-2.785,53.9949,-2.7795,53.998&max_size=64")
+
+        assert response.status_code == 400
+        assert "fewer timesteps" in response.json()["detail"]
+        assert memory_budget.reserved == 0
+
+    def test_nan_values(self, tmp_path: Path) -> None:
+        """Check NaN values are returned as nulls in JSON."""
+        profile = {
+            "driver": "GTiff",
+            "width": 8,
+            "height": 8,
+            "count": 1,
+            "dtype": "float32",
+            "crs": "EPSG:4326",
+            "transform": from_origin(0, 8, 1, 1),
+        }
+        with rasterio.open(tmp_path.joinpath("nan.tif"), "w", **profile) as dataset:
+            dataset.write(np.full((1, 8, 8), np.nan, dtype=np.float32))
+
+        response = client.get(f"api/timeseries?url=file:///{tmp_path.joinpath('nan.tif')}&bbox=1,1,3,3")
+
+        assert response.status_code == 200
+        assert response.json()["values"] == [[[[None, None], [None, None]]]]
+
+    def test_point_or_bbox_required(self, data_dir: Path) -> None:
+        response = client.get(f"api/timeseries?layer=file:///{data_dir}")
+
+        assert response.status_code == 400
+
+    def test_invalid_point(self, data_dir: Path) -> None:
+        response = client.get(f"api/timeseries?layer=file:///{data_dir}&point=1")
+
+        assert response.status_code == 400
+        assert response.json() == {"detail": "point must be 2 comma separated numbers."}
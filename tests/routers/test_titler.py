@@ -2,12 +2,20 @@ import base64
 from pathlib import Path
 from unittest import mock
 
+import numpy as np
 import pytest
+from botocore.exceptions import EndpointConnectionError
 from fastapi.testclient import TestClient
+from rio_tiler.models import ImageData
 from starlette.responses import Response
+from titiler.core.resources.enums import ImageType
+from titiler.core.utils import render_image
 
-from geospatial_api.main import app
-from geospatial_api.routers.cached_titiler import TilerFactory
+from geospatial_api.context import get_s3_client
+from geospatial_api.main import api, app
+from geospatial_api.raw_cache import RawTile, raw_tiles
+from geospatial_api.routers.cached_titiler import TilerFactory, render_tile_image
+from geospatial_api.utils import object_versions
 
 client = TestClient(app)
 
@@ -58,6 +66,23 @@ class TestTitiler:
         assert response.status_code == 200
         check_image_response(response)
 
+    def test_raw_cache_disabled(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path) -> None:
+        """Check tile data is neither compressed nor looked up when the raw tile cache is disabled."""
+        monkeypatch.setenv("AIOCACHE_DISABLE", 1)
+        monkeypatch.setattr(raw_tiles, "max_bytes", 0)
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+
+        with (
+            mock.patch.object(RawTile, "from_image") as mock_from_image,
+            mock.patch("geospatial_api.raw_cache.record_raw_cache") as mock_record,
+        ):
+            response = client.get(f"api/maps/tiles/WebMercatorQuad/16/32261/21043.png?url=file:///{raster_path}")
+
+        assert response.status_code == 200
+        check_image_response(response)
+        mock_from_image.assert_not_called()
+        mock_record.assert_not_called()
+
 
 class TestCachedTitiler:
     def test_cached_raster(self) -> None:
@@ -81,3 +106,48 @@ class TestCachedTitiler:
             # from TilerFactor should not have been called
             mock_tile.assert_not_called()
             check_image_response(response_2)
+
+    def test_cached_raster_served_when_s3_unavailable(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path) -> None:
+        """Check a cached tile is still served once its version has expired if S3 cannot be reached to check it."""
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.return_value = {"ETag": '"v1"'}
+        mock_s3_client.generate_presigned_url.return_value = str(data_dir.joinpath("test_raster_3857_cog_rendered.tif"))
+        api.dependency_overrides[get_s3_client] = lambda: mock_s3_client
+        url = "api/maps/tiles/WebMercatorQuad/16/32261/21043.png?url=S3://bucket/raster/outage.tif"
+
+        try:
+            response_1 = client.get(url)
+            monkeypatch.setattr(object_versions, "ttl", -1)
+            mock_s3_client.head_object.side_effect = EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+            with mock.patch.object(TilerFactory, "tile") as mock_tile:
+                response_2 = client.get(url)
+        finally:
+            api.dependency_overrides.pop(get_s3_client)
+
+        assert response_1.status_code == 200
+        assert response_2.status_code == 200
+        assert response_2.headers["X-Cache"] in ("HIT", "STALE")
+        mock_tile.assert_not_called()
+        check_image_response(response_2)
+
+
+def make_float_image() -> ImageData:
+    data = np.linspace(0, 100, 64 * 64, dtype=np.float32).reshape(1, 64, 64)
+    array = np.ma.MaskedArray(data, mask=np.zeros(data.shape, dtype=bool))
+    array.mask[:, :8] = True
+    return ImageData(array, bounds=(0, 0, 1, 1))
+
+
+class TestRenderTileImage:
+    @pytest.mark.parametrize(
+        "options",
+        [
+            {"output_format": ImageType.png},
+            {"output_format": ImageType.jpeg, "rescale": [(0, 50)]},
+            {"output_format": ImageType.png, "rescale": [(0, 100)], "colormap": {1: (255, 0, 0, 255)}},
+            {"rescale": [(0, 100)], "add_mask": False},
+        ],
+    )
+    def test_matches_titiler(self, options: dict) -> None:
+        """Check tiles are rendered exactly as TiTiler renders them, despite not copying the data."""
+        assert render_tile_image(make_float_image(), **options) == render_image(make_float_image(), **options)
@@ -0,0 +1,66 @@
+import json
+from pathlib import Path
+from typing import Any, Iterator
+
+import pytest
+from fastapi.testclient import TestClient
+
+from geospatial_api.access_log import access_log, get_endpoint_type
+from geospatial_api.main import app
+from geospatial_api.settings import access_log_setting
+
+client = TestClient(app)
+
+
+@pytest.fixture
+def access_log_path(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> Iterator[Path]:
+    log_path = tmp_path.joinpath("access.jsonl")
+    monkeypatch.setattr(access_log_setting, "path", str(log_path))
+    access_log.start()
+    yield log_path
+    access_log.stop()
+
+
+def read_records(log_path: Path) -> list[dict[str, Any]]:
+    access_log.stop()
+    return [json.loads(line) for line in log_path.read_text().splitlines()]
+
+
+class TestGetEndpointType:
+    @pytest.mark.parametrize(
+        "path, expected",
+        [
+            ("/api/maps/tiles/WebMercatorQuad/16/32261/21043.png", "tile"),
+            ("/api/mosaic/tiles/WebMercatorQuad/16/32261/21043.png", "mosaic"),
+            ("/api/vector", "vector"),
+            ("/api/available_data", "catalogue"),
+            ("/api/healthcheck/", None),
+        ],
+    )
+    def test_get_endpoint_type(self, path: str, expected: str | None) -> None:
+        assert get_endpoint_type(path) == expected
+
+
+class TestAccessLog:
+    def test_tile_request_logged(self, monkeypatch: pytest.MonkeyPatch, data_dir: Path, access_log_path: Path) -> None:
+        """Check a tile request is logged with its tile, cache outcome and stage timings."""
+        monkeypatch.setenv("AIOCACHE_DISABLE", 1)
+        raster_path = data_dir.joinpath("test_raster_3857_cog_rendered.tif")
+
+        response = client.get(f"api/maps/tiles/WebMercatorQuad/16/32261/21043.png?url=file:///{raster_path}")
+
+        [record] = read_records(access_log_path)
+        assert record["endpoint"] == "tile"
+        assert record["source"] == f"file://{raster_path}"
+        assert record["layer"] == "test_raster_3857_cog_rendered"
+        assert (record["z"], record["x"], record["y"], record["format"]) == (16, 32261, 21043, "png")
+        assert record["status"] == 200
+        assert record["cache"] == "MISS"
+        assert record["bytes"] == len(response.content)
+        assert {"presign", "dataset_open", "read", "render"} <= set(record["stages"])
+
+    def test_other_requests_not_logged(self, access_log_path: Path) -> None:
+        """Check requests to endpoints other than the data endpoints are not logged."""
+        client.get("/api/healthcheck")
+
+        assert read_records(access_log_path) == []
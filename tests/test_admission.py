@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from geospatial_api.admission import RenderAdmission, get_client_id
+
+
+def run_concurrently(admission: RenderAdmission, layer: str, client: str) -> HTTPException | None:
+    """Try to render while another render of the "busy" layer for client "a" is in progress."""
+    release = threading.Event()
+
+    async def run() -> HTTPException | None:
+        busy = asyncio.create_task(admission.run(release.wait, "busy", "a"))
+        await asyncio.sleep(0.05)
+        try:
+            await admission.run(lambda: None, layer, client)
+        except HTTPException as error:
+            return error
+        finally:
+            release.set()
+            await busy
+
+    return asyncio.run(run())
+
+
+class TestRenderAdmission:
+    def test_queue_full(self) -> None:
+        """Check a render is rejected with a Retry-After header once the queue is full."""
+        admission = RenderAdmission(threads=1, max_queue=0, layer_limit=10, client_limit=10)
+
+        error = run_concurrently(admission, "other", "b")
+
+        assert error is not None
+        assert error.status_code == 503
+        assert int(error.headers["Retry-After"]) >= 1
+
+    def test_client_limit(self) -> None:
+        """Check a client is limited to its share of the queue, without limiting other clients."""
+        admission = RenderAdmission(threads=2, max_queue=10, layer_limit=10, client_limit=1)
+
+        error = run_concurrently(admission, "other", "a")
+
+        assert error is not None
+        assert error.status_code == 429
+        assert run_concurrently(admission, "other", "b") is None
+
+    def test_layer_limit(self) -> None:
+        admission = RenderAdmission(threads=2, max_queue=10, layer_limit=1, client_limit=10)
+
+        error = run_concurrently(admission, "busy", "b")
+
+        assert error is not None
+        assert error.status_code == 503
+
+    @pytest.mark.parametrize("threads", [1, 2])
+    def test_counts_released(self, threads: int) -> None:
+        """Check the queue is empty again once renders have finished."""
+        admission = RenderAdmission(threads=threads, max_queue=0, layer_limit=10, client_limit=10)
+
+        run_concurrently(admission, "other", "b")
+
+        assert admission.pending == 0
+        assert admission.has_capacity()
+
+
+class TestGetClientId:
+    def test_forwarded_for_ignored(self) -> None:
+        """Check a client cannot choose its identity by sending an `X-Forwarded-For` header."""
+        request = Request(
+            {"type": "http", "headers": [(b"x-forwarded-for", b"203.0.113.7")], "client": ("198.51.100.1", 1234)}
+        )
+
+        assert asyncio.run(get_client_id(request)) == "198.51.100.1"
@@ -0,0 +1,215 @@
+import asyncio
+from pathlib import Path
+from typing import Callable
+
+import aiocache
+import pytest
+from starlette.responses import Response
+
+from geospatial_api.cache import CachedTiles, CacheNamespaces, CacheStats, purge_disk_cache
+from geospatial_api.disk_cache import SQLiteCache
+from geospatial_api.settings import cache_setting
+
+
+class TestCacheNamespaces:
+    def test_purge_layer(self) -> None:
+        """Check purging a layer only changes the prefix of that layer."""
+        namespaces = CacheNamespaces()
+        layer_prefix = namespaces.prefix("layer", 10)
+        other_prefix = namespaces.prefix("other", 10)
+
+        namespaces.purge_layer("layer")
+
+        assert namespaces.prefix("layer", 10) != layer_prefix
+        assert namespaces.prefix("other", 10) == other_prefix
+
+    def test_purge_layer_zooms(self) -> None:
+        """Check purging a zoom range of a layer only changes the prefix of those zoom levels of that layer."""
+        namespaces = CacheNamespaces()
+        prefixes = {(layer, z): namespaces.prefix(layer, z) for layer in ["layer", "other"] for z in range(5)}
+
+        namespaces.purge_zooms(range(1, 3), "layer")
+
+        changed = {key for key, prefix in prefixes.items() if namespaces.prefix(*key) != prefix}
+        assert changed == {("layer", 1), ("layer", 2)}
+
+    def test_purge_zooms_all_layers(self) -> None:
+        """Check purging a zoom range without a layer changes the prefix of those zoom levels of every layer."""
+        namespaces = CacheNamespaces()
+        prefixes = {(layer, z): namespaces.prefix(layer, z) for layer in ["layer", "other"] for z in range(5)}
+
+        namespaces.purge_zooms(range(3, 5))
+
+        changed = {key for key, prefix in prefixes.items() if namespaces.prefix(*key) != prefix}
+        assert changed == {("layer", 3), ("layer", 4), ("other", 3), ("other", 4)}
+
+    def test_purge_all(self) -> None:
+        namespaces = CacheNamespaces()
+        prefix = namespaces.prefix("layer", None)
+
+        namespaces.purge_all()
+
+        assert namespaces.prefix("layer", None) != prefix
+
+    def test_shared_between_processes(self, tmp_path: Path) -> None:
+        """Check a purge received by one worker changes the prefixes used by another sharing the database."""
+        worker = CacheNamespaces(tmp_path.joinpath("namespaces.sqlite"))
+        other_worker = CacheNamespaces(tmp_path.joinpath("namespaces.sqlite"))
+        prefixes = {(layer, z): other_worker.prefix(layer, z) for layer in ["layer", "other"] for z in [None, 3]}
+
+        worker.purge_layer("layer")
+        worker.purge_zooms(range(3, 4), "other")
+
+        changed = {key for key, prefix in prefixes.items() if other_worker.prefix(*key) != prefix}
+        assert changed == {("layer", None), ("layer", 3), ("other", 3)}
+        assert CacheNamespaces(tmp_path.joinpath("namespaces.sqlite")).prefix("layer", 3) == worker.prefix("layer", 3)
+
+    @pytest.mark.parametrize(
+        "layer, zooms, expected",
+        [
+            ("layer", None, {("layer", 3), ("layer", 10), ("layer", None)}),
+            ("layer", range(0, 5), {("layer", 3)}),
+            ("*", range(5, 15), {("layer", 10), ("other", 10)}),
+        ],
+    )
+    def test_matches(self, layer: str, zooms: range | None, expected: set) -> None:
+        """Check keys are matched by layer and zoom level, with keys without a zoom level only matched by layer."""
+        namespaces = CacheNamespaces()
+        entries = [("layer", 3), ("layer", 10), ("layer", None), ("other", 10), ("other", None)]
+
+        matched = {
+            entry for entry in entries if CacheNamespaces.matches(namespaces.prefix(*entry) + "key", layer, zooms)
+        }
+
+        assert matched == expected
+
+
+class TestPurgeDiskCache:
+    def test_purged_entries_deleted(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        """Check purged entries are deleted from disk, so they are not served after a restart resets the counters."""
+        cache = SQLiteCache(tmp_path.joinpath("cache.sqlite"), max_bytes=10000, namespace="tiles:")
+        monkeypatch.setattr(cache_setting, "backend", "disk")
+        monkeypatch.setattr(aiocache.caches, "get", lambda alias: cache)
+        namespaces = CacheNamespaces()
+        keys = {entry: namespaces.prefix(*entry) + "key" for entry in [("layer", 3), ("layer", 10), ("other", 10)]}
+
+        async def run() -> tuple[int, dict]:
+            for key in keys.values():
+                await cache.set(key, "value")
+            deleted = await purge_disk_cache("layer", range(0, 5))
+            return deleted, {entry: await cache.get(key) for entry, key in keys.items()}
+
+        deleted, values = asyncio.run(run())
+
+        assert deleted == 1
+        assert values == {("layer", 3): None, ("layer", 10): "value", ("other", 10): "value"}
+
+    def test_memory_backend(self) -> None:
+        assert asyncio.run(purge_disk_cache("layer")) == 0
+
+
+class TestCacheStats:
+    def test_summary(self) -> None:
+        """Check the statistics are aggregated per layer and in total."""
+        stats = CacheStats()
+        stats.record_miss("layer", 1)
+        stats.record_write("layer", 1, 100)
+        stats.record_hit("layer", 1)
+        stats.record_hit("layer", 2)
+        stats.record_miss("other", 1)
+
+        summary = stats.summary()
+
+        assert summary["layers"]["layer"] == {"hits": 2, "misses": 1, "entries": 1, "bytes": 100, "hit_ratio": 2 / 3}
+        assert summary["layers"]["other"]["hit_ratio"] == 0
+        assert summary["total"]["hits"] == 2
+        assert summary["total"]["misses"] == 2
+
+    def test_purge(self) -> None:
+        """Check purging resets the entries of the purged zoom levels only."""
+        stats = CacheStats()
+        stats.record_write("layer", 1, 100)
+        stats.record_write("layer", 2, 50)
+        stats.record_write("other", 1, 10)
+
+        stats.purge("layer", range(2, 3))
+
+        summary = stats.summary()
+        assert summary["layers"]["layer"]["bytes"] == 100
+        assert summary["layers"]["other"]["bytes"] == 10
+
+
+class TestCachedTiles:
+    @staticmethod
+    def tile(src_path: str, source_version: str, z: int) -> None:
+        pass
+
+    def test_key_ignores_presigned_url(self) -> None:
+        """Check the cache key is the same for different presigned urls of the same object."""
+        cached = CachedTiles()
+        first = {"src_path": "https://bucket.s3.amazonaws.com/layer.tif?X-Amz-Date=1", "source_version": "a", "z": 1}
+        second = {**first, "src_path": "https://bucket.s3.amazonaws.com/layer.tif?X-Amz-Date=2"}
+
+        assert cached.get_cache_key(self.tile, (), first) == cached.get_cache_key(self.tile, (), second)
+
+    def test_key_includes_source_version(self) -> None:
+        """Check the cache key changes when the source object is overwritten."""
+        cached = CachedTiles()
+        kwargs = {"src_path": "S3://bucket/layer.tif", "source_version": "a", "z": 1}
+
+        key = cached.get_cache_key(self.tile, (), kwargs)
+
+        assert cached.get_cache_key(self.tile, (), {**kwargs, "source_version": "b"}) != key
+
+
+class TestStaleWhileRevalidate:
+    @staticmethod
+    def cached_tile(responses: list[Response | Exception]) -> tuple[CachedTiles, Callable]:
+        """Create a cached router function returning the given responses, or raising the given errors, in turn."""
+
+        def tile(src_path: str, z: int) -> Response:
+            response = responses.pop(0)
+            if isinstance(response, Exception):
+                raise response
+            return response
+
+        cached = CachedTiles()
+        return cached, cached(tile)
+
+    def test_stale_entry_refreshed(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check an expired entry is served immediately, and replaced by a background refresh."""
+        cached, tile = self.cached_tile([Response(b"first"), Response(b"second")])
+
+        async def run() -> list[Response]:
+            results = [await tile(src_path="S3://bucket/stale.tif", z=1)]
+            monkeypatch.setattr(cache_setting, "soft_ttl", -1)
+            results.append(await tile(src_path="S3://bucket/stale.tif", z=1))
+            await asyncio.gather(*cached._refresh_tasks)
+            monkeypatch.setattr(cache_setting, "soft_ttl", 600)
+            results.append(await tile(src_path="S3://bucket/stale.tif", z=1))
+            return results
+
+        miss, stale, hit = asyncio.run(run())
+
+        assert (miss.body, miss.headers["X-Cache"]) == (b"first", "MISS")
+        assert (stale.body, stale.headers["X-Cache"]) == (b"first", "STALE")
+        assert stale.headers["Warning"] == '110 - "Response is Stale"'
+        assert (hit.body, hit.headers["X-Cache"]) == (b"second", "HIT")
+
+    def test_stale_entry_served_on_error(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check an expired entry keeps being served with a warning when refreshing it fails."""
+        cached, tile = self.cached_tile([Response(b"first"), OSError("S3 unavailable"), OSError("S3 unavailable")])
+
+        async def run() -> Response:
+            await tile(src_path="S3://bucket/error.tif", z=1)
+            monkeypatch.setattr(cache_setting, "soft_ttl", -1)
+            await tile(src_path="S3://bucket/error.tif", z=1)
+            await asyncio.gather(*cached._refresh_tasks)
+            response = await tile(src_path="S3://bucket/error.tif", z=1)
+            await asyncio.gather(*cached._refresh_tasks)
+            return response
+
+        response = asyncio.run(run())
+
+        assert (response.body, response.headers["X-Cache"]) == (b"first", "STALE")
+        assert response.headers["Warning"] == '111 - "Revalidation Failed"'
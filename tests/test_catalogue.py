@@ -0,0 +1,39 @@
+import io
+import json
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from geospatial_api.catalogue import LAYOUTS_KEY, get_entry, read_catalogue, update_catalogue
+
+
+def make_s3_client(catalogue: dict | None) -> MagicMock:
+    s3_client = MagicMock()
+    if catalogue is None:
+        s3_client.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+    else:
+        s3_client.get_object.return_value = {"Body": io.BytesIO(json.dumps(catalogue).encode())}
+    return s3_client
+
+
+class TestCatalogue:
+    def test_missing_catalogue(self) -> None:
+        assert read_catalogue(make_s3_client(None), "bucket") == {}
+
+    def test_update_keeps_other_entries(self) -> None:
+        s3_client = make_s3_client({"a.tif": {"etag": "1"}})
+
+        catalogue = update_catalogue(s3_client, "bucket", {"b.tif": {"etag": "2"}})
+
+        assert catalogue == {"a.tif": {"etag": "1"}, "b.tif": {"etag": "2"}}
+        kwargs = s3_client.put_object.call_args.kwargs
+        assert kwargs["Key"] == LAYOUTS_KEY
+        assert json.loads(kwargs["Body"]) == catalogue
+
+    def test_entry_of_overwritten_object_ignored(self) -> None:
+        """Check an entry recorded for a previous version of an object is not returned."""
+        catalogue = {"a.tif": {"etag": "1"}}
+
+        assert get_entry(catalogue, "a.tif", '"1"') == {"etag": "1"}
+        assert get_entry(catalogue, "a.tif", '"2"') is None
+        assert get_entry(catalogue, "b.tif", '"1"') is None
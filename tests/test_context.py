@@ -0,0 +1,35 @@
+from unittest import mock
+
+from geospatial_api.context import AppContext, app_context, get_config, get_s3_client
+
+
+class TestAppContext:
+    def test_shared_s3_client(self) -> None:
+        """Check the same S3 client is returned on every call."""
+        s3_client = get_s3_client()
+
+        assert str(type(s3_client)) == "<class 'botocore.client.S3'>"
+        assert get_s3_client() is s3_client
+
+    def test_shared_config(self) -> None:
+        """Check the config is only loaded once."""
+        assert get_config() is app_context.config
+
+    def test_created_lazily(self) -> None:
+        """Check nothing is created until first used."""
+        with mock.patch("geospatial_api.context.setup_config") as mock_setup_config:
+            context = AppContext()
+            mock_setup_config.assert_not_called()
+
+            assert context.config is mock_setup_config.return_value
+            assert context.config is mock_setup_config.return_value
+            mock_setup_config.assert_called_once()
+
+    def test_reset(self) -> None:
+        """Check resources are created again after a reset."""
+        with mock.patch("geospatial_api.context.create_s3_client", side_effect=[mock.Mock(), mock.Mock()]):
+            context = AppContext()
+            first_client = context.s3_client
+            context.reset()
+
+            assert context.s3_client is not first_client
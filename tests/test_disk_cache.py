@@ -0,0 +1,123 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+import pytest
+
+from geospatial_api import disk_cache
+from geospatial_api.disk_cache import SQLiteBackend, SQLiteCache, TieredCache
+
+
+class TestSQLiteBackend:
+    def test_persists_across_restarts(self, tmp_path: Path) -> None:
+        """Check entries can be read by a new backend using the same database file."""
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        backend.set("key", b"value", ttl=None)
+        backend.close()
+
+        assert SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000).get("key") == b"value"
+
+    def test_expired_entry(self, tmp_path: Path) -> None:
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        backend.set("key", b"value", ttl=-1)
+
+        assert backend.get("key") is None
+
+    def test_least_recently_used_evicted(self, tmp_path: Path) -> None:
+        """Check the least recently read entries are evicted once the byte budget is exceeded."""
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=250)
+        for key in ["a", "b"]:
+            backend.set(key, b"x" * 100, ttl=None)
+        backend.get("a")
+
+        backend.set("c", b"x" * 100, ttl=None)
+
+        assert backend.get("a") is not None
+        assert backend.get("b") is None
+        assert backend.get("c") is not None
+        assert backend.size() <= 250
+
+    def test_access_times_batched(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check reads only write their access times once a batch of them is pending."""
+        monkeypatch.setattr(disk_cache, "ACCESS_BATCH_SIZE", 2)
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        for key in ["a", "b"]:
+            backend.set(key, b"value", ttl=None)
+
+        def accessed() -> dict[str, int]:
+            with sqlite3.connect(tmp_path.joinpath("cache.sqlite")) as connection:
+                return dict(connection.execute("SELECT key, accessed FROM entries"))
+
+        written = accessed()
+        backend.get("a")
+        assert accessed() == written
+
+        backend.get("b")
+        assert accessed()["a"] > written["a"]
+        assert accessed()["b"] > written["b"]
+
+    def test_replaced_entry_size(self, tmp_path: Path) -> None:
+        """Check replacing an entry does not count the size of the replaced value towards the budget."""
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        for _ in range(3):
+            backend.set("key", b"x" * 100, ttl=None)
+
+        assert backend._size == backend.size() == 100
+
+    def test_clear_prefix(self, tmp_path: Path) -> None:
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        backend.set("0:layer:1", b"value", ttl=None)
+        backend.set("0:other:1", b"value", ttl=None)
+
+        backend.clear("0:layer:")
+
+        assert backend.get("0:layer:1") is None
+        assert backend.get("0:other:1") == b"value"
+
+    def test_delete_where(self, tmp_path: Path) -> None:
+        backend = SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+        for key in ["a1", "a2", "b1"]:
+            backend.set(key, b"value", ttl=None)
+
+        deleted = backend.delete_where(lambda key: key.startswith("a"))
+
+        assert deleted == 2
+        assert backend.get("a1") is None
+        assert backend.get("b1") == b"value"
+        assert backend.size() == len(b"value")
+
+
+class TestSQLiteCache:
+    def test_set_get(self, tmp_path: Path) -> None:
+        cache = SQLiteCache(tmp_path.joinpath("cache.sqlite"), max_bytes=1000)
+
+        async def run() -> str:
+            await cache.set("key", "value", ttl=60)
+            return await cache.get("key")
+
+        assert asyncio.run(run()) == "value"
+
+
+class TestTieredCache:
+    def test_disk_entry_promoted(self, tmp_path: Path) -> None:
+        """Check an entry only held on disk, e.g. after a restart, is read and copied into the memory tier."""
+        SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000).set("key", "value", ttl=None)
+        cache = TieredCache(tmp_path.joinpath("cache.sqlite"), max_bytes=1000, memory_ttl=60)
+
+        async def run() -> tuple[str, str]:
+            value = await cache.get("key")
+            return value, await cache.memory._get("key")
+
+        assert asyncio.run(run()) == ("value", "value")
+
+    def test_promoted_entry_expires_with_disk_entry(self, tmp_path: Path) -> None:
+        """Check an entry promoted from disk is not kept in memory beyond its expiry on disk."""
+        SQLiteBackend(tmp_path.joinpath("cache.sqlite"), max_bytes=1000).set("key", "value", ttl=0.2)
+        cache = TieredCache(tmp_path.joinpath("cache.sqlite"), max_bytes=1000, memory_ttl=60)
+
+        async def run() -> tuple[str, str | None]:
+            value = await cache.get("key")
+            await asyncio.sleep(0.3)
+            return value, await cache.memory._get("key")
+
+        assert asyncio.run(run()) == ("value", None)
@@ -0,0 +1,122 @@
+from pathlib import Path
+from typing import Any
+from unittest.mock import MagicMock
+
+import numpy as np
+import pytest
+import rasterio
+from boto3.exceptions import S3UploadFailedError
+from rasterio.transform import from_origin
+
+from geospatial_api import ingest as ingest_module
+from geospatial_api.ingest import (
+    IngestResult,
+    format_report,
+    ingest,
+    inspect_layout,
+    needs_optimization,
+    optimize_raster,
+)
+
+
+def write_striped_raster(path: Path, size: int = 1024) -> Path:
+    """Write an uncompressed, untiled GeoTIFF without overviews."""
+    data = (np.arange(size * size) % 7).reshape(1, size, size).astype(np.uint8)
+    profile = {
+        "driver": "GTiff",
+        "width": size,
+        "height": size,
+        "count": 1,
+        "dtype": "uint8",
+        "crs": "EPSG:3857",
+        "transform": from_origin(0, size * 10, 10, 10),
+        "tiled": False,
+    }
+    with rasterio.open(path, "w", **profile) as dataset:
+        dataset.write(data)
+    return path
+
+
+class TestInspectLayout:
+    def test_valid_cog(self, data_dir: Path) -> None:
+        path = data_dir.joinpath("test_raster_3857_cog_greyscale.tif")
+
+        layout = inspect_layout(path, path.stat().st_size)
+
+        assert layout.valid_cog
+        assert layout.tiled
+        assert layout.overviews == []
+        # Too small for missing overviews to be worth a rewrite, unless the threshold is lowered
+        assert not needs_optimization(layout)
+        assert needs_optimization(layout, min_overview_size=512)
+
+    def test_striped_raster(self, tmp_path: Path) -> None:
+        path = write_striped_raster(tmp_path.joinpath("striped.tif"))
+
+        layout = inspect_layout(path, path.stat().st_size)
+
+        assert not layout.tiled
+        assert layout.overviews == []
+        assert layout.compression is None
+        assert needs_optimization(layout)
+
+
+class TestOptimizeRaster:
+    def test_rewrites_as_cog(self, tmp_path: Path) -> None:
+        """Check a striped raster is rewritten as a tiled COG with overviews and the same values."""
+        src_path = write_striped_raster(tmp_path.joinpath("striped.tif"))
+        dst_path = tmp_path.joinpath("cog.tif")
+
+        optimize_raster(src_path, dst_path, blocksize=256)
+        before = inspect_layout(src_path, src_path.stat().st_size)
+        after = inspect_layout(dst_path, dst_path.stat().st_size)
+
+        assert after.valid_cog
+        assert after.tiled
+        assert after.block_shape == (256, 256)
+        assert after.overviews
+        assert after.compression == "deflate"
+        assert not needs_optimization(after)
+        assert after.tile_bytes["full_extent"] < before.tile_bytes["full_extent"]
+        with rasterio.open(src_path) as src, rasterio.open(dst_path) as dst:
+            np.testing.assert_array_equal(src.read(), dst.read())
+
+    def test_report(self, tmp_path: Path) -> None:
+        src_path = write_striped_raster(tmp_path.joinpath("striped.tif"))
+        dst_path = tmp_path.joinpath("cog.tif")
+        optimize_raster(src_path, dst_path)
+        result = IngestResult(
+            key="raster/striped.tif",
+            etag="etag",
+            before=inspect_layout(src_path, src_path.stat().st_size),
+            after=inspect_layout(dst_path, dst_path.stat().st_size),
+        )
+
+        entry = result.catalogue_entry()
+
+        assert entry["optimized"]
+        assert entry["etag"] == "etag"
+        assert entry["tile_bytes_before"] == result.before.tile_bytes
+        assert "raster/striped.tif" in format_report([result])
+
+
+class TestIngest:
+    def test_failed_upload_skipped(self, tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check a raster failing to upload is skipped, and the other rasters are still recorded in the catalogue."""
+        src_path = write_striped_raster(tmp_path.joinpath("striped.tif"))
+        layout = inspect_layout(src_path, src_path.stat().st_size)
+
+        def ingest_raster(s3_client: Any, bucket: str, key: str, *args: Any, **kwargs: Any) -> IngestResult:
+            if key == "raster/failed.tif":
+                raise S3UploadFailedError("Failed to upload raster/failed.tif")
+            return IngestResult(key=key, etag="etag", before=layout)
+
+        update_catalogue = MagicMock()
+        monkeypatch.setattr(ingest_module, "list_rasters", lambda *args: ["raster/failed.tif", "raster/striped.tif"])
+        monkeypatch.setattr(ingest_module, "ingest_raster", ingest_raster)
+        monkeypatch.setattr(ingest_module, "update_catalogue", update_catalogue)
+
+        results = ingest(MagicMock(), "bucket")
+
+        assert [result.key for result in results] == ["raster/striped.tif"]
+        assert list(update_catalogue.call_args.args[2]) == ["raster/striped.tif"]
@@ -0,0 +1,121 @@
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from geospatial_api.memory import (
+    DEFAULT_BANDS,
+    DEFAULT_ITEMSIZE,
+    MemoryBudget,
+    configure_gdal_cache,
+    estimate_tile_memory,
+    get_band_profile,
+)
+from geospatial_api.settings import memory_setting
+
+
+class TestConfigureGDALCache:
+    def test_sized_from_settings(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.delenv("GDAL_CACHEMAX", raising=False)
+
+        configure_gdal_cache(memory_setting.gdal_cache_mb)
+
+        assert os.environ["GDAL_CACHEMAX"] == str(memory_setting.gdal_cache_mb)
+
+    def test_existing_setting_kept(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        """Check a GDAL_CACHEMAX set by the operator is only replaced if the cache size is configured explicitly."""
+        monkeypatch.setenv("GDAL_CACHEMAX", "512")
+
+        configure_gdal_cache(64)
+        assert os.environ["GDAL_CACHEMAX"] == "512"
+
+        configure_gdal_cache(64, override=True)
+        assert os.environ["GDAL_CACHEMAX"] == "64"
+
+
+class TestEstimateTileMemory:
+    def test_grows_with_tile_size_and_bands(self) -> None:
+        """Check the estimate grows with the number of pixels, and linearly with the number of bands."""
+        one, two, ten = (estimate_tile_memory(256, bands=bands, itemsize=4) for bands in (1, 2, 10))
+
+        assert estimate_tile_memory(1024, bands=1, itemsize=4) == 16 * one
+        assert two > one
+        assert ten - one == 9 * (two - one)
+
+    def test_buffer_and_post_process(self) -> None:
+        plain = estimate_tile_memory(256, bands=3, itemsize=2)
+
+        assert estimate_tile_memory(256, bands=3, itemsize=2, buffer=64) > plain
+        assert estimate_tile_memory(256, bands=3, itemsize=2, padding=2) > plain
+        assert estimate_tile_memory(256, bands=3, itemsize=2, post_process=True) > plain
+
+
+class TestGetBandProfile:
+    def test_from_dataset(self) -> None:
+        reader = SimpleNamespace(dataset=SimpleNamespace(count=5, dtypes=["uint8", "float32"]))
+
+        assert get_band_profile(reader) == (5, 4)
+        assert get_band_profile(reader, [1, 2]) == (2, 4)
+
+    def test_reader_without_dataset(self) -> None:
+        assert get_band_profile(SimpleNamespace()) == (DEFAULT_BANDS, DEFAULT_ITEMSIZE)
+
+
+class TestMemoryBudget:
+    def test_request_over_limit_rejected(self) -> None:
+        budget = MemoryBudget(request_limit=100, total_limit=1000, timeout=0)
+
+        with pytest.raises(HTTPException) as error:
+            with budget.reservation("layer") as reservation:
+                reservation.grow(101)
+
+        assert error.value.status_code == 400
+        assert budget.reserved == 0
+
+    def test_released_on_exit(self) -> None:
+        budget = MemoryBudget(request_limit=100, total_limit=1000, timeout=0)
+
+        with budget.reservation("layer") as reservation:
+            reservation.grow(60)
+            reservation.grow(40)
+            assert budget.reserved == 100
+
+        assert budget.reserved == 0
+
+    def test_shed_when_budget_exhausted(self) -> None:
+        """Check a render is shed with a Retry-After header if memory is not released in time."""
+        budget = MemoryBudget(request_limit=100, total_limit=150, timeout=0.05)
+
+        with budget.reservation("layer") as reservation:
+            reservation.grow(100)
+            with pytest.raises(HTTPException) as error:
+                with budget.reservation("layer") as other:
+                    other.grow(100)
+
+        assert error.value.status_code == 503
+        assert "Retry-After" in error.value.headers
+        assert budget.reserved == 0
+
+    def test_waits_for_memory(self) -> None:
+        """Check a render waits for memory released by another render rather than being shed."""
+        budget = MemoryBudget(request_limit=100, total_limit=150, timeout=5)
+        reserved = threading.Event()
+
+        def render() -> None:
+            with budget.reservation("layer") as reservation:
+                reservation.grow(100)
+                reserved.set()
+                time.sleep(0.1)
+
+        thread = threading.Thread(target=render)
+        thread.start()
+        reserved.wait()
+        with budget.reservation("layer") as reservation:
+            reservation.grow(100)
+            assert budget.reserved == 100
+        thread.join()
+
+        assert budget.reserved == 0
@@ -0,0 +1,132 @@
+import logging
+import os
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from geospatial_api.main import app, metrics
+from geospatial_api.metrics import (
+    MULTIPROC_DIR_ENV,
+    OTHER_LAYER,
+    GDALHTTPStatsHandler,
+    KnownLayers,
+    get_registry,
+    get_stage_labels,
+    remove_dead_worker_files,
+    stage_labels,
+    track_stage,
+)
+
+client = TestClient(app)
+
+
+class TestGetStageLabels:
+    @pytest.fixture(autouse=True)
+    def known_layer(self, monkeypatch: pytest.MonkeyPatch) -> None:
+        monkeypatch.setattr("geospatial_api.metrics.known_layers", KnownLayers(["test_raster"]))
+
+    def test_presigned_url(self) -> None:
+        """Check the layer name is extracted from a presigned url, ignoring the query string."""
+        labels = get_stage_labels(
+            "http://localhost:4566/bucket/raster/test_raster.tif?X-Amz-Signature=abc", z=16, fmt="png"
+        )
+
+        assert labels == {"layer": "test_raster", "zoom": "16", "format": "png"}
+
+    def test_default_format(self) -> None:
+        """Check requests without an explicit format are labelled as automatic."""
+        labels = get_stage_labels("S3://bucket/raster/test_raster.tif", z=3)
+
+        assert labels == {"layer": "test_raster", "zoom": "3", "format": "auto"}
+
+    def test_unknown_layer(self) -> None:
+        """Check layers that are not known share a label, so arbitrary urls cannot create new series."""
+        labels = get_stage_labels("S3://bucket/raster/anything.tif", z=3)
+
+        assert labels["layer"] == OTHER_LAYER
+
+
+class TestKnownLayers:
+    def test_added_layer(self) -> None:
+        """Check a layer is labelled with its name once it has been listed in the catalogue."""
+        layers = KnownLayers(["configured"])
+
+        assert layers.label("configured") == "configured"
+        assert layers.label("listed") == OTHER_LAYER
+        layers.add(["listed"])
+        assert layers.label("listed") == "listed"
+
+
+class TestTrackStage:
+    def test_track_stage(self) -> None:
+        """Check the stage duration is observed with the expected labels."""
+        labels = get_stage_labels("S3://bucket/raster/track_stage.tif", z=1, fmt="png")
+        sample_labels = {"stage": "read", **labels}
+        before = REGISTRY.get_sample_value("geospatial_api_stage_duration_seconds_count", sample_labels) or 0
+
+        with track_stage("read", labels):
+            pass
+
+        after = REGISTRY.get_sample_value("geospatial_api_stage_duration_seconds_count", sample_labels)
+        assert after == before + 1
+
+    def test_track_stage_without_labels(self) -> None:
+        """Check nothing is recorded when no labels are given."""
+        with track_stage("read", None):
+            pass
+
+
+class TestGDALHTTPStatsHandler:
+    def test_range_request_counted(self) -> None:
+        """Check a vsicurl download message is counted against the current request's labels."""
+        labels = get_stage_labels("S3://bucket/raster/gdal_stats.tif", z=5, fmt="png")
+        token = stage_labels.set(labels)
+        logger = logging.getLogger("test_gdal_http_stats")
+        logger.addHandler(GDALHTTPStatsHandler())
+        logger.setLevel(logging.DEBUG)
+
+        try:
+            logger.debug("CPLE_None in VSICURL: Downloading 0-16383 (http://localhost:4566/bucket/x.tif)...")
+            logger.debug("CPLE_None in GDAL: GDALOpen(x.tif) succeeds")
+        finally:
+            stage_labels.reset(token)
+
+        assert REGISTRY.get_sample_value("geospatial_api_gdal_http_requests_total", labels) == 1
+        assert REGISTRY.get_sample_value("geospatial_api_gdal_http_bytes_total", labels) == 16384
+
+
+class TestMetricsExport:
+    def test_metrics_route(self) -> None:
+        """Check the metrics route exposes the custom metrics in the prometheus text format."""
+        response = client.get("/api/metrics")
+
+        assert response.status_code == 200
+        assert "geospatial_api_stage_duration_seconds" in response.text
+
+    def test_start_exporter_port_in_use(self) -> None:
+        """Check starting the exporter when another worker has already bound the port does not raise an error."""
+        with mock.patch("prometheus_client.start_http_server", side_effect=OSError("Address already in use")):
+            metrics.start_exporter()
+
+    def test_multiprocess_registry(self, monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> None:
+        """Check a separate registry aggregating all workers is used in multiprocess mode."""
+        monkeypatch.setenv(MULTIPROC_DIR_ENV, str(tmp_path))
+
+        assert get_registry() is not REGISTRY
+
+    def test_remove_dead_worker_files(self, tmp_path: Path) -> None:
+        """Check only the live gauge files of dead workers are removed."""
+        dead_pid = 2**22 + 1
+        live_pid = os.getpid()
+        for name in [f"gauge_livesum_{dead_pid}.db", f"counter_{dead_pid}.db", f"gauge_livesum_{live_pid}.db"]:
+            tmp_path.joinpath(name).touch()
+
+        remove_dead_worker_files(tmp_path)
+
+        assert sorted(file.name for file in tmp_path.iterdir()) == [
+            f"counter_{dead_pid}.db",
+            f"gauge_livesum_{live_pid}.db",
+        ]
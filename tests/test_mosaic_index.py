@@ -0,0 +1,155 @@
+import os
+import shutil
+from pathlib import Path
+from unittest import mock
+
+import pytest
+from fastapi import HTTPException
+
+from geospatial_api.mosaic import FootprintIndex, FootprintIndexRegistry, Granule, list_granules, read_footprint
+from geospatial_api.settings import mosaic_setting
+from geospatial_api.utils import object_versions
+
+
+def make_grid_index(n: int) -> FootprintIndex:
+    """Create an index of n x n adjacent one degree granules."""
+    granules = [
+        Granule(url=f"S3://bucket/raster/layer/{col}_{row}.tif", bounds=(col, row, col + 1, row + 1))
+        for col in range(n)
+        for row in range(n)
+    ]
+    return FootprintIndex(granules, path_resolver=lambda url: url)
+
+
+class TestFootprintIndex:
+    def test_search_single_granule(self) -> None:
+        """Check a bounding box within one granule only returns that granule."""
+        index = make_grid_index(10)
+
+        granules = index.search((3.2, 4.2, 3.8, 4.8))
+
+        assert [granule.url for granule in granules] == ["S3://bucket/raster/layer/3_4.tif"]
+
+    def test_search_across_granules(self) -> None:
+        """Check a bounding box straddling granule edges returns every granule it touches, in index order."""
+        index = make_grid_index(10)
+
+        granules = index.search((3.5, 4.5, 4.5, 5.5))
+
+        assert [granule.url for granule in granules] == [
+            "S3://bucket/raster/layer/3_4.tif",
+            "S3://bucket/raster/layer/3_5.tif",
+            "S3://bucket/raster/layer/4_4.tif",
+            "S3://bucket/raster/layer/4_5.tif",
+        ]
+
+    def test_search_large_bounds(self) -> None:
+        """Check a bounding box covering the whole layer returns all granules."""
+        index = make_grid_index(5)
+
+        granules = index.search((-180, -90, 180, 90))
+
+        assert len(granules) == len(index) == 25
+
+    def test_search_outside(self) -> None:
+        """Check a bounding box away from all granules returns nothing."""
+        index = make_grid_index(5)
+
+        assert index.search((50, 50, 51, 51)) == []
+
+    def test_empty_index(self) -> None:
+        index = FootprintIndex([], path_resolver=lambda url: url)
+
+        assert index.search((0, 0, 1, 1)) == []
+
+
+class TestListGranules:
+    def test_local_directory(self, data_dir: Path) -> None:
+        """Check only the rasters within a local directory are listed."""
+        granules = list_granules(f"file:///{data_dir}", s3_client=mock.MagicMock())
+
+        assert granules == [
+            data_dir.joinpath("test_raster_3857_cog_greyscale.tif").as_uri(),
+            data_dir.joinpath("test_raster_3857_cog_rendered.tif").as_uri(),
+        ]
+
+    def test_s3_prefix(self) -> None:
+        """Check the rasters under an S3 prefix are listed across all pages, recording their versions."""
+        object_versions.clear()
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.get_paginator.return_value.paginate.return_value = [
+            {
+                "Contents": [
+                    {"Key": "raster/layer/b.tif", "ETag": '"etag-b"'},
+                    {"Key": "raster/layer/readme.txt", "ETag": '"etag-readme"'},
+                ]
+            },
+            {"Contents": [{"Key": "raster/layer/a.tif", "ETag": '"etag-a"'}]},
+        ]
+
+        granules = list_granules("S3://bucket/raster/layer/", s3_client=mock_s3_client)
+
+        mock_s3_client.get_paginator.return_value.paginate.assert_called_once_with(
+            Bucket="bucket", Prefix="raster/layer/"
+        )
+        assert granules == ["S3://bucket/raster/layer/a.tif", "S3://bucket/raster/layer/b.tif"]
+        assert object_versions.get("S3://bucket/raster/layer/a.tif", mock_s3_client) == "etag-a"
+        assert object_versions.get("S3://bucket/raster/layer/b.tif", mock_s3_client) == "etag-b"
+        mock_s3_client.head_object.assert_not_called()
+
+
+@pytest.fixture
+def layer_dir(data_dir: Path, tmp_path: Path) -> Path:
+    """Create a mosaic layer of two granules."""
+    for name in ("a.tif", "b.tif"):
+        shutil.copy(data_dir.joinpath("test_raster_3857_cog_rendered.tif"), tmp_path.joinpath(name))
+    return tmp_path
+
+
+class TestFootprintIndexRegistry:
+    def test_unchanged_granules_reused(self, layer_dir: Path) -> None:
+        """Check an expired index is rebuilt only reading the granules that have changed, and changes version."""
+        registry = FootprintIndexRegistry(ttl=-1, max_size=4)
+        layer_url = f"file:///{layer_dir}"
+
+        with mock.patch("geospatial_api.mosaic.read_footprint", side_effect=read_footprint) as mock_read:
+            first = registry.get(layer_url, mock.MagicMock())
+            second = registry.get(layer_url, mock.MagicMock())
+            assert mock_read.call_count == 2
+
+            os.utime(layer_dir.joinpath("b.tif"), ns=(0, 0))
+            third = registry.get(layer_url, mock.MagicMock())
+
+        assert mock_read.call_count == 3
+        assert len(third) == 2
+        assert first.version == second.version != third.version
+
+    def test_least_recently_used_evicted(self, layer_dir: Path, data_dir: Path) -> None:
+        registry = FootprintIndexRegistry(ttl=60, max_size=1)
+
+        registry.get(f"file:///{layer_dir}", mock.MagicMock())
+        registry.get(f"file:///{data_dir}", mock.MagicMock())
+
+        assert len(registry) == 1
+        assert len(registry[f"file:///{data_dir}"]) == 2
+
+    def test_unconfigured_layer(self, monkeypatch: pytest.MonkeyPatch, layer_dir: Path) -> None:
+        """Check only the configured layers can be requested, if any are configured."""
+        monkeypatch.setattr(mosaic_setting, "layers", [f"file:///{layer_dir}/"])
+        registry = FootprintIndexRegistry(ttl=60, max_size=4)
+
+        assert len(registry.get(f"file:///{layer_dir}", mock.MagicMock())) == 2
+        with pytest.raises(HTTPException) as error:
+            registry.get(f"file:///{layer_dir.parent}", mock.MagicMock())
+        assert error.value.status_code == 404
+
+    def test_too_many_granules(self, monkeypatch: pytest.MonkeyPatch, layer_dir: Path) -> None:
+        """Check a layer with more granules than the limit is rejected without opening them."""
+        monkeypatch.setattr(mosaic_setting, "max_granules", 1)
+        registry = FootprintIndexRegistry(ttl=60, max_size=4)
+
+        with mock.patch("geospatial_api.mosaic.read_footprint") as mock_read, pytest.raises(HTTPException) as error:
+            registry.get(f"file:///{layer_dir}", mock.MagicMock())
+
+        assert error.value.status_code == 400
+        mock_read.assert_not_called()
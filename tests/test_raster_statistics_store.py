@@ -0,0 +1,98 @@
+import io
+import json
+from pathlib import Path
+from unittest.mock import MagicMock
+
+from botocore.exceptions import ClientError
+
+from geospatial_api.raster_statistics import (
+    StatisticsDocument,
+    StatisticsStore,
+    compute_statistics,
+    estimate_statistics_memory,
+    get_sidecar_location,
+    statistics_level,
+)
+
+
+class TestStatisticsLevel:
+    def test_coarsest_overview_of_at_least_max_size(self) -> None:
+        assert statistics_level(4096, 2048, [2, 4, 8, 16], 1024) == 4
+
+    def test_exact(self) -> None:
+        assert statistics_level(4096, 2048, [2, 4, 8, 16], None) == 1
+
+    def test_no_overviews(self) -> None:
+        assert statistics_level(4096, 2048, [], 1024) == 1
+
+
+class TestComputeStatistics:
+    def test_statistics_of_each_band(self, data_dir: Path) -> None:
+        raster_path = str(data_dir.joinpath("test_raster_3857_cog_greyscale.tif"))
+
+        statistics = compute_statistics(raster_path, [1], level=1)
+
+        assert set(statistics) == {"b1"}
+        assert {"min", "max", "mean", "histogram", "percentile_2", "percentile_98"} <= set(statistics["b1"])
+
+    def test_memory_estimate_grows_with_data_read(self) -> None:
+        assert estimate_statistics_memory(1, 1024, 1024, 4) == 4 * estimate_statistics_memory(1, 512, 512, 4)
+        assert estimate_statistics_memory(3, 512, 512, 4) > estimate_statistics_memory(1, 512, 512, 4)
+
+
+class TestStatisticsStore:
+    url = "S3://bucket/raster/test.tif"
+
+    def test_sidecar_location(self) -> None:
+        assert get_sidecar_location(self.url) == ("bucket", "_catalogue/statistics/raster/test.tif.json")
+        assert get_sidecar_location("file:///data/test.tif") is None
+
+    def test_loaded_from_sidecar(self) -> None:
+        """Check statistics stored by another process for the same version of a raster are reused."""
+        s3_client = MagicMock()
+        stored = {"version": "etag", "info": {"count": 1}, "statistics": {"key": {"b1": {"min": 0}}}}
+        s3_client.get_object.return_value = {"Body": io.BytesIO(json.dumps(stored).encode())}
+
+        document = StatisticsStore(max_size=10).load(self.url, "etag", s3_client)
+
+        assert document == StatisticsDocument(**stored)
+
+    def test_sidecar_of_previous_version_ignored(self) -> None:
+        s3_client = MagicMock()
+        stored = {"version": "old", "info": {"count": 1}, "statistics": {}}
+        s3_client.get_object.return_value = {"Body": io.BytesIO(json.dumps(stored).encode())}
+
+        document = StatisticsStore(max_size=10).load(self.url, "new", s3_client)
+
+        assert document == StatisticsDocument(version="new")
+
+    def test_update_writes_sidecar(self) -> None:
+        s3_client = MagicMock()
+        s3_client.get_object.side_effect = ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        store = StatisticsStore(max_size=10)
+        document = store.load(self.url, "etag", s3_client)
+
+        store.update(self.url, document, s3_client, key="key", statistics={"b1": {"min": 0}})
+
+        kwargs = s3_client.put_object.call_args.kwargs
+        assert kwargs["Key"] == "_catalogue/statistics/raster/test.tif.json"
+        assert json.loads(kwargs["Body"])["statistics"] == {"key": {"b1": {"min": 0}}}
+        assert store.load(self.url, "etag", s3_client) is document
+
+    def test_unknown_version_not_persisted(self) -> None:
+        s3_client = MagicMock()
+        store = StatisticsStore(max_size=10)
+        document = store.load(self.url, "", s3_client)
+
+        store.update(self.url, document, s3_client, info={"count": 1})
+
+        s3_client.get_object.assert_not_called()
+        s3_client.put_object.assert_not_called()
+
+    def test_least_recently_used_evicted(self) -> None:
+        s3_client = MagicMock()
+        store = StatisticsStore(max_size=1, persist=False)
+        store.load("file:///a.tif", "1", s3_client)
+        store.load("file:///b.tif", "1", s3_client)
+
+        assert len(store) == 1
@@ -0,0 +1,93 @@
+from unittest import mock
+from unittest.mock import patch
+
+import numpy as np
+from rasterio.crs import CRS
+from rio_tiler.models import ImageData
+
+from geospatial_api.raw_cache import RawTile, RawTileCache, raw_tile_key
+
+
+def make_image(value: int = 1) -> ImageData:
+    array = np.ma.MaskedArray(
+        np.full((2, 4, 4), value, dtype=np.uint16), mask=np.zeros((2, 4, 4), dtype=bool), fill_value=0
+    )
+    array.mask[:, 0, :3] = True
+    return ImageData(array, bounds=(0, 0, 1, 1), crs=CRS.from_epsg(3857), band_names=["b1", "b2"])
+
+
+class TestRawTile:
+    def test_round_trip(self) -> None:
+        """Check the data, mask and metadata of a tile are restored from the cache."""
+        image = make_image()
+        tile = RawTile.from_image(image, colormap={1: (0, 0, 0, 255)})
+
+        restored = tile.to_image()
+
+        np.testing.assert_array_equal(restored.array.data, image.array.data)
+        np.testing.assert_array_equal(restored.array.mask, image.array.mask)
+        assert restored.array.dtype == np.uint16
+        assert restored.bounds == image.bounds
+        assert restored.crs == image.crs
+        assert restored.band_names == ["b1", "b2"]
+        assert tile.colormap == {1: (0, 0, 0, 255)}
+
+    def test_restored_tile_is_a_copy(self) -> None:
+        """Check modifying a restored tile, as rescaling does, leaves the cached tile unchanged."""
+        tile = RawTile.from_image(make_image())
+
+        tile.to_image().array[:] = 5
+
+        assert tile.to_image().array.data.max() == 1
+
+
+class TestRawTileCache:
+    @patch("geospatial_api.raw_cache.record_raw_cache")
+    def test_hit_and_miss(self, mock_record: mock.MagicMock) -> None:
+        cache = RawTileCache(max_bytes=10000)
+        tile = RawTile.from_image(make_image())
+        cache.set("key", tile)
+
+        assert cache.get("key") is tile
+        assert cache.get("other") is None
+        assert [call.kwargs["hit"] for call in mock_record.call_args_list] == [True, False]
+
+    @patch("geospatial_api.raw_cache.record_raw_cache")
+    def test_least_recently_used_evicted(self, mock_record: mock.MagicMock) -> None:
+        """Check the least recently read tiles are evicted once the byte budget is exceeded."""
+        tile = RawTile.from_image(make_image())
+        cache = RawTileCache(max_bytes=int(tile.size * 2.5))
+        cache.set("a", tile)
+        cache.set("b", tile)
+        cache.get("a")
+
+        cache.set("c", tile)
+
+        assert cache.get("a") is not None
+        assert cache.get("b") is None
+        assert cache.get("c") is not None
+        assert cache.size <= cache.max_bytes
+
+    def test_tile_larger_than_budget_not_cached(self) -> None:
+        cache = RawTileCache(max_bytes=0)
+
+        cache.set("key", RawTile.from_image(make_image()))
+
+        assert len(cache) == 0
+
+
+class TestRawTileKey:
+    def test_presigned_urls_share_key(self) -> None:
+        """Check presigned urls of the same object read the same cached data."""
+        url = "https://bucket.s3.amazonaws.com/a.tif"
+        first = raw_tile_key(f"{url}?X-Amz-Signature=1", "etag", "WebMercatorQuad", 1, 0, 0)
+        second = raw_tile_key(f"{url}?X-Amz-Signature=2", "etag", "WebMercatorQuad", 1, 0, 0)
+
+        assert first == second
+
+    def test_key_includes_version_and_read_params(self) -> None:
+        key = raw_tile_key("s3://bucket/a.tif", "etag", "WebMercatorQuad", 1, 0, 0, indexes=(1,))
+
+        assert key != raw_tile_key("s3://bucket/a.tif", "other", "WebMercatorQuad", 1, 0, 0, indexes=(1,))
+        assert key != raw_tile_key("s3://bucket/a.tif", "etag", "WebMercatorQuad", 1, 0, 0, indexes=(2,))
+        assert key == raw_tile_key("s3://bucket/a.tif", "etag", "WebMercatorQuad", 1, 0, 0, indexes=(1,))
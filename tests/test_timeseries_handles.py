@@ -0,0 +1,51 @@
+from functools import partial
+from pathlib import Path
+from unittest import mock
+
+from geospatial_api.timeseries import DatasetHandleCache
+from geospatial_api.utils import get_file_path
+
+path_resolver = partial(get_file_path, s3_client=mock.MagicMock())
+
+
+class TestDatasetHandleCache:
+    def test_handle_reused(self, data_dir: Path) -> None:
+        """Check a dataset is only opened once when read repeatedly."""
+        handles = DatasetHandleCache(max_size=4, ttl=60)
+        url = f"file:///{data_dir.joinpath('test_raster_3857_cog_rendered.tif')}"
+
+        with handles.open(url, path_resolver) as first:
+            pass
+        with handles.open(url, path_resolver) as second:
+            pass
+
+        assert first is second
+        assert len(handles) == 1
+
+    def test_concurrent_handles(self, data_dir: Path) -> None:
+        """Check a dataset in use is not shared, and idle handles beyond the pool size are closed."""
+        handles = DatasetHandleCache(max_size=1, ttl=60)
+        url = f"file:///{data_dir.joinpath('test_raster_3857_cog_rendered.tif')}"
+
+        with handles.open(url, path_resolver) as first, handles.open(url, path_resolver) as second:
+            assert first is not second
+
+        # The least recently returned handle is closed
+        assert len(handles) == 1
+        assert second.closed
+        assert not first.closed
+        handles.clear()
+        assert first.closed
+
+    def test_new_version_opened(self, data_dir: Path) -> None:
+        """Check a handle of a previous version of a dataset is not reused once it has been overwritten."""
+        handles = DatasetHandleCache(max_size=4, ttl=60)
+        url = f"file:///{data_dir.joinpath('test_raster_3857_cog_rendered.tif')}"
+
+        with handles.open(url, path_resolver, version="a") as first:
+            pass
+        with handles.open(url, path_resolver, version="b") as second:
+            pass
+
+        assert first is not second
+        handles.clear()
@@ -1,9 +1,18 @@
 from pathlib import Path
 from unittest import mock
 
+import numpy as np
 import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
 
-from geospatial_api.utils import get_file_path, get_s3_client
+from geospatial_api.context import get_config
+from geospatial_api.utils import (
+    ObjectVersions,
+    create_s3_client,
+    get_file_path,
+    get_source_version,
+    replace_non_finite,
+)
 
 
 class TestGetFilePath:
@@ -43,9 +52,98 @@ class TestGetFilePath:
         assert file_path == "presigned_s3"
 
 
-class TestGetS3Client:
-    def test_get_s3_client(self) -> None:
-        """Check a boto3 client is returned from get_s3_client."""
-        s3_client = get_s3_client()
+class TestCreateS3Client:
+    def test_create_s3_client(self) -> None:
+        """Check a boto3 client is returned from create_s3_client."""
+        s3_client = create_s3_client(get_config())
 
         assert str(type(s3_client)) == "<class 'botocore.client.S3'>"
+
+
+class TestObjectVersions:
+    def test_head_request_reused(self) -> None:
+        """Check the version of an object is only requested from S3 once within the ttl."""
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.return_value = {"ETag": '"abc"'}
+        versions = ObjectVersions(ttl=60)
+
+        assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == "abc"
+        assert versions.get("s3://bucket//raster/layer.tif", mock_s3_client) == "abc"
+        mock_s3_client.head_object.assert_called_once_with(Bucket="bucket", Key="raster/layer.tif")
+
+    def test_recorded_version(self) -> None:
+        """Check a version recorded from a bucket listing is used without a HEAD request."""
+        mock_s3_client = mock.MagicMock()
+        versions = ObjectVersions(ttl=60)
+
+        versions.record("S3://bucket/raster/layer.tif", '"def"')
+
+        assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == "def"
+        mock_s3_client.head_object.assert_not_called()
+
+    def test_expired_version(self) -> None:
+        """Check the version is requested again once the ttl has expired."""
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.return_value = {"ETag": '"new"'}
+        versions = ObjectVersions(ttl=-1)
+
+        versions.record("S3://bucket/raster/layer.tif", '"old"')
+
+        assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == "new"
+
+    @pytest.mark.parametrize(
+        "error",
+        [
+            EndpointConnectionError(endpoint_url="https://s3.amazonaws.com"),
+            ClientError({"Error": {"Code": "503", "Message": "Slow Down"}}, "HeadObject"),
+        ],
+    )
+    def test_unavailable_reuses_version(self, error: Exception) -> None:
+        """Check the last known version is reused, for another ttl, if it cannot be requested from S3."""
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.side_effect = error
+        versions = ObjectVersions(ttl=60)
+
+        with mock.patch("geospatial_api.utils.time.monotonic", side_effect=[0, 100, 100, 150]):
+            versions.record("S3://bucket/raster/layer.tif", '"old"')
+            assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == "old"
+            assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == "old"
+        mock_s3_client.head_object.assert_called_once()
+
+    def test_unavailable_without_known_version(self) -> None:
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.side_effect = EndpointConnectionError(endpoint_url="https://s3.amazonaws.com")
+
+        assert ObjectVersions(ttl=60).get("S3://bucket/raster/layer.tif", mock_s3_client) == ""
+
+    def test_deleted_object(self) -> None:
+        """Check the version of an object that no longer exists is not reused."""
+        mock_s3_client = mock.MagicMock()
+        mock_s3_client.head_object.side_effect = ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        versions = ObjectVersions(ttl=-1)
+        versions.record("S3://bucket/raster/layer.tif", '"old"')
+
+        assert versions.get("S3://bucket/raster/layer.tif", mock_s3_client) == ""
+
+
+class TestGetSourceVersion:
+    def test_local_file_overwritten(self, tmp_path: Path) -> None:
+        """Check the version of a local file changes when it is overwritten."""
+        file_path = tmp_path.joinpath("layer.geojson")
+        file_path.write_text("{}")
+        version = get_source_version(f"file:///{file_path}", mock.MagicMock())
+
+        file_path.write_text('{"type": "FeatureCollection"}')
+
+        assert get_source_version(f"file:///{file_path}", mock.MagicMock()) != version
+
+    def test_missing_local_file(self, tmp_path: Path) -> None:
+        assert get_source_version(tmp_path.joinpath("missing.tif"), mock.MagicMock()) == ""
+
+
+class TestReplaceNonFinite:
+    def test_nested_values(self) -> None:
+        """Check NaN and infinite floats are replaced with None at any depth, and other values are kept."""
+        value = {"mean": np.float32("nan"), "max": float("inf"), "count": 3, "histogram": [[1.5, np.nan], ["a"]]}
+
+        assert replace_non_finite(value) == {"mean": None, "max": None, "count": 3, "histogram": [[1.5, None], ["a"]]}